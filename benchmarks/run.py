@@ -0,0 +1,198 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from benchmarks import trees
+from src.shell import Shell
+from src.utils import history
+from src.utils.logger import flush_log
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+RESULTS_FILE = Path(__file__).with_name("results.json")
+# Допустимое замедление медианы относительно базовой линии, %
+DEFAULT_THRESHOLD = 20.0
+# Разница меньше этой (секунды) — шум таймера, а не регрессия
+NOISE_FLOOR = 0.005
+# Файл в рабочем каталоге с масштабом, для которого построены деревья
+_SCALE_MARKER = ".bench-scale"
+
+
+class Case(NamedTuple):
+    name: str
+    command: str
+    # Подготовка перед каждым повтором и уборка после него (не замеряются)
+    before: Callable[[Path], None] | None = None
+    after: Callable[[Path], None] | None = None
+
+
+def _remove(name: str) -> Callable[[Path], None]:
+    def remove(root: Path):
+        path = root / name
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+    return remove
+
+
+def _cold_history(root: Path):
+    """Сбрасывает кэш истории: history читает хвост 100k-строчного файла с диска"""
+    history.reset_cache()
+
+
+CASES = [
+    Case("ls -l flat", "ls -l flat"),
+    Case("ls -S --limit flat", "ls -S --limit 100 flat"),
+    Case("grep -r tree", f"grep -r {trees.NEEDLE} tree"),
+    Case("grep -c huge", f"grep -c {trees.NEEDLE} tree/huge/huge0.log"),
+    Case("cat | grep huge", f"cat tree/huge/huge0.log | grep -c {trees.NEEDLE}"),
+    Case("grep -r -l deep", f"grep -r -l {trees.NEEDLE} deep"),
+    Case("cp -r small", "cp -r tree/small copy", after=_remove("copy")),
+    Case("zip small", "zip tree/small small.zip", after=_remove("small.zip")),
+    Case("tar small", "tar tree/small small.tar.gz", after=_remove("small.tar.gz")),
+    Case("history", "history 1000", before=_cold_history),
+]
+
+
+def build_workspace(root: Path, scale: float) -> None:
+    """
+    Воспроизводимые деревья (генераторы с фиксированным seed): много мелких файлов,
+    несколько больших, глубокая вложенность, большой каталог и .history на 100k строк
+    """
+    def n(value: int) -> int:
+        return max(1, int(value * scale))
+
+    trees.make_small_files(root / "tree" / "small", n(5000))
+    trees.make_huge_files(root / "tree" / "huge", 2, n(32 * 1024 * 1024))
+    trees.make_deep_tree(root / "deep", 64, n(4))
+    trees.make_flat_dir(root / "flat", n(20000))
+    trees.make_history(root / history.HISTORY_FILE, n(100_000))
+    (root / _SCALE_MARKER).write_text(str(scale))
+
+
+def run_cases(root: Path, cases: list[Case], repeats: int = 3) -> dict[str, dict]:
+    """Выполняет каждую команду через Shell.execute_command repeats раз; вывод отбрасывается"""
+    results = {}
+    with contextlib.chdir(root), open(os.devnull, "w") as devnull:
+        shell = Shell()
+        for case in cases:
+            runs = []
+            for _ in range(repeats):
+                if case.before is not None:
+                    case.before(root)
+                with contextlib.redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    ok = shell.execute_command(case.command)
+                    elapsed = time.perf_counter() - start
+                flush_log()
+                if case.after is not None:
+                    case.after(root)
+                if not ok:
+                    raise RuntimeError(f"{case.name}: команда '{case.command}' завершилась ошибкой")
+                runs.append(elapsed)
+            results[case.name] = {"command": case.command, "median": statistics.median(runs),
+                                  "min": min(runs), "runs": runs}
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict, threshold: float) -> list[str]:
+    """
+    Сравнивает медианы с базовой линией, дописывает в results изменение в процентах.
+    Возвращает описания регрессий: замедление больше threshold % (и больше NOISE_FLOOR)
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        delta = result["median"] - base["median"]
+        change = delta / base["median"] * 100 if base["median"] else 0.0
+        result["change_percent"] = round(change, 1)
+        if change > threshold and delta > NOISE_FLOOR:
+            regressions.append(f"{name}: {base['median']:.3f} с -> {result['median']:.3f} с "
+                               f"(+{change:.0f}%, порог {threshold:g}%)")
+    return regressions
+
+
+def _report(results: dict[str, dict]) -> None:
+    print(f"{'замер':<22} {'медиана, с':>11} {'мин, с':>9} {'изменение':>10}")
+    for name, result in results.items():
+        change = result.get("change_percent")
+        change = "" if change is None else f"{change:+.1f}%"
+        print(f"{name:<22} {result['median']:>11.3f} {result['min']:>9.3f} {change:>10}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Замеры команд оболочки на синтетических деревьях")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="масштаб деревьев (1.0 — 5000 мелких файлов, 2 × 32 МБ, 100k строк истории)")
+    parser.add_argument("--repeats", type=int, default=3, help="повторов каждой команды")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="только эти замеры")
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE, help="куда записать JSON")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="базовая линия JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое замедление, %% (по умолчанию %(default)g)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="записать результаты как новую базовую линию")
+    parser.add_argument("--workdir", type=Path,
+                        help="каталог для деревьев (сохраняется между запусками того же масштаба)")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in CASES if not args.only or case.name in args.only]
+    if not cases:
+        print(f"Нет замеров {' '.join(args.only)}; есть: {', '.join(case.name for case in CASES)}")
+        return 2
+
+    with contextlib.ExitStack() as stack:
+        if args.workdir is None:
+            root = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="shell-bench-")))
+        else:
+            root = args.workdir.resolve()
+            root.mkdir(parents=True, exist_ok=True)
+        marker = root / _SCALE_MARKER
+        if not marker.exists() or float(marker.read_text()) != args.scale:
+            start = time.perf_counter()
+            build_workspace(root, args.scale)
+            files, size = trees.tree_size(root)
+            print(f"Деревья: файлов {files}, {size / 2**20:.0f} МБ за {time.perf_counter() - start:.1f} с")
+        results = run_cases(root, cases, args.repeats)
+
+    meta = {"scale": args.scale, "repeats": args.repeats, "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+    regressions = []
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline["meta"]["scale"] != args.scale:
+            print(f"Базовая линия снята с масштабом {baseline['meta']['scale']}, "
+                  f"а не {args.scale}: сравнение пропущено")
+        else:
+            regressions = compare(results, baseline, args.threshold)
+    elif not args.save_baseline:
+        print(f"Базовой линии {args.baseline} нет — сравнение пропущено; "
+              "снимите её: python3 -m benchmarks.run --save-baseline")
+
+    _report(results)
+    document = json.dumps({"meta": meta, "results": results}, ensure_ascii=False, indent=2)
+    args.output.write_text(document, encoding="utf-8")
+    if args.save_baseline:
+        args.baseline.write_text(document, encoding="utf-8")
+        print(f"Базовая линия сохранена в {args.baseline}")
+    for regression in regressions:
+        print(f"РЕГРЕССИЯ {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import os
+import random
+from pathlib import Path
+
+# Строка, которую ищут grep-замеры; встречается в части файлов
+NEEDLE = "needle"
+
+_WORDS = ("alpha", "beta", "gamma", "delta", "shell", "archive", "index", "trash",
+          "copy", "move", "error", "warning", "info", "debug", "request", "response")
+
+
+def _line(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 12)))
+
+
+def _text(rng: random.Random, size: int, needle_every: int) -> str:
+    """Текст примерно size байт; каждая needle_every-я строка содержит NEEDLE"""
+    lines: list[str] = []
+    total = 0
+    while total < size:
+        line = _line(rng)
+        if needle_every and len(lines) % needle_every == needle_every - 1:
+            line += f" {NEEDLE}"
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def make_small_files(root: Path, count: int, per_dir: int = 100, seed: int = 1) -> int:
+    """Много мелких файлов (200 байт — 2 КБ) в каталогах по per_dir; возвращает их число"""
+    rng = random.Random(seed)
+    for i in range(count):
+        directory = root / f"d{i // per_dir:04}"
+        if i % per_dir == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"f{i:06}.txt").write_text(_text(rng, rng.randint(200, 2000), 10))
+    return count
+
+
+def make_flat_dir(root: Path, count: int, seed: int = 2) -> int:
+    """Один каталог с count файлами разного размера — для ls -l / -S"""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        (root / f"file{i:06}.dat").write_bytes(b"x" * rng.randint(0, 4096))
+    return count
+
+
+def make_huge_files(root: Path, count: int, size: int, seed: int = 3) -> int:
+    """
+    Несколько больших текстовых файлов по size байт. Файл собирается из блока
+    случайных строк, повторённого с разными номерами, — генерация не дольше записи
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    block = _text(rng, 1024 * 1024, 1000).encode()
+    for i in range(count):
+        with open(root / f"huge{i}.log", "wb") as f:
+            written = 0
+            part = 0
+            while written < size:
+                chunk = f"# part {part}\n".encode() + block
+                f.write(chunk[:size - written])
+                written += min(len(chunk), size - written)
+                part += 1
+    return count
+
+
+def make_deep_tree(root: Path, depth: int, files_per_level: int, seed: int = 4) -> int:
+    """Цепочка вложенных каталогов глубины depth, в каждом files_per_level файлов"""
+    rng = random.Random(seed)
+    directory = root
+    for level in range(depth):
+        directory = directory / f"level{level:03}"
+        directory.mkdir(parents=True, exist_ok=True)
+        for i in range(files_per_level):
+            (directory / f"f{i}.txt").write_text(_text(rng, 512, 5))
+    return depth * files_per_level
+
+
+def make_history(path: Path, lines: int, seed: int = 5) -> int:
+    """Файл истории на lines команд"""
+    rng = random.Random(seed)
+    commands = ("ls -l", "cd ..", "cat notes.txt", "grep -r error logs", "cp -r a b", "mv a b")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(f"{rng.choice(commands)} {i}\n")
+    return lines
+
+
+def tree_size(root: Path) -> tuple[int, int]:
+    """(файлов, байт) в дереве — для отчёта"""
+    files = 0
+    size = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(directory, name))
+    return files, size
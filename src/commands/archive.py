@@ -1,9 +1,27 @@
-import shutil
+import fnmatch
+import glob
+import gzip
+import heapq
+import os
+import time
 import zipfile
 import tarfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def zip_folder(folder: str, archive_name: str) -> str:
+from src.constants import ZIP_DEFAULT_LEVEL, UNZIP_PARALLEL_MIN_BYTES
+from src.utils import metrics
+from src.utils.blockgzip import BlockGzipWriter
+from src.utils.gzindex import (build_gz_index, load_gz_index, index_path, member_info,
+                               checkpoint_for, open_at)
+from src.utils.zipper import build_zip
+
+def zip_folder(folder: str, archive_name: str, level: int = ZIP_DEFAULT_LEVEL,
+               jobs: int | None = None) -> str:
+    """
+    Архивирует содержимое каталога в zip. Файлы сжимаются параллельно в jobs процессах
+    с уровнем level (0 — без сжатия); уже сжатые форматы (.jpg, .gz, .zip, ...) не пересжимаются
+    """
     folder_path = Path(folder).expanduser().resolve()
     archive_path = Path(archive_name).expanduser().resolve()
 
@@ -11,12 +29,29 @@ def zip_folder(folder: str, archive_name: str) -> str:
         return f"ERROR: {folder} не является каталогом или не существует."
 
     try:
-        shutil.make_archive(str(archive_path.with_suffix('')), 'zip', str(folder_path))
+        build_zip(str(folder_path), str(archive_path.with_suffix('')) + '.zip', level, jobs)
         return f"Архив {archive_name} успешно создан."
     except Exception as e:
         return f"ERROR: Ошибка создания архива zip: {e}"
 
-def unzip_file(archive_name: str) -> str:
+def match_member(name: str, patterns: list[str] | None) -> bool:
+    """Член архива подходит под glob-шаблон целиком или лежит в каталоге с таким именем"""
+    if not patterns:
+        return True
+    name = name.rstrip("/")
+    for pattern in patterns:
+        pattern = pattern.rstrip("/")
+        if fnmatch.fnmatchcase(name, pattern) or name.startswith(pattern + "/"):
+            return True
+    return False
+
+
+def _format_member(size: int, mtime: float, name: str) -> str:
+    return f"{size:12} {time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime))} {name}"
+
+
+def list_zip(archive_name: str, patterns: list[str] | None = None) -> str:
+    """Список членов zip из центрального каталога — без распаковки данных"""
     archive_path = Path(archive_name).expanduser().resolve()
 
     if not archive_path.is_file():
@@ -24,34 +59,237 @@ def unzip_file(archive_name: str) -> str:
 
     try:
         with zipfile.ZipFile(str(archive_path), 'r') as zip_ref:
-            zip_ref.extractall('.')
-        return f"Архив {archive_name} успешно распакован."
+            lines = [_format_member(info.file_size, time.mktime(info.date_time + (0, 0, -1)), info.filename)
+                     for info in zip_ref.infolist() if match_member(info.filename, patterns)]
+        return "\n".join(lines) if lines else "Нет подходящих файлов"
+    except Exception as e:
+        return f"ERROR: Ошибка чтения архива zip: {e}"
+
+
+def _extract_zip_members(archive: str, names: list[str], dest: str) -> int:
+    """Распаковывает группу членов zip в процессе пула (архив открывается заново)"""
+    with zipfile.ZipFile(archive, 'r') as zip_ref:
+        for name in names:
+            zip_ref.extract(name, dest)
+    return len(names)
+
+
+def _member_parent(name: str) -> str:
+    """Каталог члена zip внутри dest — с той же очисткой имени, что и в ZipFile.extract"""
+    parts = [part for part in name.split("/") if part not in ("", os.curdir, os.pardir)]
+    return os.path.join("", *parts[:-1])
+
+
+def _split_by_size(infos: list[zipfile.ZipInfo], groups: int) -> list[list[str]]:
+    """Раскладывает члены по группам примерно равного сжатого размера (сначала самые большие)"""
+    buckets: list[tuple[int, int, list[str]]] = [(0, i, []) for i in range(groups)]
+    for info in sorted(infos, key=lambda info: info.compress_size, reverse=True):
+        size, i, names = heapq.heappop(buckets)
+        names.append(info.filename)
+        heapq.heappush(buckets, (size + info.compress_size, i, names))
+    return [names for _, _, names in buckets if names]
+
+
+def unzip_file(archive_name: str, patterns: list[str] | None = None, dest: str = ".",
+               jobs: int | None = None) -> str:
+    """
+    Распаковывает zip в dest: целиком или только члены, подходящие под patterns.
+    Большие архивы распаковываются в jobs процессах, каждый — свою группу членов
+    """
+    archive_path = Path(archive_name).expanduser().resolve()
+
+    if not archive_path.is_file():
+        return f"ERROR: архив {archive_name} не найден."
+
+    try:
+        with zipfile.ZipFile(str(archive_path), 'r') as zip_ref:
+            infos = [info for info in zip_ref.infolist() if match_member(info.filename, patterns)]
+            # Пустой архив без шаблонов — не ошибка: распаковывать просто нечего
+            if not infos and patterns:
+                return f"ERROR: в архиве {archive_name} нет файлов по шаблонам: {' '.join(patterns)}"
+            if jobs is None:
+                jobs = os.cpu_count() or 1
+            files = [info for info in infos if not info.is_dir()]
+            total = sum(info.file_size for info in files)
+            if jobs == 1 or len(files) < 2 or total < UNZIP_PARALLEL_MIN_BYTES:
+                zip_ref.extractall(dest, members=infos if patterns else None)
+            else:
+                # Каталоги (и явные, и родительские для файлов) создаются заранее,
+                # чтобы процессы не спорили за них
+                for info in infos:
+                    if info.is_dir():
+                        zip_ref.extract(info, dest)
+                    else:
+                        os.makedirs(os.path.join(dest, _member_parent(info.filename)), exist_ok=True)
+                groups = _split_by_size(files, jobs)
+                with ProcessPoolExecutor(max_workers=len(groups)) as pool:
+                    list(pool.map(_extract_zip_members, [str(archive_path)] * len(groups),
+                                  groups, [dest] * len(groups)))
+            metrics.add(files=len(files), read=sum(info.compress_size for info in files),
+                        written=total)
+        return f"Архив {archive_name} успешно распакован: файлов {len(files)}."
     except Exception as e:
         return f"ERROR: Ошибка распаковки архива zip: {e}"
 
-def tar_folder(folder: str, archive_name: str) -> str:
+def tar_folder(folder: str, archive_name: str, jobs: int | None = None) -> str:
+    """
+    Архивирует каталог в tar.gz. Поток tar сжимается блоками в jobs потоков
+    (BlockGzipWriter); архив — обычный gzip из нескольких членов
+    """
     folder_path = Path(folder).expanduser().resolve()
     archive_path = Path(archive_name).expanduser().resolve()
 
     if not folder_path.is_dir():
         return f"ERROR: {folder} не является каталогом или не существует."
 
+    # Размеры добавленных файлов — для метрик (поток 'w|' после закрытия членов не отдаёт)
+    sizes = []
+
+    def track(member: tarfile.TarInfo) -> tarfile.TarInfo:
+        if member.isfile():
+            sizes.append(member.size)
+        return member
+
     try:
-        with tarfile.open(str(archive_path), 'w:gz') as tar:
-            tar.add(str(folder_path), arcname=folder_path.name)
+        with open(archive_path, 'wb') as f, BlockGzipWriter(f, jobs=jobs) as gz:
+            with tarfile.open(fileobj=gz, mode='w|') as tar:
+                tar.add(str(folder_path), arcname=folder_path.name, filter=track)
+        metrics.add(files=len(sizes), read=sum(sizes), written=archive_path.stat().st_size)
         return f"Архив {archive_name} успешно создан."
     except Exception as e:
         return f"ERROR: Ошибка создания архива tar.gz: {e}"
 
-def untar_file(archive_name: str) -> str:
+def index_tar(archive_name: str) -> str:
+    """untar --index: строит индекс контрольных точек и смещений членов рядом с архивом"""
     archive_path = Path(archive_name).expanduser().resolve()
 
     if not archive_path.is_file():
         return f"ERROR: архив {archive_name} не найден."
 
     try:
-        with tarfile.open(str(archive_path), 'r:gz') as tar:
-            tar.extractall('.')
-        return f"Архив {archive_name} успешно распакован."
+        index = build_gz_index(str(archive_path))
+        return (f"Индекс {index_path(str(archive_path))}: членов {len(index['members'])}, "
+                f"контрольных точек {len(index['checkpoints'])}.")
+    except Exception as e:
+        return f"ERROR: Ошибка индексации архива tar.gz: {e}"
+
+
+def list_tar(archive_name: str, patterns: list[str] | None = None) -> str:
+    """
+    Список членов tar.gz: из индекса (untar --index), если он актуален,
+    иначе архив читается потоком, данные на диск не пишутся
+    """
+    archive_path = Path(archive_name).expanduser().resolve()
+
+    if not archive_path.is_file():
+        return f"ERROR: архив {archive_name} не найден."
+
+    try:
+        index = load_gz_index(str(archive_path))
+        if index is not None:
+            members = [member_info(member) for member in index["members"]]
+            lines = [_format_member(member.size, member.mtime, member.name + ("/" if member.isdir() else ""))
+                     for member in members if match_member(member.name, patterns)]
+        else:
+            # gzip.open, а не 'r|gz': поток tarfile читает только первый gzip-член архива
+            with gzip.open(str(archive_path), 'rb') as f, tarfile.open(fileobj=f, mode='r|') as tar:
+                lines = [_format_member(member.size, member.mtime, member.name + ("/" if member.isdir() else ""))
+                         for member in tar if match_member(member.name, patterns)]
+        return "\n".join(lines) if lines else "Нет подходящих файлов"
+    except Exception as e:
+        return f"ERROR: Ошибка чтения архива tar.gz: {e}"
+
+
+def _extract_indexed(archive: str, index: dict, patterns: list[str], dest: str) -> tuple[int, int, int]:
+    """
+    Распаковка выбранных членов по индексу: распаковка gzip начинается с ближайшей
+    контрольной точки; если до следующего члена нет контрольной точки ближе, чтение продолжается.
+    Возвращает (членов, прочитано сжатых байт, записано байт)
+    """
+    targets = [member[1] for member in index["members"] if match_member(member[0], patterns)]
+    extracted = 0
+    read = 0
+    written = 0
+    with open(archive, "rb") as f:
+        tar = None
+        stream = None
+        base = 0
+        start = 0
+        for offset in targets:
+            if tar is None or base + tar.offset > offset or checkpoint_for(index, offset)[1] > base + tar.offset:
+                if stream is not None:
+                    read += stream.file_pos - start
+                start = checkpoint_for(index, offset)[0]
+                stream = open_at(f, index, offset)
+                tar = tarfile.open(fileobj=stream, mode='r|')
+                base = offset
+            member = tar.next()
+            while member is not None and base + member.offset < offset:
+                member = tar.next()
+            if member is None or base + member.offset != offset:
+                raise tarfile.ReadError("индекс не соответствует архиву")
+            tar.extract(member, dest)
+            extracted += 1
+            written += member.size
+        if stream is not None:
+            read += stream.file_pos - start
+    return extracted, read, written
+
+
+def untar_file(archive_name: str, patterns: list[str] | None = None, dest: str = ".") -> str:
+    """
+    Распаковывает tar.gz в dest: целиком или только члены, подходящие под patterns.
+    С актуальным индексом (untar --index) выбранные члены читаются с ближайших контрольных точек;
+    без него архив читается одним потоком, и если все шаблоны — точные имена файлов,
+    чтение прекращается, как только они найдены
+    """
+    archive_path = Path(archive_name).expanduser().resolve()
+
+    if not archive_path.is_file():
+        return f"ERROR: архив {archive_name} не найден."
+
+    try:
+        if not patterns:
+            with tarfile.open(str(archive_path), 'r:gz') as tar:
+                tar.extractall(dest)
+                if metrics.measuring():
+                    files = [member for member in tar.getmembers() if member.isfile()]
+                    metrics.add(files=len(files), read=archive_path.stat().st_size,
+                                written=sum(member.size for member in files))
+            return f"Архив {archive_name} успешно распакован."
+
+        index = load_gz_index(str(archive_path))
+        if index is not None:
+            extracted, read, written = _extract_indexed(str(archive_path), index, patterns, dest)
+        else:
+            extracted, read, written = _extract_streaming(str(archive_path), patterns, dest)
+        metrics.add(files=extracted, read=read, written=written)
+        if not extracted:
+            return f"ERROR: в архиве {archive_name} нет файлов по шаблонам: {' '.join(patterns)}"
+        return f"Архив {archive_name} успешно распакован: файлов {extracted}."
     except Exception as e:
         return f"ERROR: Ошибка распаковки архива tar.gz: {e}"
+
+
+def _extract_streaming(archive: str, patterns: list[str], dest: str) -> tuple[int, int, int]:
+    """
+    Распаковка выбранных членов за один проход по архиву.
+    Возвращает (членов, прочитано сжатых байт, записано байт)
+    """
+    remaining = set(patterns) if not any(glob.has_magic(pattern) for pattern in patterns) else None
+    extracted = 0
+    written = 0
+    with open(archive, 'rb') as raw, gzip.open(raw, 'rb') as f, \
+            tarfile.open(fileobj=f, mode='r|') as tar:
+        for member in tar:
+            if not match_member(member.name, patterns):
+                continue
+            tar.extract(member, dest)
+            extracted += 1
+            written += member.size
+            if remaining is not None and member.isfile():
+                remaining.discard(member.name)
+                if not remaining:
+                    break
+        read = raw.tell()
+    return extracted, read, written
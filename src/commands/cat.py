@@ -1,26 +1,174 @@
+import codecs
+import os
+import stat
+import sys
 from pathlib import Path
+from typing import Iterable, Iterator
 
-def cat(path: str) -> None:
+from src.constants import CAT_CHUNK_SIZE
+from src.utils import metrics, load_archive_fs
+
+
+def _sendfile_fd() -> int | None:
+    """Дескриптор stdout, если это файл или канал и в него можно писать через sendfile"""
+    try:
+        fd = sys.stdout.fileno()
+        mode = os.fstat(fd).st_mode
+    except (AttributeError, OSError, ValueError):
+        return None
+    if stat.S_ISREG(mode) or stat.S_ISFIFO(mode):
+        return fd
+    return None
+
+
+def _write_stream(f, use_sendfile: bool = True) -> int:
+    """
+    Копирует открытый файл в stdout блоками фиксированного размера, без декодирования.
+    Возвращает число скопированных байт
     """
-    Выводит содержимое файла в консоль.
+    sys.stdout.flush()
+    fd = _sendfile_fd() if use_sendfile else None
+    if fd is not None:
+        offset = 0
+        try:
+            while True:
+                sent = os.sendfile(fd, f.fileno(), offset, CAT_CHUNK_SIZE)
+                if sent == 0:
+                    return offset
+                offset += sent
+        except OSError:
+            # sendfile недоступен для этой пары файлов — дописываем обычным копированием
+            f.seek(offset)
+        return offset + write_chunks(_iter_chunks(f))
+    return write_chunks(_iter_chunks(f))
+
+
+def _iter_chunks(f) -> Iterator[bytes]:
+    while chunk := f.read(CAT_CHUNK_SIZE):
+        yield chunk
+
+
+def write_chunks(chunks: Iterable[bytes]) -> int:
+    """Пишет блоки байт в stdout как есть (и в конце конвейера cat | ...); возвращает их размер"""
+    sys.stdout.flush()
+    out = getattr(sys.stdout, "buffer", None)
+    # Если у stdout нет байтового буфера, декодируем по частям, не разрывая символы
+    written = 0
+    if out is not None:
+        for chunk in chunks:
+            written += len(chunk)
+            out.write(chunk)
+        out.flush()
+        return written
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in chunks:
+        written += len(chunk)
+        sys.stdout.write(decoder.decode(chunk))
+    return written
+
+
+def cat(*paths: str) -> bool:
+    """
+    Выводит содержимое файлов в консоль по порядку, как есть (байты не декодируются).
     Если передан каталог или файл не существует - сообщает об ошибке.
+    Возвращает False, если хотя бы один файл вывести не удалось
     """
-    # Преобразуем путь: раскрываем ~, делаем абсолютный
-    file_path = Path(path).expanduser().resolve()
+    failed = 0
+    for path in paths:
+        # Преобразуем путь: раскрываем ~, делаем абсолютный
+        file_path = Path(path).expanduser().resolve()
 
-    # Проверяем существование
-    if not file_path.exists():
-        print(f"Ошибка: файл '{path}' не найден.")
-        return
+        # Проверяем существование; путь может вести внутрь архива
+        if not os.path.exists(os.path.expanduser(path)):
+            located = load_archive_fs().split_archive_path(path)
+            if located is not None:
+                failed += not _cat_member(path, *located)
+            else:
+                print(f"Ошибка: файл '{path}' не найден.")
+                failed += 1
+            continue
 
-    # Проверяем, файл ли это
-    if file_path.is_dir():
-        print(f"Ошибка: '{path}' - это директория, а не файл.")
-        return
+        # Проверяем, файл ли это
+        if file_path.is_dir():
+            print(f"Ошибка: '{path}' - это директория, а не файл.")
+            failed += 1
+            continue
 
-    # Открываем файл - читаем и печатаем
+        # Открываем файл - передаём его в stdout блоками
+        try:
+            with file_path.open('rb') as f:
+                size = _write_stream(f)
+            metrics.add(files=1, read=size, written=size)
+        except Exception as e:
+            print(f"Ошибка при чтении файла: {e}")
+            failed += 1
+    metrics.add(errors=failed)
+    return not failed
+
+
+def _cat_member(path: str, archive: str, name: str) -> bool:
+    """Выводит файл из архива, распаковывая только его"""
     try:
-        with file_path.open('r', encoding='utf-8') as f:
-            print(f.read())
+        with load_archive_fs().open_member(archive, name) as f:
+            size = _write_stream(f, use_sendfile=False)
+        metrics.add(files=1, read=size, written=size)
+    except FileNotFoundError:
+        print(f"Ошибка: файл '{path}' не найден.")
+        return False
+    except IsADirectoryError:
+        print(f"Ошибка: '{path}' - это директория, а не файл.")
+        return False
     except Exception as e:
-        print(f"Ошибка при чтении файла: {e}")
\ No newline at end of file
+        print(f"Ошибка при чтении файла: {e}")
+        return False
+    return True
+
+
+def iter_cat(*paths: str) -> Iterator[bytes]:
+    """
+    Содержимое файлов блоками по CAT_CHUNK_SIZE — источник для конвейера (cat f | grep ...):
+    файл читается по мере того, как следующая команда забирает данные. Ошибки выводятся сразу
+    """
+    for path in paths:
+        if not os.path.exists(os.path.expanduser(path)):
+            archive_fs = load_archive_fs()
+            located = archive_fs.split_archive_path(path)
+            if located is None:
+                _stream_error(f"Ошибка: файл '{path}' не найден.")
+                continue
+            try:
+                with archive_fs.open_member(*located) as f:
+                    yield from _iter_counted(f)
+            except FileNotFoundError:
+                _stream_error(f"Ошибка: файл '{path}' не найден.")
+            except IsADirectoryError:
+                _stream_error(f"Ошибка: '{path}' - это директория, а не файл.")
+            except Exception as e:
+                _stream_error(f"Ошибка при чтении файла: {e}")
+            continue
+
+        file_path = Path(path).expanduser().resolve()
+        if file_path.is_dir():
+            _stream_error(f"Ошибка: '{path}' - это директория, а не файл.")
+            continue
+        try:
+            with file_path.open('rb') as f:
+                yield from _iter_counted(f)
+        except Exception as e:
+            _stream_error(f"Ошибка при чтении файла: {e}")
+
+
+def _iter_counted(f) -> Iterator[bytes]:
+    """Блоки файла для конвейера; прочитанные байты идут в метрики и при досрочной остановке (grep -m)"""
+    read = 0
+    try:
+        for chunk in _iter_chunks(f):
+            read += len(chunk)
+            yield chunk
+    finally:
+        metrics.add(files=1, read=read)
+
+
+def _stream_error(message: str) -> None:
+    print(message)
+    metrics.add(errors=1)
@@ -1,32 +1,70 @@
 import shutil
 from pathlib import Path
 
-def cp(src: str, dst: str, recursive: bool = False) -> None:
+from src.utils import metrics
+from src.utils.copier import copy_tree, sync_file, sync_tree
+
+def cp(src: str, dst: str, recursive: bool = False, jobs: int | None = None,
+       sync: bool = False, checksum: bool = False) -> bool:
     """
-    Копирует файл или каталог.
+    Копирует файл или каталог. Возвращает False при ошибке.
     src: исходный путь
     dst: путь назначения
     recursive: если True — копирует каталог рекурсивно
+    jobs: число потоков копирования файлов каталога
+    sync: копировать только отсутствующие и изменённые (размер, mtime) файлы
+    checksum: в режиме sync сравнивать содержимое вместо mtime
     """
     src_path = Path(src).expanduser().resolve()
     dst_path = Path(dst).expanduser().resolve()
 
     if not src_path.exists():
         print(f"Ошибка: исходный файл/каталог '{src}' не найден.")
-        return
+        return False
+
+    if sync or checksum:
+        return _sync(src_path, dst_path, recursive, jobs, checksum)
 
     try:
         # Копирование директории
         if recursive:
             if not src_path.is_dir():
                 print(f"Ошибка: флаг -r задан, но '{src}' — не каталог.")
-                return
-            shutil.copytree(src_path, dst_path)
+                return False
+            copied, size = copy_tree(str(src_path), str(dst_path), jobs)
         else:
             if src_path.is_dir():
-                print(f"Ошибка: копирование каталога без -r не поддерживается.")
-                return
+                print("Ошибка: копирование каталога без -r не поддерживается.")
+                return False
             shutil.copy2(src_path, dst_path)
+            copied, size = 1, src_path.stat().st_size
+        metrics.add(files=copied, read=size, written=size)
         print(f"Успешно скопировано '{src}' в '{dst}'")
+        return True
+    except Exception as e:
+        print(f"Ошибка копирования: {e}")
+        return False
+
+
+def _sync(src_path: Path, dst_path: Path, recursive: bool, jobs: int | None, checksum: bool) -> bool:
+    """cp -u: копирует только новое и изменённое и выводит итог"""
+    try:
+        if src_path.is_dir():
+            if not recursive:
+                print("Ошибка: копирование каталога без -r не поддерживается.")
+                return False
+            copied, copied_bytes, skipped, skipped_bytes = sync_tree(
+                str(src_path), str(dst_path), jobs, checksum)
+        else:
+            if dst_path.is_dir():
+                dst_path = dst_path / src_path.name
+            was_copied, size = sync_file(str(src_path), str(dst_path), checksum)
+            copied, copied_bytes = (1, size) if was_copied else (0, 0)
+            skipped, skipped_bytes = (0, 0) if was_copied else (1, size)
+        metrics.add(files=copied + skipped, read=copied_bytes, written=copied_bytes)
+        print(f"Синхронизация '{src_path}' -> '{dst_path}': скопировано файлов {copied} "
+              f"({copied_bytes} байт), пропущено файлов {skipped} ({skipped_bytes} байт)")
+        return True
     except Exception as e:
         print(f"Ошибка копирования: {e}")
+        return False
@@ -1,40 +1,609 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Generator, Iterable, Iterator
+import codecs
+import io
+import mmap
+import os
 import re
 
-def grep(pattern: str, path: str, recursive: bool = False, ignore_case: bool = False) -> str:
-    search_path = Path(path).expanduser().resolve()
+from src.commands.index import CASE_FOLDS_BEYOND_ASCII, make_filter
+from src.utils import metrics
+from src.utils.archive_fs import split_archive_path, iter_files, open_member
+from src.constants import (GREP_PARALLEL_THRESHOLD, GREP_CHUNK_SIZE, GREP_MAX_LINE_BYTES,
+                           GREP_CONTEXT_BYTES, GREP_COUNT_BLOCK, GREP_FOLD_BLOCK, INDEX_FILE)
+
+# Конструкции, которые на байтах ведут себя иначе, чем на строке str:
+# ".", "[^...]" и классы символов захватывают байты вместо символов,
+# \A и \Z привязаны к началу и концу всего буфера, "(?" может менять флаги
+_BYTES_UNSAFE = re.compile(r"\\[wWbBdDsSAZ]|\.|\[\^|\(\?(?!:)")
+# Символы, без которых шаблон — обычная строка
+_REGEX_META = frozenset(".^$*+?{}[]\\|()")
+
+# Блок, которым построчный поиск (TextIOWrapper) читает и декодирует файл
+_TEXT_CHUNK = 8192
+
+# Режимы вывода: строки, только имена файлов (-l), только количество (-c)
+MODE_LINES = "lines"
+MODE_FILES = "files"
+MODE_COUNT = "count"
+# Имя входа для -l при поиске в потоке (конвейер, stdin)
+STDIN_LABEL = "(стандартный ввод)"
+
+# Шаблон и режим внутри процесса-обработчика
+_worker_matcher = None
+_worker_mode = MODE_LINES
+_worker_limit = None
+
+
+def compile_bytes_regex(pattern: str, flags: int) -> re.Pattern | None:
+    """
+    Байтовый вариант шаблона для поиска по всему буферу файла.
+    Возвращает None, если результат может отличаться от построчного поиска
+    """
+    if not pattern.isascii() or _BYTES_UNSAFE.search(pattern):
+        return None
+    # Без учёта регистра байтовый шаблон сворачивает только ASCII: i, k, s, классы [...]
+    # и экранирования (\x6b) на str совпали бы и с не-ASCII символами
+    if flags & re.IGNORECASE and (CASE_FOLDS_BEYOND_ASCII.search(pattern) or '[' in pattern
+                                  or '\\' in pattern):
+        return None
+    try:
+        return re.compile(pattern.encode('ascii'), flags | re.MULTILINE)
+    except re.error:
+        # Экранирования только для str (\u0042, \N{...}) — ищем построчно
+        return None
+
+
+def is_literal(pattern: str) -> bool:
+    """Шаблон без метасимволов регулярных выражений"""
+    return not any(c in _REGEX_META for c in pattern)
+
+
+class RegexMatcher:
+    """Поиск по регулярному выражению (несколько шаблонов объединяются через |)"""
+
+    def __init__(self, patterns: list[str], ignore_case: bool = False):
+        self.patterns = patterns
+        self.ignore_case = ignore_case
+        pattern = patterns[0] if len(patterns) == 1 else "|".join(f"(?:{p})" for p in patterns)
+        flags = re.IGNORECASE if ignore_case else 0
+        self.regex = re.compile(pattern, flags)
+        self.bytes_regex = compile_bytes_regex(pattern, flags)
+        self.bytes_ok = self.bytes_regex is not None
+
+    def match_line(self, line: str) -> bool:
+        return self.regex.search(line) is not None
+
+    def find(self, buf, pos: int, endpos: int) -> tuple[int, int] | None:
+        if self.bytes_regex is None:
+            raise TypeError("байтовый поиск недоступен для этого шаблона (bytes_ok=False)")
+        match = self.bytes_regex.search(buf, pos, endpos)
+        return match.span() if match else None
+
+
+class LiteralMatcher:
+    """Поиск подстроки без регулярных выражений"""
+
+    def __init__(self, literal: str, ignore_case: bool = False):
+        self.patterns = [literal]
+        self.ignore_case = ignore_case
+        self.text = literal.lower() if ignore_case else literal
+        self.needle = self.text.encode('utf-8')
+        # Регистр байтов через bytes.lower() сворачивается только для ASCII
+        self.bytes_ok = not ignore_case or literal.isascii()
+
+    def match_line(self, line: str) -> bool:
+        return self.text in (line.lower() if self.ignore_case else line)
+
+    def find(self, buf, pos: int, endpos: int) -> tuple[int, int] | None:
+        size = len(self.needle)
+        if not self.ignore_case:
+            start = buf.find(self.needle, pos, endpos)
+            return (start, start + size) if start != -1 else None
+        # Без учёта регистра: блоки с перекрытием переводятся в нижний регистр
+        while pos < endpos:
+            stop = min(endpos, pos + GREP_FOLD_BLOCK)
+            start = buf[pos:min(endpos, stop + size - 1)].lower().find(self.needle)
+            if start != -1:
+                return pos + start, pos + start + size
+            pos = stop
+        return None
+
+
+class MultiLiteralMatcher:
+    """Поиск любой из многих подстрок за один проход автоматом Ахо — Корасик"""
+
+    def __init__(self, literals: list[str], ignore_case: bool = False):
+        self.patterns = literals
+        self.ignore_case = ignore_case
+        self.bytes_ok = not ignore_case or all(literal.isascii() for literal in literals)
+        # Переходы, суффиксные ссылки и длина самого короткого шаблона, оканчивающегося в узле
+        self.goto: list[dict[int, int]] = [{}]
+        self.fail = [0]
+        self.out = [0]
+        for literal in literals:
+            self._add((literal.lower() if ignore_case else literal).encode('utf-8'))
+        self._link()
+        self.max_len = max(len(p.encode('utf-8')) for p in literals)
+        # Байты, с которых начинается хотя бы один шаблон: из корня прыгаем сразу к ним
+        first = b"".join(re.escape(bytes([b])) for b in self.goto[0])
+        self.first_byte = re.compile(b"[" + first + b"]") if first else None
+
+    def _add(self, needle: bytes):
+        node = 0
+        for byte in needle:
+            nxt = self.goto[node].get(byte)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][byte] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(0)
+            node = nxt
+        if needle and (not self.out[node] or len(needle) < self.out[node]):
+            self.out[node] = len(needle)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for byte, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fail = self.fail[node]
+                while fail and byte not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[nxt] = self.goto[fail].get(byte, 0)
+                if not self.out[nxt]:
+                    self.out[nxt] = self.out[self.fail[nxt]]
+
+    def _scan(self, data: bytes) -> tuple[int, int] | None:
+        """Начало и конец первого совпадения в data"""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        i = 0
+        size = len(data)
+        while i < size:
+            if node == 0:
+                if self.first_byte is None:
+                    return None
+                found = self.first_byte.search(data, i)
+                if found is None:
+                    return None
+                i = found.start()
+            byte = data[i]
+            while node and byte not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(byte, 0)
+            i += 1
+            if out[node]:
+                return i - out[node], i
+        return None
+
+    def match_line(self, line: str) -> bool:
+        data = (line.lower() if self.ignore_case else line).encode('utf-8')
+        return self._scan(data) is not None
+
+    def find(self, buf, pos: int, endpos: int) -> tuple[int, int] | None:
+        # Шаблоны не содержат перевода строки, поэтому совпадение не пересекает
+        # границу строки, и блоки достаточно перекрывать по длине шаблона
+        overlap = self.max_len - 1
+        while pos < endpos:
+            stop = min(endpos, pos + GREP_FOLD_BLOCK)
+            block = buf[pos:min(endpos, stop + overlap)]
+            if self.ignore_case:
+                block = block.lower()
+            span = self._scan(block)
+            if span is not None:
+                return pos + span[0], pos + span[1]
+            pos = stop
+        return None
+
+
+def make_matcher(patterns: str | list[str], ignore_case: bool = False):
+    """Выбирает самый быстрый способ поиска для набора шаблонов"""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if not patterns:
+        raise ValueError("не задано ни одного шаблона")
+    # Без учёта регистра подстрока сворачивается через lower() так же, как re.IGNORECASE,
+    # только если в ней нет не-ASCII и букв i, k, s; иначе — регулярное выражение
+    folds_differ = ignore_case and any(not p.isascii() or CASE_FOLDS_BEYOND_ASCII.search(p)
+                                       for p in patterns)
+    if all(is_literal(p) for p in patterns) and all(patterns) and not folds_differ:
+        if len(patterns) == 1:
+            return LiteralMatcher(patterns[0], ignore_case)
+        return MultiLiteralMatcher(patterns, ignore_case)
+    if folds_differ and all(is_literal(p) for p in patterns):
+        patterns = [re.escape(p) for p in patterns]
+    return RegexMatcher(patterns, ignore_case)
+
+
+def read_patterns(file: str) -> list[str]:
+    """Шаблоны из файла для -f: по одному в строке, пустые строки пропускаются"""
+    with Path(file).expanduser().open('r', encoding='utf-8') as f:
+        return [line.rstrip('\r\n') for line in f if line.rstrip('\r\n')]
+
+
+def _init_worker(matcher, mode: str, limit: int | None):
+    """Передаёт шаблон процессу пула один раз, а не с каждой задачей"""
+    global _worker_matcher, _worker_mode, _worker_limit
+    _worker_matcher = matcher
+    _worker_mode = mode
+    _worker_limit = limit
+
+
+def _file_result(file_path: Path | str, lines: list[str], matches: int, mode: str) -> list[str]:
+    """Строки вывода для файла в режимах -l и -c"""
+    if mode == MODE_FILES:
+        return [str(file_path)] if matches else []
+    if mode == MODE_COUNT:
+        return [f"{file_path}: {matches}"] if matches else []
+    return lines
+
+
+def _scan_lines(file_path, lines, matcher, mode: str,
+                limit: int | None) -> Generator[str, None, int]:
+    """
+    Проверяет строки по одной и отдаёт вывод по мере нахождения; ошибка чтения —
+    строка ERROR. Возвращает число совпадений (значение генератора)
+    """
+    matches = 0
+    try:
+        for lineno, line in enumerate(lines, 1):
+            if matcher.match_line(line):
+                matches += 1
+                if mode == MODE_LINES:
+                    yield f"{file_path}: {lineno}: {line.strip()}"
+                if mode == MODE_FILES or matches == limit:
+                    break
+    except Exception as e:
+        yield f"ERROR: Не удалось прочитать файл {file_path}: {e}"
+    return matches
+
+
+def _iter_search_lines(file_path: Path, matcher, mode: str,
+                       limit: int | None) -> Generator[str, None, int]:
+    """Построчный поиск с декодированием каждой строки"""
+    matches = 0
+    try:
+        with file_path.open('r', encoding='utf-8') as f:
+            matches = yield from _scan_lines(file_path, f, matcher, mode, limit)
+    except Exception as e:
+        yield f"ERROR: Не удалось прочитать файл {file_path}: {e}"
+    yield from _file_result(file_path, [], matches, mode)
+    return matches
+
 
-    if not search_path.exists():
-        return f"ERROR: путь {path} не найден."
+def _iter_search_member(archive: str, name: str, matcher, mode: str,
+                        limit: int | None) -> Generator[str, None, int]:
+    """Построчный поиск в файле архива; распаковывается только этот файл, потоком"""
+    display = f"{archive}/{name}"
+    matches = 0
+    try:
+        with open_member(archive, name) as raw:
+            f = io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+            matches = yield from _scan_lines(display, f, matcher, mode, limit)
+    except Exception as e:
+        yield f"ERROR: Не удалось прочитать файл {display}: {e}"
+    yield from _file_result(display, [], matches, mode)
+    return matches
 
-    flags = re.IGNORECASE if ignore_case else 0
-    regex = re.compile(pattern, flags)
 
-    results = []
+def _iter_grep_archive(archive: str, name: str, path: str, matcher, recursive: bool,
+                       mode: str, max_count: int | None) -> Iterator[str]:
+    """grep по пути внутри архива: файл или файлы каталога архива, по очереди"""
+    try:
+        names = list(iter_files(archive, name, recursive))
+    except FileNotFoundError:
+        yield f"ERROR: путь {path} не найден."
+        return
+    remaining = max_count
+    for member in names:
+        matches = yield from _iter_search_member(archive, member, matcher, mode, remaining)
+        if remaining is not None:
+            remaining -= matches
+            if remaining <= 0:
+                break
 
-    def search_file(file_path: Path):
+
+def _count_newlines(buf, start: int, end: int) -> int:
+    """Считает переводы строк блоками, не копируя весь диапазон сразу"""
+    count = 0
+    for block_start in range(start, end, GREP_COUNT_BLOCK):
+        count += buf[block_start:min(end, block_start + GREP_COUNT_BLOCK)].count(b'\n')
+    return count
+
+
+def _line_text(buf, start: int, end: int, hit: tuple[int, int]) -> str:
+    """Текст строки; у слишком длинной строки — только окрестность совпадения"""
+    if end - start <= GREP_MAX_LINE_BYTES:
+        return buf[start:end].decode('utf-8', errors='replace').strip()
+    left = max(start, hit[0] - GREP_CONTEXT_BYTES)
+    right = min(end, hit[1] + GREP_CONTEXT_BYTES)
+    text = buf[left:right].decode('utf-8', errors='replace').strip()
+    return f"{'...' if left > start else ''}{text}{'...' if right < end else ''}"
+
+
+class _Utf8Check:
+    """
+    Проверка UTF-8 просмотренной части буфера: построчный поиск читает файл как UTF-8
+    и на первой же ошибке выводит ERROR — байтовый поиск должен вести себя так же.
+    Блоки из одного ASCII проверяются без декодирования
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.checked_to = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def error(self, end: int, final: bool = False) -> UnicodeDecodeError | None:
+        """Ошибка декодирования в buf[:end] (проверяется только непроверенный хвост)"""
+        try:
+            for start in range(self.checked_to, end, GREP_COUNT_BLOCK):
+                block = self.buf[start:min(end, start + GREP_COUNT_BLOCK)]
+                if not block.isascii() or self.decoder.getstate()[0]:
+                    self.decoder.decode(block)
+            self.checked_to = max(self.checked_to, end)
+            if final:
+                self.decoder.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            return e
+        return None
+
+
+def _iter_search_buffer(file_path: Path, buf, matcher, mode: str,
+                        limit: int | None) -> Generator[str, None, int]:
+    """
+    Поиск по всему буферу файла без декодирования; строки отдаются по мере нахождения.
+    Номера строк и текст восстанавливаются только вокруг совпадений.
+    Невалидный UTF-8 в просмотренной части даёт ERROR, как при построчном поиске
+    """
+    matches = 0
+    size = len(buf)
+    pos = 0
+    lineno = 1
+    counted_to = 0
+    check = _Utf8Check(buf)
+    error = None
+    while pos < size:
+        hit = matcher.find(buf, pos, size)
+        if hit is None:
+            break
+        start = buf.rfind(b'\n', pos, hit[0]) + 1 or pos
+        end = buf.find(b'\n', hit[0])
+        if end == -1:
+            end = size
+        line_end = min(end + 1, size)
+        if hit[1] > line_end:
+            # Совпадение перешло через перевод строки — проверяем саму строку
+            hit = matcher.find(buf, start, line_end)
+            if hit is None:
+                pos = line_end
+                continue
+        # Построчный поиск выдаёт строку, только декодировав весь блок, в котором она кончается
+        error = check.error(min(size, -(-line_end // _TEXT_CHUNK) * _TEXT_CHUNK))
+        if error is not None:
+            break
+        matches += 1
+        if mode == MODE_LINES:
+            lineno += _count_newlines(buf, counted_to, start)
+            counted_to = start
+            yield f"{file_path}: {lineno}: {_line_text(buf, start, end, hit)}"
+        if mode == MODE_FILES or matches == limit:
+            break
+        pos = line_end
+    # Построчный поиск, остановленный -l или -m, дальше файл не читает
+    if error is None and not (matches and (mode == MODE_FILES or matches == limit)):
+        error = check.error(size, final=True)
+    if error is not None:
+        yield f"ERROR: Не удалось прочитать файл {file_path}: {error}"
+    yield from _file_result(file_path, [], matches, mode)
+    return matches
+
+
+def iter_search_file(file_path: Path, matcher, mode: str = MODE_LINES,
+                     limit: int | None = None) -> Generator[str, None, int]:
+    """
+    Ищет совпадения в одном файле; строки вывода отдаются по мере нахождения,
+    совпадения не копятся в памяти. Возвращает число совпавших строк (не больше limit)
+    """
+    if not matcher.bytes_ok:
+        return (yield from _iter_search_lines(file_path, matcher, mode, limit))
+    try:
+        with file_path.open('rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                # Построчный поиск переводит \r\n и одиночный \r в \n (universal newlines):
+                # с ними байтовый поиск разошёлся бы в $ и номерах строк
+                if buf.find(b'\r') == -1:
+                    return (yield from _iter_search_buffer(file_path, buf, matcher, mode, limit))
+    except Exception as e:
+        yield f"ERROR: Не удалось прочитать файл {file_path}: {e}"
+        return 0
+    return (yield from _iter_search_lines(file_path, matcher, mode, limit))
+
+
+def search_file(file_path: Path, matcher, mode: str = MODE_LINES,
+                limit: int | None = None) -> tuple[list[str], int]:
+    """Весь вывод по файлу списком и число совпавших строк — для процессов пула"""
+    lines = []
+    search = iter_search_file(file_path, matcher, mode, limit)
+    while True:
         try:
-            with file_path.open('r', encoding='utf-8') as f:
-                for lineno, line in enumerate(f, 1):
-                    if regex.search(line):
-                        results.append(f"{file_path}: {lineno}: {line.strip()}")
-        except Exception as e:
-            results.append(f"ERROR: Не удалось прочитать файл {file_path}: {e}")
+            lines.append(next(search))
+        except StopIteration as stop:
+            return lines, stop.value
+
+
+def _search_in_worker(file_path: Path) -> tuple[list[str], int]:
+    return search_file(file_path, _worker_matcher, _worker_mode, _worker_limit)
+
+
+def _collect_files(search_path: Path, recursive: bool) -> list[Path]:
+    """Список файлов для поиска в порядке обхода"""
+    walker = search_path.rglob('*') if recursive else search_path.iterdir()
+    return [file for file in walker if file.name != INDEX_FILE and file.is_file()]
+
+
+def iter_text_lines(items: Iterable[str | bytes]) -> Iterator[str]:
+    """
+    Строки из потока конвейера: str — готовая строка, bytes — блок данных (cat),
+    который режется по переводам строк; в памяти держится только неполная последняя строка
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    tail = ""
+    for item in items:
+        if isinstance(item, str):
+            if tail:
+                yield tail
+                tail = ""
+            yield item
+            continue
+        lines = (tail + decoder.decode(item)).split("\n")
+        tail = lines.pop()
+        yield from lines
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _iter_grep_lines(matcher, lines: Iterable[str], mode: str,
+                     max_count: int | None) -> Iterator[str]:
+    """grep по потоку строк: совпавшие строки выводятся как есть, по мере чтения"""
+    matches = 0
+    for line in lines:
+        if matcher.match_line(line):
+            matches += 1
+            if mode == MODE_LINES:
+                yield line.rstrip("\r\n")
+            if mode == MODE_FILES or matches == max_count:
+                break
+    if mode == MODE_FILES and matches:
+        yield STDIN_LABEL
+    elif mode == MODE_COUNT:
+        yield str(matches)
+
+
+def iter_grep(pattern: str | list[str], path: str | None, recursive: bool = False,
+              ignore_case: bool = False, jobs: int | None = None, mode: str = MODE_LINES,
+              max_count: int | None = None,
+              lines: Iterable[str | bytes] | None = None) -> Iterator[str]:
+    """
+    Поиск строк по шаблону в файле или каталоге; строки вывода отдаются по мере нахождения.
+    Путь может вести внутрь архива (release.zip/conf) — тогда файлы читаются из архива
+    pattern: шаблон или список шаблонов (-e, -f); строка совпадает, если подходит любой
+    jobs: число процессов; None — параллельно, если файлов не меньше порога
+    mode: MODE_LINES, MODE_FILES (-l) или MODE_COUNT (-c)
+    max_count: остановиться после стольких совпавших строк (-m)
+    lines: вход конвейера или stdin (строки или блоки байт) — ищется в нём, path не нужен
+    """
+    if lines is not None:
+        yield from _iter_grep_lines(make_matcher(pattern, ignore_case), iter_text_lines(lines),
+                                    mode, max_count)
+        return
+    if path is None:
+        raise TypeError("iter_grep: нужен path или lines")
+
+    search_path = Path(path).expanduser().resolve()
+
+    # Проверяется исходная строка: у "release.zip/" косая черта значима, а resolve её убирает
+    if not os.path.exists(os.path.expanduser(path)):
+        located = split_archive_path(path)
+        if located is None:
+            yield f"ERROR: путь {path} не найден."
+        else:
+            yield from _iter_grep_archive(*located, path, make_matcher(pattern, ignore_case),
+                                          recursive, mode, max_count)
+        return
+
+    matcher = make_matcher(pattern, ignore_case)
 
     if search_path.is_file():
-        search_file(search_path)
+        files = [search_path]
     elif search_path.is_dir():
-        if recursive:
-            for file in search_path.rglob('*'):
-                if file.is_file():
-                    search_file(file)
-        else:
-            for file in search_path.iterdir():
-                if file.is_file():
-                    search_file(file)
+        files = _collect_files(search_path, recursive)
+        # Индекс только отсеивает файлы; устаревшие и новые файлы читаются всегда
+        may_match = make_filter(search_path, matcher.patterns, ignore_case)
+        if may_match is not None:
+            files = [file for file in files if may_match(file)]
     else:
-        return f"ERROR: {path} не файл и не директория."
+        yield f"ERROR: {path} не файл и не директория."
+        return
+
+    if jobs is None:
+        jobs = (os.cpu_count() or 1) if len(files) >= GREP_PARALLEL_THRESHOLD else 1
+    jobs = min(jobs, len(files))
+
+    remaining = max_count
+    # Файлы ищутся и отдаются в порядке списка: просмотрены первые searched
+    searched = 0
+    try:
+        if jobs > 1:
+            pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                       initargs=(matcher, mode, max_count))
+            try:
+                # map отдаёт результаты в порядке обхода, независимо от порядка завершения
+                for lines, matches in pool.map(_search_in_worker, files, chunksize=GREP_CHUNK_SIZE):
+                    searched += 1
+                    if remaining is not None and matches > remaining:
+                        # Файлы искались параллельно, каждый со своим лимитом -m
+                        lines, matches = _trim(lines, matches, remaining, mode)
+                    yield from lines
+                    if remaining is not None:
+                        remaining -= matches
+                        if remaining <= 0:
+                            break
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+        else:
+            for file in files:
+                searched += 1
+                matches = yield from iter_search_file(file, matcher, mode, remaining)
+                if remaining is not None:
+                    remaining -= matches
+                    if remaining <= 0:
+                        break
+    finally:
+        # Размеры файлов запрашиваются, только если метрики пишутся
+        if metrics.measuring():
+            metrics.add(files=searched, read=_total_size(files[:searched]))
+
+
+def _total_size(files: list[Path]) -> int:
+    total = 0
+    for file in files:
+        try:
+            total += file.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+def _trim(lines: list[str], matches: int, limit: int, mode: str) -> tuple[list[str], int]:
+    """Обрезает результат файла до оставшегося лимита -m"""
+    if mode == MODE_COUNT:
+        file_path = lines[-1].rsplit(': ', 1)[0]
+        return lines[:-1] + [f"{file_path}: {limit}"], limit
+    if mode == MODE_LINES:
+        kept = []
+        taken = 0
+        for line in lines:
+            if not line.startswith("ERROR: "):
+                if taken == limit:
+                    break
+                taken += 1
+            kept.append(line)
+        return kept, taken
+    return lines, matches
+
 
+def grep(pattern: str | list[str], path: str, recursive: bool = False, ignore_case: bool = False,
+         jobs: int | None = None, mode: str = MODE_LINES, max_count: int | None = None) -> str:
+    """Поиск строк по шаблону; весь вывод одной строкой"""
+    results = list(iter_grep(pattern, path, recursive, ignore_case, jobs, mode, max_count))
     if results:
         return '\n'.join(results)
     else:
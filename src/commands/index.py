@@ -0,0 +1,217 @@
+import base64
+import json
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from src.constants import INDEX_FILE, INDEX_READ_BLOCK
+
+# Три непересекающихся среза по 3 байта с каждым сдвигом дают все триграммы
+_TRIGRAM = re.compile(b'...', re.DOTALL)
+# Буквы, которые без учёта регистра (re.IGNORECASE) совпадают и с не-ASCII символами:
+# i — с İ и ı, k — со знаком кельвина (U+212A), s — с ſ. bytes.lower() таких пар не знает
+CASE_FOLDS_BEYOND_ASCII = re.compile(r'[iks]', re.IGNORECASE)
+# Версия 2: JSON вместо pickle — индекс из чужого каталога не исполняет код при загрузке
+_INDEX_VERSION = 2
+
+
+def file_trigrams(file_path: Path) -> array:
+    """Отсортированный массив триграмм файла (в нижнем регистре ASCII)"""
+    grams = set()
+    tail = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(INDEX_READ_BLOCK)
+            if not block:
+                break
+            data = tail + block.lower()
+            for shift in range(3):
+                grams.update(_TRIGRAM.findall(data, shift))
+            tail = data[-2:]
+    return array('I', sorted(int.from_bytes(gram, 'big') for gram in grams))
+
+
+def _required_literals(pattern: str) -> list[str]:
+    """
+    Подстроки, которые обязаны встретиться в любом совпадении шаблона.
+    Разбор консервативный: при сомнении подстрока просто не попадает в список.
+    Экранирования с буквой или цифрой (\x41, \u0042, \1) и группы (?...) с флагами
+    и расширениями не разбираются — такой шаблон индексом не фильтруется
+    """
+    if '|' in pattern or '(?' in pattern or re.search(r'\\[0-9A-Za-z]', pattern):
+        return []
+    literals = []
+    current: list[str] = []
+    depth = 0
+    i = 0
+
+    def flush():
+        if current and depth == 0:
+            literals.append(''.join(current))
+        current.clear()
+
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if escaped and not escaped.isalnum():
+                current.append(escaped)
+            else:
+                flush()
+            i += 2
+            continue
+        if c == '[':
+            flush()
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif c in '*?{':
+            # Предыдущий символ может отсутствовать
+            if current:
+                current.pop()
+            flush()
+            if c == '{':
+                i = pattern.find('}', i)
+                if i == -1:
+                    return []
+        elif c in '+.^$':
+            flush()
+        elif c == '(':
+            flush()
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            current.clear()
+        elif depth == 0:
+            current.append(c)
+        i += 1
+    flush()
+    return literals
+
+
+def pattern_trigrams(pattern: str, ignore_case: bool = False) -> list[int]:
+    """Триграммы, без которых файл не может содержать совпадение"""
+    grams: set[int] = set()
+    for literal in _required_literals(pattern):
+        if ignore_case and not literal.isascii():
+            continue
+        # В файле на месте i, k, s может стоять многобайтная пара — триграммы берутся между ними
+        parts = CASE_FOLDS_BEYOND_ASCII.split(literal) if ignore_case else [literal]
+        for part in parts:
+            data = part.encode('utf-8').lower()
+            grams.update(int.from_bytes(data[i:i + 3], 'big') for i in range(len(data) - 2))
+    return sorted(grams)
+
+
+def _has_all(grams: array, required: list[int]) -> bool:
+    for gram in required:
+        pos = bisect_left(grams, gram)
+        if pos == len(grams) or grams[pos] != gram:
+            return False
+    return True
+
+
+def _pack_grams(grams: array) -> str:
+    """Триграммы для JSON: байты массива (little-endian) в base64"""
+    if sys.byteorder != 'little':
+        grams = array('I', grams)
+        grams.byteswap()
+    return base64.b64encode(grams.tobytes()).decode('ascii')
+
+
+def _unpack_grams(text: str) -> array:
+    grams = array('I', base64.b64decode(text, validate=True))
+    if sys.byteorder != 'little':
+        grams.byteswap()
+    return grams
+
+
+def load_index(root: Path) -> dict | None:
+    """Загружает индекс каталога или None, если его нет, он повреждён или старого формата"""
+    index_path = root / INDEX_FILE
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get('version') != _INDEX_VERSION:
+            return None
+        return {rel: (int(mtime_ns), int(size), _unpack_grams(grams))
+                for rel, (mtime_ns, size, grams) in data['files'].items()}
+    except (OSError, ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+
+def make_filter(root: Path, patterns: list[str], ignore_case: bool = False):
+    """
+    Функция file_path -> bool: False, только если индекс актуален для файла
+    и в файле нет нужных триграмм ни одного из шаблонов. Иначе файл нужно читать
+    """
+    groups = [pattern_trigrams(pattern, ignore_case) for pattern in patterns]
+    if not groups or not all(groups):
+        return None
+    files = load_index(root)
+    if not files:
+        return None
+
+    def may_match(file_path: Path) -> bool:
+        entry = files.get(file_path.relative_to(root).as_posix())
+        if entry is None:
+            return True
+        mtime_ns, size, grams = entry
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return True
+        if st.st_mtime_ns != mtime_ns or st.st_size != size:
+            return True
+        return any(_has_all(grams, required) for required in groups)
+
+    return may_match
+
+
+def build_index(path: str) -> str:
+    """
+    Создаёт или обновляет триграммный индекс каталога.
+    Файлы с прежними mtime и размером не перечитываются
+    """
+    root = Path(path).expanduser().resolve()
+    if not root.is_dir():
+        return f"ERROR: {path} не является каталогом или не существует."
+
+    old_files = load_index(root) or {}
+    files = {}
+    updated = 0
+    try:
+        for file_path in root.rglob('*'):
+            if file_path.name == INDEX_FILE or not file_path.is_file():
+                continue
+            rel = file_path.relative_to(root).as_posix()
+            try:
+                st = file_path.stat()
+                old = old_files.get(rel)
+                if old is not None and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+                    files[rel] = old
+                    continue
+                files[rel] = (st.st_mtime_ns, st.st_size, file_trigrams(file_path))
+                updated += 1
+            except OSError:
+                # Файл без записи в индексе всегда читается при поиске
+                continue
+
+        tmp_path = root / (INDEX_FILE + '.tmp')
+        packed = {rel: [mtime_ns, size, _pack_grams(grams)]
+                  for rel, (mtime_ns, size, grams) in files.items()}
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': _INDEX_VERSION, 'files': packed}, f, ensure_ascii=False)
+        os.replace(tmp_path, root / INDEX_FILE)
+    except Exception as e:
+        return f"ERROR: Ошибка построения индекса: {e}"
+
+    removed = len(old_files.keys() - files.keys())
+    return f"Индекс {path}: файлов {len(files)}, обновлено {updated}, удалено {removed}."
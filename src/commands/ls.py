@@ -1,22 +1,100 @@
+import heapq
 import os
 import stat
 import time
-from pathlib import Path
+from itertools import islice
+from typing import Iterable, Iterator
 
-def ls(path: str = ".", detailed: bool = False) -> None:
+from src.constants import LS_OUTPUT_CHUNK
+from src.utils import metrics, load_archive_fs
+
+# Ключи сортировки: -S — по размеру, -t — по времени изменения (больше — раньше)
+SORT_SIZE = "size"
+SORT_TIME = "time"
+
+
+def _entry_stat(entry: os.DirEntry) -> os.stat_result:
+    """stat записи (кэшируется в DirEntry); для битой ссылки — stat самой ссылки"""
+    try:
+        return entry.stat()
+    except FileNotFoundError:
+        return entry.stat(follow_symlinks=False)
+
+
+def _format(name: str, st: os.stat_result | None) -> str:
+    if st is None:
+        return name
+    item_formatted_time = time.strftime('%m-%d %H:%M', time.localtime(st.st_mtime))
+    return f'{stat.filemode(st.st_mode)} {st.st_size:10} {item_formatted_time} {name}'
+
+
+def iter_ls(path: str = ".", detailed: bool = False, sort_by: str | None = None,
+            limit: int | None = None) -> Iterator[str]:
+    """
+    Строки содержимого каталога. Без сортировки записи отдаются по мере чтения каталога;
+    с limit и сортировкой выбираются limit первых через кучу, без сортировки всего каталога.
+    Путь может вести внутрь архива: release.zip/conf
+    """
+    if not os.path.exists(path):
+        archive_fs = load_archive_fs()
+        located = archive_fs.split_archive_path(path)
+        if located is not None:
+            yield from _select(iter(archive_fs.list_dir(*located)), detailed, sort_by, limit)
+            return
+
+    if os.path.exists(path) and not os.path.isdir(path):
+        yield _format(os.path.basename(path), os.stat(path) if detailed else None)
+        return
+
+    with os.scandir(path) as it:
+        need_stat = detailed or sort_by is not None
+        entries = ((entry.name, _entry_stat(entry) if need_stat else None) for entry in it)
+        yield from _select(entries, detailed, sort_by, limit)
+
+
+def _size_key(item: tuple[str, os.stat_result | None]) -> tuple[float, str]:
+    """-S: больше — раньше, при равном размере — по имени"""
+    name, st = item
+    return (-st.st_size if st else 0, name)
+
+
+def _time_key(item: tuple[str, os.stat_result | None]) -> tuple[float, str]:
+    """-t: новее — раньше, при равном времени — по имени"""
+    name, st = item
+    return (-st.st_mtime if st else 0, name)
+
+
+def _select(entries: Iterable[tuple[str, os.stat_result | None]], detailed: bool,
+            sort_by: str | None, limit: int | None) -> Iterator[str]:
+    """Сортировка, ограничение и форматирование записей (имя, stat)"""
+    if sort_by is not None:
+        key = _size_key if sort_by == SORT_SIZE else _time_key
+        if limit is not None:
+            entries = heapq.nsmallest(limit, entries, key=key)
+        else:
+            entries = sorted(entries, key=key)
+    elif limit is not None:
+        entries = islice(entries, limit)
+
+    for name, st in entries:
+        yield _format(name, st if detailed else None)
+
+
+def ls(path: str = ".", detailed: bool = False, sort_by: str | None = None,
+       limit: int | None = None) -> bool:
+    """Выводит содержимое каталога крупными блоками строк; False — ошибка"""
     try:
-        for item in Path(path).iterdir():
-            full_path = str(item)
-            if detailed:
-                item_size = os.path.getsize(full_path)
-                item_last_time = os.path.getmtime(full_path)
-                item_formatted_time = time.strftime('%m-%d %H:%M', time.localtime(item_last_time))
-                item_rules = os.stat(full_path)
-                item_rules_form = stat.filemode(item_rules.st_mode)
-                print(f'{item_rules_form} {item_size:10} {item_formatted_time} {item.name}')
-            else:
-                print(item.name)
+        lines = iter_ls(path, detailed, sort_by, limit)
+        while True:
+            chunk = list(islice(lines, LS_OUTPUT_CHUNK))
+            if not chunk:
+                break
+            metrics.add(files=len(chunk))
+            print("\n".join(chunk))
     except FileNotFoundError:
         print(f"Ошибка: путь {path} не найден")
+        return False
     except PermissionError:
         print(f"Нет доступа к {path}")
+        return False
+    return True
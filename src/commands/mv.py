@@ -1,20 +1,86 @@
-import shutil
+import errno
+import os
+import time
 from pathlib import Path
 
-def mv(src: str, dst: str):
+from src.constants import MV_PARTIAL_SUFFIX, MV_PROGRESS_INTERVAL
+from src.utils import metrics
+from src.utils.copier import move_file, move_tree
+
+
+def mv(src: str, dst: str, jobs: int | None = None) -> bool:
+    """
+    Перемещает/переименовывает файл или каталог. На одном устройстве — атомарный rename;
+    между устройствами — параллельное копирование с проверкой каждого файла перед
+    удалением исходника (повторный запуск продолжает прерванный перенос).
+    Возвращает False при ошибке
+    """
     src_path = Path(src).expanduser().resolve()
     dst_path = Path(dst).expanduser().resolve()
 
-    if not src_path.exists():
+    if not src_path.exists() and not src_path.is_symlink():
         print(f"Ошибка: исходный файл/каталог '{src}' не найден.")
-        return
+        return False
 
     try:
         # Если назначение - существующая папка, перемещаем внутрь!
-        if dst_path.exists() and dst_path.is_dir():
+        # Кроме папки, которую создал прерванный перенос этого же источника: его продолжаем
+        if dst_path.exists() and dst_path.is_dir() and not _is_partial_move(src_path, dst_path):
             dst_path = dst_path / src_path.name
 
-        shutil.move(str(src_path), str(dst_path))
+        try:
+            os.rename(src_path, dst_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            _move_across_devices(src_path, dst_path, jobs)
+            return True
+        # rename не читает и не пишет данные
+        metrics.add(files=1)
         print(f"Успешно перемещено/переименовано '{src}' -> '{dst_path}'")
+        return True
     except Exception as e:
         print(f"Ошибка перемещения/переименования: {e}")
+        return False
+
+
+def _move_across_devices(src_path: Path, dst_path: Path, jobs: int | None):
+    """Перенос между файловыми системами с выводом прогресса и итоговой скорости"""
+    start = time.monotonic()
+    last_report = start
+
+    def progress(done: int, total: int, done_bytes: int, total_bytes: int):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report >= MV_PROGRESS_INTERVAL:
+            last_report = now
+            speed = done_bytes / (now - start) / 2**20
+            print(f"mv: файлов {done}/{total}, {done_bytes}/{total_bytes} байт, {speed:.1f} МБ/с")
+
+    if src_path.is_dir() and not src_path.is_symlink():
+        # Метка ставится до первого файла и снимается только после успешного переноса
+        marker = _partial_marker(dst_path)
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+        marker.write_text(str(src_path), encoding="utf-8")
+        moved, copied, size = move_tree(str(src_path), str(dst_path), jobs, progress)
+        marker.unlink()
+    else:
+        was_copied, size = move_file(str(src_path), str(dst_path))
+        moved, copied = 1, int(was_copied)
+    metrics.add(files=moved, read=size, written=size)
+    elapsed = max(time.monotonic() - start, 1e-9)
+    print(f"Перемещено между устройствами '{src_path}' -> '{dst_path}': файлов {moved} "
+          f"({size} байт, скопировано заново {copied}), {size / elapsed / 2**20:.1f} МБ/с")
+
+
+def _partial_marker(dst_path: Path) -> Path:
+    """Метка незавершённого переноса каталога в dst_path (рядом с ним, а не внутри)"""
+    return dst_path.with_name(f".{dst_path.name}{MV_PARTIAL_SUFFIX}")
+
+
+def _is_partial_move(src_path: Path, dst_path: Path) -> bool:
+    """Создан ли каталог dst_path прерванным переносом src_path между устройствами"""
+    try:
+        return _partial_marker(dst_path).read_text(encoding="utf-8") == str(src_path)
+    except (OSError, ValueError):
+        return False
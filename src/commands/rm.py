@@ -1,53 +1,478 @@
+import json
+import os
 import shutil
+import threading
+import time
+import uuid
 from pathlib import Path
 
-def rm(path: str, recursive=False):
-    """Перемещает файл/каталог в .trash вместо удаления"""
-    trash_dir = Path(".trash").resolve()
-    trash_dir.mkdir(exist_ok=True)
-    
-    rm_path = Path(path).expanduser().resolve()
-    
+from src.constants import TRASH_DIR, TRASH_MAX_BYTES, TRASH_MAX_AGE_DAYS, TRASH_ORPHAN_GRACE
+from src.utils import metrics
+from src.utils.remover import remove_trees
+
+# Журнал корзины: по строке JSON на изменение — ["add", id, метаданные], ["del", id],
+# ["size", id, байты]. rm и восстановление дописывают одну строку, а не переписывают индекс
+JOURNAL_FILE = "journal.jsonl"
+# Индекс прежнего формата (весь словарь записей), переводится в журнал при первом чтении
+_LEGACY_INDEX = "index.json"
+# Журнал сжимается фоновой очисткой, когда строк больше, чем 2 × записей + это число
+_JOURNAL_SLACK = 100
+
+# Защищает индексы корзин от одновременного изменения командами и фоновой очисткой
+_lock = threading.Lock()
+# Очистки идут по одной: параллельные rm не повторяют подсчёт размеров и удаление данных
+_purge_lock = threading.Lock()
+# Корзины с фоновой очисткой (под _lock): True — за время очистки был новый rm, нужен ещё проход
+_purging: dict[Path, bool] = {}
+# Корзины, в которых этот процесс уже сверил данные с журналом
+_reconciled: set[Path] = set()
+# Кэш точек монтирования по номеру устройства
+_mount_points: dict[int, Path] = {}
+
+
+def _mount_point(path: Path, dev: int) -> Path:
+    """Корень файловой системы, в которой лежит path"""
+    if dev not in _mount_points:
+        current = path
+        while current.parent != current and current.parent.stat().st_dev == dev:
+            current = current.parent
+        _mount_points[dev] = current
+    return _mount_points[dev]
+
+
+def trash_root(path: Path) -> Path:
+    """
+    Корзина для объекта path — по возможности на том же устройстве, чтобы удаление было rename:
+    ~/.trash, если домашний каталог на этом устройстве; иначе .trash-<uid> в корне
+    файловой системы, если туда можно писать; иначе ~/.trash с копированием
+    """
+    return _trash_for_dir(path.parent)
+
+
+def _trash_for_dir(parent: Path) -> Path:
+    """Корзина для объектов каталога parent"""
+    dev = parent.stat().st_dev
+    home = Path.home()
+    try:
+        if home.stat().st_dev == dev:
+            return home / TRASH_DIR
+    except OSError:
+        pass
+    mount = _mount_point(parent, dev)
+    root = mount / f"{TRASH_DIR}-{os.getuid()}"
+    if os.access(root if root.is_dir() else mount, os.W_OK):
+        return root
+    # Корзин по каталогам не заводим: объект переносится в домашнюю корзину копированием
+    return home / TRASH_DIR
+
+
+class _Journal:
+    """Прочитанная часть журнала: записи {id: метаданные} и {исходный путь: [id, ...]}"""
+
+    __slots__ = ("ino", "head", "offset", "lines", "entries", "by_path")
+
+    def __init__(self, ino: int):
+        self.ino = ino
+        # Начало файла (id первой записи): отличает журнал от сжатого другим процессом
+        # файла, которому достался тот же номер inode
+        self.head = b""
+        self.offset = 0
+        self.lines = 0
+        self.entries: dict[str, dict] = {}
+        self.by_path: dict[str, list[str]] = {}
+
+    def apply(self, record: list):
+        """Применяет строку журнала; повторное применение ничего не меняет"""
+        op, entry_id = record[0], record[1]
+        if op == "add":
+            if entry_id not in self.entries:
+                self.entries[entry_id] = record[2]
+                self.by_path.setdefault(record[2]["path"], []).append(entry_id)
+        elif op == "del":
+            meta = self.entries.pop(entry_id, None)
+            if meta is not None:
+                ids = self.by_path[meta["path"]]
+                ids.remove(entry_id)
+                if not ids:
+                    del self.by_path[meta["path"]]
+        elif op == "size" and entry_id in self.entries:
+            self.entries[entry_id]["size"] = record[2]
+
+
+# Кэш журналов по корзине; дочитывается с места, где остановился, — O(новых строк)
+_journals: dict[Path, _Journal] = {}
+
+
+def _load_journal(root: Path) -> _Journal:
+    path = root / JOURNAL_FILE
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        _journals.pop(root, None)
+        if (root / _LEGACY_INDEX).exists():
+            _migrate_legacy(root)
+            return _load_journal(root)
+        return _Journal(0)
+    with f:
+        st = os.fstat(f.fileno())
+        journal = _journals.get(root)
+        if (journal is None or journal.ino != st.st_ino or st.st_size < journal.offset
+                or os.pread(f.fileno(), len(journal.head), 0) != journal.head):
+            # Журнал новый или сжат (переписан) — читается заново
+            journal = _journals[root] = _Journal(st.st_ino)
+        if st.st_size > journal.offset:
+            f.seek(journal.offset)
+            data = f.read(st.st_size - journal.offset)
+            # Недописанная чужим процессом строка дочитается в следующий раз
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                try:
+                    journal.apply(json.loads(line))
+                except (ValueError, LookupError, TypeError, AttributeError):
+                    # Повреждённая строка пропускается, остальной журнал читается
+                    continue
+                journal.lines += 1
+            journal.offset += end
+            if not journal.head:
+                journal.head = data[:min(end, 64)]
+    return journal
+
+
+def _load_index(root: Path) -> tuple[dict, dict]:
+    """Записи корзины {id: метаданные} и {исходный путь: [id, ...]} (ids — по времени удаления)"""
+    journal = _load_journal(root)
+    return journal.entries, journal.by_path
+
+
+def _append(root: Path, records: list[list]):
+    """Дописывает строки в журнал одной записью; кэш подхватит их при следующем чтении"""
+    data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    with open(root / JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write(data)
+
+
+def _rewrite(root: Path, entries: dict):
+    """Сжатие: журнал переписывается одной строкой "add" на каждую живую запись"""
+    tmp_path = root / (JOURNAL_FILE + ".tmp")
+    ordered = sorted(entries.items(), key=lambda item: item[1]["time"])
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(["add", entry_id, meta], ensure_ascii=False) + "\n"
+                     for entry_id, meta in ordered)
+    os.replace(tmp_path, root / JOURNAL_FILE)
+    _journals.pop(root, None)
+
+
+def _migrate_legacy(root: Path):
+    """index.json прежнего формата -> журнал"""
+    try:
+        with open(root / _LEGACY_INDEX, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        _rewrite(root, entries)
+    except (OSError, ValueError, LookupError, TypeError, AttributeError):
+        # Повреждённый индекс: записи без метаданных восстановить нельзя
+        (root / JOURNAL_FILE).touch()
+    os.remove(root / _LEGACY_INDEX)
+
+
+def _tree_size(path: Path) -> int:
+    if not path.is_dir() or path.is_symlink():
+        return path.lstat().st_size
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _remove_orphans(root: Path):
+    """
+    Удаляет данные без записи в журнале: их оставляет очистка, прерванная между журналом
+    и удалением данных. Свежие (моложе TRASH_ORPHAN_GRACE) не трогаются — это может быть
+    rm другого процесса, ещё не дописавший журнал
+    """
+    with _lock:
+        known = set(_load_index(root)[0])
+    now = time.time()
+    orphans = []
+    try:
+        with os.scandir(root / "files") as it:
+            for entry in it:
+                if entry.name in known:
+                    continue
+                try:
+                    changed = entry.stat(follow_symlinks=False).st_ctime
+                except OSError:
+                    continue
+                if now - changed > TRASH_ORPHAN_GRACE:
+                    orphans.append(entry.path)
+    except FileNotFoundError:
+        return
+    if orphans:
+        remove_trees(orphans)
+
+
+def purge_trash(root: Path):
+    """
+    Удаляет из корзины записи старше TRASH_MAX_AGE_DAYS и самые старые записи,
+    пока корзина больше TRASH_MAX_BYTES. Самая новая запись сохраняется для undo.
+    Первая очистка корзины в процессе сверяет данные с журналом
+    """
+    with _purge_lock:
+        if root not in _reconciled:
+            _remove_orphans(root)
+            _reconciled.add(root)
+        _purge(root)
+
+
+def _purge(root: Path):
+    with _lock:
+        entries, _ = _load_index(root)
+        unsized = [entry_id for entry_id, meta in entries.items() if meta["size"] is None]
+    # Размер каталогов считается здесь, в фоне, а не при удалении, и без блокировки:
+    # rm и undo не ждут обхода большого дерева
+    sizes = {}
+    for entry_id in unsized:
+        try:
+            sizes[entry_id] = _tree_size(root / "files" / entry_id)
+        except OSError:
+            sizes[entry_id] = 0
+
+    with _lock:
+        if sizes:
+            _append(root, [["size", entry_id, size] for entry_id, size in sizes.items()])
+        journal = _load_journal(root)
+        entries = journal.entries
+
+        now = time.time()
+        ordered = sorted(entries, key=lambda entry_id: entries[entry_id]["time"])
+        # Каталоги, удалённые после подсчёта, ещё без размера — их посчитает следующая очистка
+        total = sum(meta["size"] or 0 for meta in entries.values())
+        doomed = []
+        for entry_id in ordered[:-1]:
+            meta = entries[entry_id]
+            if now - meta["time"] > TRASH_MAX_AGE_DAYS * 86400 or total > TRASH_MAX_BYTES:
+                doomed.append(entry_id)
+                total -= meta["size"] or 0
+
+        if doomed:
+            _append(root, [["del", entry_id] for entry_id in doomed])
+            journal = _load_journal(root)
+        if journal.lines > 2 * len(journal.entries) + _JOURNAL_SLACK:
+            _rewrite(root, journal.entries)
+
+    # Сами данные удаляются вне блокировки: записей в индексе уже нет
+    if doomed:
+        remove_trees([str(root / "files" / entry_id) for entry_id in doomed])
+
+
+def _purge_quietly(root: Path):
+    while True:
+        try:
+            purge_trash(root)
+        except Exception:
+            # Очистка повторится после следующего rm
+            pass
+        with _lock:
+            if not _purging[root]:
+                del _purging[root]
+                return
+            _purging[root] = False
+
+
+def _purge_in_background(root: Path) -> threading.Thread | None:
+    """Фоновая очистка; если она уже идёт для этой корзины — только просьба о ещё одном проходе"""
+    with _lock:
+        if root in _purging:
+            _purging[root] = True
+            return None
+        _purging[root] = False
+    thread = threading.Thread(target=_purge_quietly, args=(root,), name="trash-purge", daemon=True)
+    thread.start()
+    return thread
+
+
+def _check_path(path: str, recursive: bool) -> Path | None:
+    """
+    Абсолютный путь для удаления или None (с сообщением), если удалять нельзя.
+    Раскрывается только родительский каталог: ссылка удаляется сама, а не то, на что указывает
+    """
+    given = Path(path).expanduser()
+    if given.name in ("", ".", ".."):
+        rm_path = given.resolve()
+    else:
+        rm_path = given.parent.resolve() / given.name
+
     # Запретить удаление корня и родителя
     if str(rm_path) == "/" or str(rm_path) == str(Path.cwd().parent):
         print("Ошибка: удаление корневого или родительского каталога запрещено!")
-        return
-    
-    if not rm_path.exists():
+        return None
+
+    if not rm_path.exists() and not rm_path.is_symlink():
         print(f"Ошибка: '{path}' не найден(а).")
-        return
-    
+        return None
+
+    if _is_real_dir(rm_path) and not recursive:
+        print("Ошибка: для удаления каталога нужен флаг -r.")
+        return None
+    return rm_path
+
+
+def _is_real_dir(path: Path) -> bool:
+    """Каталог, а не ссылка на каталог"""
+    return path.is_dir() and not path.is_symlink()
+
+
+def _report(prefix: str, files: int, freed: int, errors: list[str]) -> bool:
+    metrics.add(files=files, errors=len(errors))
+    for error in errors:
+        print(f"Ошибка удаления: {error}")
+    print(f"{prefix}: удалено файлов {files}, освобождено {freed} байт")
+    return not errors
+
+
+def rm(path: str, recursive=False, force=False) -> bool:
+    """
+    Перемещает файл/каталог в корзину своей файловой системы вместо удаления.
+    Возвращает False, если объект не удалён (ошибка или отказ от подтверждения)
+    """
+    rm_path = _check_path(path, recursive)
+    if rm_path is None:
+        return False
+
     try:
-        if rm_path.is_dir():
-            if not recursive:
-                print("Ошибка: для удаления каталога нужен флаг -r.")
-                return
+        if _is_real_dir(rm_path) and not force:
             confirm = input(f"Удалить каталог '{rm_path}' со всем содержимым? (y/n): ").strip().lower()
             if confirm != "y":
                 print("Операция отменена.")
-                return
-        
-        # Перемещаем в корзину
-        dst_path = trash_dir / rm_path.name
-        shutil.move(str(rm_path), str(dst_path))
-        print(f"Файл/каталог '{rm_path}' перемещён в .trash.")
-    
+                return False
+
+        root = trash_root(rm_path)
+        if rm_path == root or root.is_relative_to(rm_path):
+            print("Ошибка: нельзя удалить корзину или каталог, который её содержит.")
+            return False
+        (root / "files").mkdir(parents=True, exist_ok=True)
+        entry_id = uuid.uuid4().hex
+        # Корзина на том же устройстве — это rename, а не копирование
+        size = None if _is_real_dir(rm_path) else rm_path.lstat().st_size
+        with _lock:
+            try:
+                os.rename(rm_path, root / "files" / entry_id)
+            except OSError:
+                shutil.move(str(rm_path), str(root / "files" / entry_id))
+            _append(root, [["add", entry_id, {"path": str(rm_path), "name": rm_path.name,
+                                              "time": time.time(), "size": size}]])
+        metrics.add(files=1)
+        print(f"Файл/каталог '{rm_path}' перемещён в корзину {root}.")
+        _purge_in_background(root)
+        return True
+
     except Exception as e:
         print(f"Ошибка удаления: {e}")
+        return False
 
 
-def restore_from_trash(name: str):
-    """Восстанавливает файл/каталог из .trash в текущую директорию"""
-    trash_dir = Path(".trash").resolve()
-    trash_path = trash_dir / name
-    
-    if not trash_path.exists():
-        print(f"Ошибка восстановления: объект {name} не найден в .trash")
-        return
-    
-    dst_path = Path.cwd() / name
-    try:
-        shutil.move(str(trash_path), str(dst_path))
-        print(f"Объект '{name}' восстановлен из .trash.")
-    except Exception as e:
-        print(f"Ошибка восстановления: {e}")
+def restore_from_trash(name: str) -> bool:
+    """
+    Восстанавливает последний удалённый объект по исходному пути на прежнее место.
+    Если по пути ничего не найдено, ищется последний удалённый объект с таким именем
+    """
+    target = Path.cwd() / Path(name).expanduser()
+    if not target.parent.exists():
+        print(f"Ошибка восстановления: объект {name} не найден в корзине")
+        return False
+    target = target.parent.resolve() / target.name
+    root = trash_root(target)
+
+    with _lock:
+        entries, by_path = _load_index(root)
+        ids = by_path.get(str(target))
+        if not ids:
+            # Поиск по имени — для записей, удалённых из другого каталога
+            matches = [entry_id for entry_id, meta in entries.items() if meta["name"] == target.name]
+            ids = sorted(matches, key=lambda entry_id: entries[entry_id]["time"])
+        if not ids:
+            print(f"Ошибка восстановления: объект {name} не найден в корзине")
+            return False
+        entry_id = ids[-1]
+        meta = entries[entry_id]
+        dst_path = Path(meta["path"])
+        if dst_path.exists():
+            print(f"Ошибка восстановления: '{dst_path}' уже существует")
+            return False
+        try:
+            os.rename(root / "files" / entry_id, dst_path)
+        except OSError:
+            try:
+                shutil.move(str(root / "files" / entry_id), str(dst_path))
+            except Exception as e:
+                print(f"Ошибка восстановления: {e}")
+                return False
+        _append(root, [["del", entry_id]])
+    print(f"Объект '{dst_path}' восстановлен из корзины.")
+    return True
+
+
+def rm_purge(paths: list[str], recursive=False, force=False) -> bool:
+    """
+    Безвозвратно удаляет файлы/каталоги, минуя корзину. Для каталогов одно
+    подтверждение на весь вызов; деревья удаляются параллельно (remove_trees).
+    Возвращает False, если хоть один путь не удалён
+    """
+    targets = []
+    ok = True
+    for path in paths:
+        rm_path = _check_path(path, recursive)
+        if rm_path is None:
+            ok = False
+        elif rm_path not in targets:
+            targets.append(rm_path)
+    if not targets:
+        return False
+
+    if not force and any(_is_real_dir(rm_path) for rm_path in targets):
+        names = ", ".join(f"'{rm_path}'" for rm_path in targets)
+        confirm = input(f"Удалить безвозвратно {names} со всем содержимым? (y/n): ").strip().lower()
+        if confirm != "y":
+            print("Операция отменена.")
+            return False
+
+    files, freed, errors = remove_trees([str(rm_path) for rm_path in targets])
+    return _report("Удалено безвозвратно", files, freed, errors) and ok
+
+
+def empty_trash(paths: list[str] | None = None) -> bool:
+    """
+    Очищает корзины файловых систем, в которых лежат paths (по умолчанию — текущий каталог).
+    Записи сначала убираются из индекса, затем данные удаляются параллельно.
+    Возвращает False при ошибках
+    """
+    ok = True
+    roots = []
+    for path in paths or ["."]:
+        directory = Path(path).expanduser().resolve()
+        if not directory.is_dir():
+            directory = directory.parent
+        try:
+            root = _trash_for_dir(directory)
+        except OSError as e:
+            print(f"Ошибка: {e}")
+            ok = False
+            continue
+        if root not in roots:
+            roots.append(root)
+
+    for root in roots:
+        files_dir = root / "files"
+        with _lock:
+            entries, _ = _load_index(root)
+            if not entries and not files_dir.exists():
+                print(f"Корзина {root} пуста")
+                continue
+            doomed = [str(entry) for entry in files_dir.iterdir()] if files_dir.exists() else []
+            _rewrite(root, {})
+        files, freed, errors = remove_trees(doomed)
+        ok = _report(f"Корзина {root} очищена", files, freed, errors) and ok
+    return ok
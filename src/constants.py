@@ -1 +1,101 @@
 SAMPLE_CONSTANT: int = 10
+
+# grep: число файлов, начиная с которого поиск идёт в пуле процессов
+GREP_PARALLEL_THRESHOLD: int = 200
+# grep: сколько файлов отдаётся процессу пула за одну задачу
+GREP_CHUNK_SIZE: int = 64
+# grep: строки длиннее этого (в байтах) выводятся только вокруг совпадения
+GREP_MAX_LINE_BYTES: int = 64 * 1024
+# grep: сколько байт контекста показывать слева и справа от совпадения в длинной строке
+GREP_CONTEXT_BYTES: int = 256
+# grep: размер блока при подсчёте номеров строк
+GREP_COUNT_BLOCK: int = 1024 * 1024
+
+# index: имя файла триграммного индекса в корне каталога
+INDEX_FILE: str = ".grepindex"
+# index: размер блока чтения при построении индекса
+INDEX_READ_BLOCK: int = 1024 * 1024
+# grep: размер блока при поиске подстрок без учёта регистра и автоматом Ахо — Корасик
+GREP_FOLD_BLOCK: int = 1024 * 1024
+
+# Лог: имя файла и размер, после которого он сжимается в shell.log.1.gz
+LOG_FILE: str = "shell.log"
+LOG_MAX_BYTES: int = 10 * 1024 * 1024
+# Лог: сколько сжатых сегментов хранить
+LOG_BACKUP_COUNT: int = 5
+# Лог: сообщения длиннее обрезаются
+LOG_MAX_MESSAGE: int = 4096
+# Лог: пауза фонового потока, чтобы собрать сообщения в одну запись (секунды)
+LOG_FLUSH_INTERVAL: float = 0.05
+# Лог в пакетном режиме: сколько сообщений копить в памяти до передачи фоновому потоку
+LOG_BATCH_LINES: int = 1000
+
+# История: сколько последних записей держать в памяти
+HISTORY_CACHE_SIZE: int = 1000
+# История: размер блока при чтении файла с конца
+HISTORY_READ_BLOCK: int = 64 * 1024
+
+# ls: сколько строк выводится одной записью в stdout
+LS_OUTPUT_CHUNK: int = 4096
+
+# cat: размер блока при копировании файла в stdout
+CAT_CHUNK_SIZE: int = 1024 * 1024
+
+# cp: размер блока при копировании файла (copy_file_range/sendfile/read)
+COPY_CHUNK_SIZE: int = 8 * 1024 * 1024
+# cp -r: число потоков копирования по умолчанию
+CP_WORKERS: int = 8
+# cp -r, mv: задач в очереди пула на поток — ожидающих Future не больше потоков * этого числа
+CP_QUEUE_PER_WORKER: int = 4
+# cp --checksum: размер блока при подсчёте контрольной суммы
+HASH_CHUNK_SIZE: int = 1024 * 1024
+
+# rm: имя каталога корзины (~/.trash или <корень ФС>/.trash-<uid>)
+TRASH_DIR: str = ".trash"
+# rm: предельный размер корзины, после которого удаляются самые старые записи
+TRASH_MAX_BYTES: int = 10 * 1024 ** 3
+# rm: записи старше этого удаляются из корзины
+TRASH_MAX_AGE_DAYS: int = 30
+# rm: данные в корзине без записи в журнале (прерванная очистка) удаляются, если старше этого, секунды
+TRASH_ORPHAN_GRACE: int = 3600
+# rm --purge, emptytrash: число потоков удаления
+RM_WORKERS: int = 8
+# mv между устройствами: интервал вывода прогресса, секунды
+MV_PROGRESS_INTERVAL: float = 1.0
+# mv между устройствами: метка незавершённого переноса каталога рядом с назначением
+# (.<имя>.mv-partial, внутри — исходный путь); по ней повторный mv продолжает перенос
+MV_PARTIAL_SUFFIX: str = ".mv-partial"
+# zip: уровень сжатия по умолчанию и расширения уже сжатых файлов (пишутся без сжатия)
+ZIP_DEFAULT_LEVEL: int = 6
+ZIP_STORED_EXTENSIONS: frozenset = frozenset({
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar", ".jar", ".whl",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".aac", ".ogg", ".flac", ".mp4", ".mkv", ".avi", ".mov", ".webm",
+    ".docx", ".xlsx", ".pptx", ".odt",
+})
+# zip: сжатые данные больше этого размера передаются из процесса через временный файл
+ZIP_INLINE_BYTES: int = 4 * 1024 * 1024
+# zip: меньше этого объёма данных архив сжимается в одном процессе
+ZIP_PARALLEL_MIN_BYTES: int = 8 * 1024 * 1024
+# tar.gz: размер несжатого блока, сжимаемого в отдельный gzip-член
+GZ_BLOCK_SIZE: int = 4 * 1024 * 1024
+# unzip: меньше этого объёма данных архив распаковывается в одном процессе
+UNZIP_PARALLEL_MIN_BYTES: int = 32 * 1024 * 1024
+# untar --index: минимальное расстояние между контрольными точками (несжатые байты),
+# суффикс файла индекса и размер блока чтения архива
+GZ_INDEX_SPACING: int = 4 * 1024 * 1024
+GZ_INDEX_SUFFIX: str = ".idx"
+GZ_READ_BLOCK: int = 1024 * 1024
+# Пакетный режим (-c, скрипт): размер буфера stdout
+SCRIPT_OUTPUT_BUFFER: int = 1024 * 1024
+
+# stats: замер длительности каждой команды (stats on/off переключает в сессии)
+STATS_ENABLED: bool = True
+# stats: бит мантиссы корзины гистограммы — 6 бит дают ошибку перцентиля не больше ~3%
+STATS_MANTISSA_BITS: int = 6
+# --profile: каталог для файлов cProfile (относительно текущего)
+PROFILE_DIR: str = "."
+# Метрики операций: JSON-строки на каждую операцию с файлами (metrics on/off переключает в сессии)
+METRICS_ENABLED: bool = False
+# Метрики: файл JSON-строк (относительно каталога, где метрики включены)
+METRICS_FILE: str = "metrics.jsonl"
@@ -1,8 +1,63 @@
-from src.shell import Shell
+import io
+import sys
+
+from src.constants import SCRIPT_OUTPUT_BUFFER
+from src.shell import Shell, split_script
+
+USAGE = ("Использование: python -m src.main [--stop-on-error] "
+         "[-c \"команда; команда\" | скрипт | -]")
+
+
+def _read_script(path: str) -> str:
+    if path == "-":
+        return sys.stdin.read()
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Без аргументов — интерактивная оболочка. С -c или файлом скрипта ("-" — stdin)
+    команды выполняются подряд с буферизованным выводом; код возврата 1, если
+    хоть одна команда завершилась ошибкой
+    """
+    args = sys.argv[1:] if argv is None else argv
+    stop_on_error = "--stop-on-error" in args
+    args = [arg for arg in args if arg != "--stop-on-error"]
+
+    if not args:
+        Shell().run()
+        return 0
+    if args[0] == "-c" and len(args) == 2:
+        text = args[1]
+    elif len(args) == 1 and (args[0] == "-" or not args[0].startswith("-")):
+        try:
+            text = _read_script(args[0])
+        except OSError as e:
+            print(f"Ошибка: не удалось прочитать скрипт {args[0]}: {e}", file=sys.stderr)
+            return 2
+    else:
+        print(USAGE, file=sys.stderr)
+        return 2
+
+    # Вывод копится в большом буфере и уходит в stdout крупными блоками, а не построчно
+    stdout = sys.stdout
+    stdout.flush()
+    try:
+        sys.stdout = io.TextIOWrapper(
+            open(stdout.fileno(), "wb", buffering=SCRIPT_OUTPUT_BUFFER, closefd=False),
+            encoding=stdout.encoding, errors=stdout.errors)
+    except (AttributeError, OSError, ValueError):
+        # stdout без дескриптора (подменён) — пишем в него как есть
+        pass
+    try:
+        # Скрипт из stdin (-) уже прочитал его целиком; иначе stdin — вход для grep без пути
+        failed = Shell(read_stdin=args[0] != "-").run_script(split_script(text), stop_on_error)
+    finally:
+        sys.stdout.flush()
+        sys.stdout = stdout
+    return 1 if failed else 0
 
-def main():
-    shell = Shell()
-    shell.run()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
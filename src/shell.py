@@ -1,28 +1,82 @@
+import itertools
+import os
+import sys
+import time
 from pathlib import Path
-from src.commands.ls import ls
-from src.commands.cd import cd
-from src.commands.cat import cat
-from src.commands.cp import cp
-from src.commands.rm import rm, restore_from_trash
-from src.commands.mv import mv
-from src.commands.archive import zip_folder, unzip_file, tar_folder, untar_file
-from src.commands.grep import grep
-from src.utils.logger import write_log
-from src.utils.history import add_history, get_history, pop_last
-
-def cmd_history(self, args: list[str]):
-    n = 10
-    if args and args[0].isdigit():
-        n = int(args[0])
-    hist = get_history(n)
-    for i, line in enumerate(hist, 1):
-        print(f"{i}: {line}")
+from time import perf_counter_ns
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from src.constants import ZIP_DEFAULT_LEVEL, PROFILE_DIR, METRICS_FILE
+from src.utils import metrics, stats
+from src.utils.logger import write_log, flush_log, batched_log
+from src.utils.history import add_history, get_history, pop_last, batched_history
+
+# Модули команд (src.commands.*) импортируются в обработчиках при первом вызове:
+# zipfile, tarfile, multiprocessing и т. п. не грузятся, пока команда не понадобилась
+
+
+def _stage_names(parts: list[str]) -> str:
+    """Имя для замеров: команда или имена стадий конвейера через '|'"""
+    names = [parts[0]]
+    names.extend(parts[i + 1] for i, part in enumerate(parts[:-1]) if part == "|")
+    return "|".join(names)
+
+
+def split_script(text: str) -> list[str]:
+    """Команды скрипта или -c: по строкам и через ';', без пустых строк и комментариев '#'"""
+    commands: list[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            continue
+        commands.extend(part.strip() for part in line.split(";") if part.strip())
+    return commands
+
+
+class Command(NamedTuple):
+    name: str
+    # Обработчик (shell, args): метод Shell или функция из любого модуля;
+    # False — команда завершилась ошибкой (None считается успехом)
+    handler: Callable[["Shell", list[str]], bool | None]
+    # Писать ли в лог "SUCCESS: <команда> выполнена" после обработчика
+    log_success: bool
+    # Операция с файлами: при включённых метриках пишет JSON-строку в файл метрик
+    metered: bool = False
+
+
+# Реестр команд: имя -> Command; execute_command ищет команду здесь
+COMMANDS: dict[str, Command] = {}
+
+
+def command(name: str, log_success: bool = True, metered: bool = False):
+    """Декоратор: регистрирует обработчик команды name (диспетчер при этом не меняется)"""
+    def register(handler):
+        COMMANDS[name] = Command(name, handler, log_success, metered)
+        return handler
+    return register
+
+
+# Команды, которые могут стоять в конвейере (cmd | cmd): имя -> обработчик (shell, args, вход).
+# Вход — итератор вывода предыдущей стадии (None у первой); обработчик возвращает итератор
+# строк (str) или блоков байт (bytes), который читается лениво, или None при ошибке аргументов
+STREAMS: dict[str, Callable[["Shell", list[str], Iterator | None], Iterator | None]] = {}
+
+
+def stream(name: str):
+    """Декоратор: регистрирует команду name как стадию конвейера"""
+    def register(handler):
+        STREAMS[name] = handler
+        return handler
+    return register
 
 
 class Shell:
-    def __init__(self):
+    def __init__(self, read_stdin: bool = False):
         self.current_dir = Path.cwd()
         self.running = True
+        # grep без пути читает stdin только в пакетном режиме (-c, файл скрипта): в интерактивном
+        # режиме stdin — это сами команды оболочки
+        self.read_stdin = read_stdin
 
     def run(self):
         print("Запущен. Введите 'exit' для выхода")
@@ -33,82 +87,210 @@ class Shell:
                 if not command_input:
                     continue
                 self.execute_command(command_input)
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
+                # Ctrl+C или конец ввода (Ctrl+D, закончившийся канал)
                 print("\nExit")
                 self.running = False
             except Exception as e:
                 print(f"Err: {e}")
 
-    def execute_command(self, command_input: str):
+    def run_script(self, commands: Iterable[str], stop_on_error: bool = False) -> int:
+        """
+        Пакетный режим: команды выполняются подряд без приглашения, история и лог
+        пишутся пачками. С stop_on_error выполнение прерывается на первой ошибке.
+        Возвращает число команд, завершившихся ошибкой
+        """
+        failed = 0
+        with batched_history(), batched_log():
+            for command_input in commands:
+                if not self.running:
+                    break
+                if not self.execute_command(command_input):
+                    failed += 1
+                    if stop_on_error:
+                        write_log(f"ERROR: выполнение остановлено на команде: {command_input}")
+                        break
+        flush_log()
+        return failed
+
+    def execute_command(self, command_input: str) -> bool:
+        """
+        Выполняет одну команду или конвейер; False — неизвестная команда или ошибка выполнения.
+        Длительность каждой команды идёт в гистограммы stats, операции с файлами при включённых
+        метриках — в файл метрик; "--profile команда ..." выполняет её под cProfile
+        и сохраняет профиль в файл
+        """
         write_log(command_input)
         parts = command_input.split()
+        profile = bool(parts) and parts[0] == "--profile"
+        if profile:
+            parts = parts[1:]
         if not parts:
-            return
+            return True
+        if parts[0] not in ["history", "undo"]:
+            add_history(" ".join(parts) if profile else command_input)
+        if profile:
+            return self._profile(parts)
+
+        timed = stats.enabled
+        entry = COMMANDS.get(parts[0])
+        metered = metrics.path is not None and ("|" in parts or (entry is not None and entry.metered))
+        if not timed and not metered:
+            return self._dispatch(parts)
+
+        if metered:
+            metrics.begin(parts[1:])
+        start = perf_counter_ns()
+        ok = self._dispatch(parts)
+        elapsed = perf_counter_ns() - start
+        name = _stage_names(parts)
+        if metered:
+            metrics.end(name, parts[1:], ok, elapsed)
+        if timed and (entry is not None or "|" in parts):
+            stats.record(name, elapsed, ok)
+        return ok
+
+    def _dispatch(self, parts: list[str]) -> bool:
+        if "|" in parts:
+            return self.execute_pipeline(parts)
         command = parts[0]
         args = parts[1:]
-        if command not in ["history", "undo"]:
-            add_history(command_input)
-
+        entry = COMMANDS.get(command)
+        if entry is None:
+            error = f"Неизвестная команда {command}"
+            print(error)
+            write_log(f"ERROR: {error}")
+            return False
         try:
-            if command == "exit":
-                print("\nExit")
-                write_log("SUCCESS: Выход из оболочки")
-                self.running = False
-            elif command == "ls":
-                self.cmd_ls(args)
-                write_log("SUCCESS: ls выполнена")
-            elif command == "cd":
-                self.cmd_cd(args)
-                write_log("SUCCESS: cd выполнена")
-            elif command == "cat":
-                self.cmd_cat(args)
-                write_log("SUCCESS: cat выполнена")
-            elif command == "cp":
-                self.cmd_cp(args)
-                write_log("SUCCESS: cp выполнена")
-            elif command == "mv":
-                self.cmd_mv(args)
-                write_log("SUCCESS: mv выполнена")
-            elif command == "rm":
-                self.cmd_rm(args)
-                write_log("SUCCESS: rm выполнена")
-            elif command == "zip":
-                self.cmd_zip(args)
-                write_log("SUCCESS: zip выполнена")
-            elif command == "unzip":
-                self.cmd_unzip(args)
-                write_log("SUCCESS: unzip выполнена")
-            elif command == "tar":
-                self.cmd_tar(args)
-                write_log("SUCCESS: tar выполнена")
-            elif command == "untar":
-                self.cmd_untar(args)
-                write_log("SUCCESS: untar выполнена")
-            elif command == "grep":
-                self.cmd_grep(args)
-                write_log("SUCCESS: grep выполнена")
-            elif command == "undo":
-                self.cmd_undo(args)
-            elif command == "history":
-                self.cmd_history(args)
+            ok = entry.handler(self, args) is not False
+            if entry.log_success and ok:
+                write_log(f"SUCCESS: {command} выполнена")
+            return ok
+        except Exception as e:
+            error = f"Ошибка выполнения: {str(e)}"
+            print(error)
+            write_log(f"ERROR: {error}")
+            return False
+
+    def execute_pipeline(self, parts: list[str]) -> bool:
+        """
+        cmd | cmd ...: стадии соединяются итераторами и выполняются лениво — данные проходят
+        конвейер блоками, не накапливаясь в памяти. Вывод последней стадии печатается
+        """
+        from src.commands.cat import write_chunks
+
+        stages: list[list[str]] = [[]]
+        for part in parts:
+            if part == "|":
+                stages.append([])
             else:
-                error = f"Неизвестная команда {command}"
-                print(error)
-                write_log(f"ERROR: {error}")
+                stages[-1].append(part)
+        try:
+            items = None
+            for stage in stages:
+                handler = STREAMS.get(stage[0]) if stage else None
+                if handler is None:
+                    self._pipe_error(f"команда {stage[0]} не поддерживает конвейер" if stage
+                                     else "пустая команда в конвейере")
+                    return False
+                items = handler(self, stage[1:], items)
+                if items is None:
+                    return False
+
+            for kind, group in itertools.groupby(items or (), key=type):
+                if kind is bytes:
+                    # Блоки байт (cat) пишутся в stdout как есть
+                    metrics.add(written=write_chunks(group))
+                else:
+                    for line in group:
+                        print(line)
+            write_log("SUCCESS: конвейер выполнен")
+            return True
         except Exception as e:
             error = f"Ошибка выполнения: {str(e)}"
             print(error)
             write_log(f"ERROR: {error}")
+            return False
 
+    def _profile(self, parts: list[str]) -> bool:
+        """--profile: команда выполняется под cProfile, профиль пишется в PROFILE_DIR"""
+        import cProfile
+
+        name = _stage_names(parts).replace("|", "-")
+        path = os.path.join(PROFILE_DIR, f"profile-{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+                                         f"-{time.time_ns() % 1_000_000:06}.prof")
+        profiler = cProfile.Profile()
+        start = perf_counter_ns()
+        try:
+            ok = profiler.runcall(self._dispatch, parts)
+        finally:
+            elapsed = (perf_counter_ns() - start) / 1e9
+            profiler.dump_stats(path)
+        msg = f"Профиль {' '.join(parts)} ({elapsed:.3f} с) записан в {path}; просмотр: python -m pstats {path}"
+        print(msg)
+        write_log(msg)
+        return ok
+
+    def _pipe_error(self, msg: str) -> None:
+        msg = f"Ошибка: {msg}"
+        print(msg)
+        write_log(f"ERROR: {msg}")
+        return None
+
+    @command("exit", log_success=False)
+    def cmd_exit(self, args: list[str]):
+        print("\nExit")
+        write_log("SUCCESS: Выход из оболочки")
+        flush_log()
+        self.running = False
+
+    @command("ls", metered=True)
     def cmd_ls(self, args: list[str]):
+        from src.commands.ls import ls
+
+        parsed = self._parse_ls_args(args)
+        if parsed is None:
+            return False
+        return ls(*parsed)
+
+    @stream("ls")
+    def stream_ls(self, args: list[str], upstream):
+        from src.commands.ls import iter_ls
+
+        if upstream is not None:
+            return self._pipe_error("ls не читает ввод конвейера")
+        parsed = self._parse_ls_args(args)
+        if parsed is None:
+            return None
+        return iter_ls(*parsed)
+
+    def _parse_ls_args(self, args: list[str]):
+        """Аргументы ls: [-l] [-S|-t] [--limit N] [путь]; (путь, -l, сортировка, лимит) или None"""
+        from src.commands.ls import SORT_SIZE, SORT_TIME
+
         detailed = False
+        sort_by = None
+        limit = None
         path = "."
-        allowed_flags = {"-l"}
+        allowed_flags = {"-l", "-S", "-t"}
         unknown_flags = []
-        
-        for arg in args:
+
+        args_iter = iter(args)
+        for arg in args_iter:
             if arg == "-l":
                 detailed = True
+            elif arg == "-S":
+                sort_by = SORT_SIZE
+            elif arg == "-t":
+                sort_by = SORT_TIME
+            elif arg == "--limit":
+                value = next(args_iter, "")
+                if not value.isdigit() or int(value) < 1:
+                    error_msg = "Ошибка: флаг --limit требует положительное число"
+                    print(error_msg)
+                    write_log(f"ERROR: {error_msg}")
+                    return None
+                limit = int(value)
             elif arg.startswith("-"):
                 # Проверка на неизвестные флаги
                 if arg not in allowed_flags:
@@ -120,12 +302,15 @@ class Shell:
             error_msg = f"Ошибка: не поддерживаемые флаги: {' '.join(unknown_flags)}"
             print(error_msg)
             write_log(f"ERROR: {error_msg}")
-            return
-        
-        write_log(f"ls {'-l' if detailed else ''}{path}".strip())
-        ls(path, detailed)
+            return None
 
+        write_log(" ".join(["ls", *(arg for arg in args if arg != path), path]))
+        return path, detailed, sort_by, limit
+
+    @command("cd")
     def cmd_cd(self, args: list[str]):
+        from src.commands.cd import cd
+
         # Если аргументов нет - переход в домашнюю директорию
         if not args:
             path = "~"
@@ -140,25 +325,59 @@ class Shell:
             error_msg = f"cd {path} - ERROR: Не удалось сменить директорию"
             write_log(error_msg)
             print(error_msg)
+            return False
 
+    @command("cat", metered=True)
     def cmd_cat(self, args: list[str]):
+        from src.commands.cat import cat
+
         if not args:
             error = "Ошибка: укажите имя файла для cat"
             print(error)
             write_log(f"ERROR: {error}")
-            return
-        result = cat(args[0])
-        print(result)
-        write_log(result)
+            return False
+        write_log(f"cat {' '.join(args)}")
+        return cat(*args)
+
+    @stream("cat")
+    def stream_cat(self, args: list[str], upstream):
+        from src.commands.cat import iter_cat
 
+        if args:
+            write_log(f"cat {' '.join(args)}")
+            return iter_cat(*args)
+        if upstream is None:
+            return self._pipe_error("укажите имя файла для cat")
+        # cat без файлов в середине конвейера передаёт вход дальше
+        return upstream
+
+    @command("cp", metered=True)
     def cmd_cp(self, args: list[str]):
-        allowed_flags = {"-r"}
+        from src.commands.cp import cp
+
+        allowed_flags = {"-r", "-u", "--sync", "--checksum"}
         unknown_flags = []
         recursive = False
+        sync = False
+        checksum = False
+        jobs = None
         filtered_args = []
-        for arg in args:
+        args_iter = iter(args)
+        for arg in args_iter:
             if arg == "-r":
                 recursive = True
+            elif arg in ("-u", "--sync"):
+                sync = True
+            elif arg == "--checksum":
+                sync = checksum = True
+            elif arg == "-j":
+                value = next(args_iter, "")
+                if not value.isdigit() or int(value) < 1:
+                    error_msg = "Ошибка: флаг -j требует положительное число"
+                    print(error_msg)
+                    write_log(f"ERROR: {error_msg}")
+                    return False
+                jobs = int(value)
             elif arg.startswith("-"):
                 if arg not in allowed_flags:
                     unknown_flags.append(arg)
@@ -168,52 +387,86 @@ class Shell:
             error_msg = f"Ошибка: не поддерживаемые флаги: {' '.join(unknown_flags)}"
             print(error_msg)
             write_log(f"ERROR: {error_msg}")
-            return
+            return False
         if len(filtered_args) != 2:
             error_msg = "Ошибка: команда cp требует два имени (src, dst)."
             print(error_msg)
             write_log(f"ERROR: {error_msg}")
-            return
+            return False
         src, dst = filtered_args
 
-        log_cmd = f"cp {'-r ' if recursive else ''}{src} {dst}".strip()
+        log_cmd = " ".join(["cp", *(arg for arg in args if arg not in filtered_args), src, dst])
         write_log(log_cmd)
-        cp(src, dst, recursive)
+        return cp(src, dst, recursive, jobs, sync, checksum)
 
+    @command("rm", metered=True)
     def cmd_rm(self, args: list[str]):
-        allowed_flags = {"-r"}
+        from src.commands.rm import rm, rm_purge
+
+        allowed_flags = {"-r", "-f", "--purge"}
         unknown_flags = []
         recursive = False
-        path = None
+        force = False
+        purge = False
+        paths = []
         for arg in args:
             if arg == "-r":
                 recursive = True
+            elif arg == "-f":
+                force = True
+            elif arg == "--purge":
+                purge = True
             elif arg.startswith("-"):
                 if arg not in allowed_flags:
                     unknown_flags.append(arg)
             else:
-                path = arg
+                paths.append(arg)
         if unknown_flags:
             error_msg = f"Ошибка: не поддерживаемые флаги: {' '.join(unknown_flags)}"
             print(error_msg)
             write_log(f"ERROR: {error_msg}")
-            return
-        if not path:
+            return False
+        if not paths:
             error_msg = "Ошибка: укажите путь для удаления!"
             print(error_msg)
             write_log(f"ERROR: {error_msg}")
-            return
-        
-        log_cmd = f"rm {'-r ' if recursive else ''}{path}".strip()
+            return False
+
+        flags = ("-r " if recursive else "") + ("-f " if force else "") + ("--purge " if purge else "")
+        log_cmd = f"rm {flags}{' '.join(paths)}".strip()
         write_log(log_cmd)
-        rm(path, recursive)
-        write_log(f"SUCCESS: команда rm выполнена")
+        if purge:
+            ok = rm_purge(paths, recursive, force)
+        else:
+            ok = all([rm(path, recursive, force) for path in paths])
+        write_log("SUCCESS: команда rm выполнена")
+        return ok
+
+    @command("emptytrash")
+    def cmd_emptytrash(self, args: list[str]):
+        from src.commands.rm import empty_trash
 
+        write_log(f"emptytrash {' '.join(args)}".strip())
+        return empty_trash(args)
+
+    @command("mv", metered=True)
     def cmd_mv(self, args: list[str]):
+        from src.commands.mv import mv
+
         filtered_args = []
         unknown_flags = []
-        for arg in args:
-            if arg.startswith("-"):
+        jobs = None
+        args_iter = iter(args)
+        for arg in args_iter:
+            if arg == "-j":
+                value = next(args_iter, "")
+                if not value.isdigit() or int(value) < 1:
+                    error_msg = "Ошибка: флаг -j требует положительное число"
+                    print(error_msg)
+                    write_log(f"ERROR: {error_msg}")
+                    return False
+                jobs = int(value)
+            elif arg.startswith("-") and arg != "-":
                 unknown_flags.append(arg)
             else:
                 filtered_args.append(arg)
@@ -221,102 +474,336 @@ class Shell:
             error_msg = f"Ошибка: команда mv не поддерживает флаги: {' '.join(unknown_flags)}"
             print(error_msg)
             write_log(f"ERROR: {error_msg}")
-            return
+            return False
         if len(filtered_args) != 2:
             error_msg = "Ошибка: команда mv требует два имени (src, dst)."
             print(error_msg)
             write_log(f"ERROR: {error_msg}")
-            return
+            return False
         src, dst = filtered_args
         write_log(f"mv {src} {dst}")
-        mv(src, dst)
+        return mv(src, dst, jobs)
 
+    @command("zip", metered=True)
     def cmd_zip(self, args: list[str]):
-        if len(args) != 2:
+        from src.commands.archive import zip_folder
+
+        level = ZIP_DEFAULT_LEVEL
+        jobs = None
+        filtered_args = []
+        args_iter = iter(args)
+        for arg in args_iter:
+            if len(arg) == 2 and arg[0] == "-" and arg[1].isdigit():
+                level = int(arg[1])
+            elif arg == "-j":
+                value = next(args_iter, "")
+                if not value.isdigit() or int(value) < 1:
+                    msg = "Ошибка: флаг -j требует положительное число"
+                    print(msg)
+                    write_log(f"ERROR: {msg}")
+                    return False
+                jobs = int(value)
+            elif arg.startswith("-"):
+                msg = f"Ошибка: не поддерживаемый флаг zip: {arg}"
+                print(msg)
+                write_log(f"ERROR: {msg}")
+                return False
+            else:
+                filtered_args.append(arg)
+        if len(filtered_args) != 2:
             msg = "Ошибка: zip требует 2 аргумента: папка и имя архива.zip"
             print(msg)
             write_log(f"ERROR: {msg}")
-            return
-        folder, archive = args
-        write_log(f"zip {folder} {archive}")
-        result = zip_folder(folder, archive)
+            return False
+        folder, archive = filtered_args
+        write_log(f"zip -{level} {folder} {archive}")
+        result = zip_folder(folder, archive, level, jobs)
         print(result)
         write_log(result)
+        return not result.startswith("ERROR")
 
-    def cmd_unzip(self, args: list[str]):
-        if len(args) != 1:
-            msg = "Ошибка: unzip требует 1 аргумент: имя архива.zip"
+    def _parse_extract_args(self, cmd: str, args: list[str], allow_jobs: bool):
+        """Аргументы unzip/untar: архив [шаблон ...] [-d DIR] [-l] [-j N]; None при ошибке"""
+        names = []
+        dest = "."
+        listing = False
+        jobs = None
+        args_iter = iter(args)
+        for arg in args_iter:
+            if arg == "-l":
+                listing = True
+            elif arg == "-d":
+                target = next(args_iter, None)
+                if target is None:
+                    msg = "Ошибка: флаг -d требует каталог"
+                    print(msg)
+                    write_log(f"ERROR: {msg}")
+                    return None
+                dest = target
+            elif arg == "-j" and allow_jobs:
+                value = next(args_iter, "")
+                if not value.isdigit() or int(value) < 1:
+                    msg = "Ошибка: флаг -j требует положительное число"
+                    print(msg)
+                    write_log(f"ERROR: {msg}")
+                    return None
+                jobs = int(value)
+            elif arg.startswith("-"):
+                msg = f"Ошибка: не поддерживаемый флаг {cmd}: {arg}"
+                print(msg)
+                write_log(f"ERROR: {msg}")
+                return None
+            else:
+                names.append(arg)
+        if not names:
+            ext = "zip" if cmd == "unzip" else "tar.gz"
+            msg = f"Ошибка: {cmd} требует 1 аргумент: имя архива.{ext}"
             print(msg)
             write_log(f"ERROR: {msg}")
-            return
-        archive = args[0]
-        write_log(f"unzip {archive}")
-        result = unzip_file(archive)
+            return None
+        return names[0], names[1:] or None, dest, listing, jobs
+
+    @command("unzip", metered=True)
+    def cmd_unzip(self, args: list[str]):
+        from src.commands.archive import unzip_file, list_zip
+
+        parsed = self._parse_extract_args("unzip", args, allow_jobs=True)
+        if parsed is None:
+            return False
+        archive, patterns, dest, listing, jobs = parsed
+        write_log(f"unzip {' '.join(args)}")
+        if listing:
+            result = list_zip(archive, patterns)
+        else:
+            result = unzip_file(archive, patterns, dest, jobs)
         print(result)
-        write_log(result)
+        write_log(result if result.startswith("ERROR") or not listing else "unzip -l выполнена")
+        return not result.startswith("ERROR")
 
+    @command("tar", metered=True)
     def cmd_tar(self, args: list[str]):
-        if len(args) != 2:
+        from src.commands.archive import tar_folder
+
+        jobs = None
+        filtered_args = []
+        args_iter = iter(args)
+        for arg in args_iter:
+            if arg == "-j":
+                value = next(args_iter, "")
+                if not value.isdigit() or int(value) < 1:
+                    msg = "Ошибка: флаг -j требует положительное число"
+                    print(msg)
+                    write_log(f"ERROR: {msg}")
+                    return False
+                jobs = int(value)
+            elif arg.startswith("-"):
+                msg = f"Ошибка: не поддерживаемый флаг tar: {arg}"
+                print(msg)
+                write_log(f"ERROR: {msg}")
+                return False
+            else:
+                filtered_args.append(arg)
+        if len(filtered_args) != 2:
             msg = "Ошибка: tar требует 2 аргумента: папка и имя архива.tar.gz"
             print(msg)
             write_log(f"ERROR: {msg}")
-            return
-        folder, archive = args
+            return False
+        folder, archive = filtered_args
         write_log(f"tar {folder} {archive}")
-        result = tar_folder(folder, archive)
+        result = tar_folder(folder, archive, jobs)
         print(result)
         write_log(result)
+        return not result.startswith("ERROR")
 
+    @command("untar", metered=True)
     def cmd_untar(self, args: list[str]):
-        if len(args) != 1:
-            msg = "Ошибка: untar требует 1 аргумент: имя архива.tar.gz"
-            print(msg)
-            write_log(f"ERROR: {msg}")
-            return
-        archive = args[0]
-        write_log(f"untar {archive}")
-        result = untar_file(archive)
+        from src.commands.archive import untar_file, list_tar, index_tar
+
+        if "--index" in args:
+            names = [arg for arg in args if arg != "--index"]
+            if len(names) != 1:
+                msg = "Ошибка: untar --index требует 1 аргумент: имя архива.tar.gz"
+                print(msg)
+                write_log(f"ERROR: {msg}")
+                return False
+            write_log(f"untar --index {names[0]}")
+            result = index_tar(names[0])
+            print(result)
+            write_log(result)
+            return not result.startswith("ERROR")
+        parsed = self._parse_extract_args("untar", args, allow_jobs=False)
+        if parsed is None:
+            return False
+        archive, patterns, dest, listing, _ = parsed
+        write_log(f"untar {' '.join(args)}")
+        if listing:
+            result = list_tar(archive, patterns)
+        else:
+            result = untar_file(archive, patterns, dest)
         print(result)
-        write_log(result)
+        write_log(result if result.startswith("ERROR") or not listing else "untar -l выполнена")
+        return not result.startswith("ERROR")
 
+    @command("grep", metered=True)
     def cmd_grep(self, args: list[str]):
-        allowed_flags = {"-r", "-1"}
+        started = self._start_grep(args, None)
+        if started is None:
+            return False
+        lines, from_input = started
+
+        # Строки печатаются по мере нахождения, в лог идёт только итог
+        printed = 0
+        failed = False
+        for line in lines:
+            print(line)
+            printed += 1
+            # Строки входа выводятся как есть — в них "ERROR" не означает ошибку grep
+            failed = failed or (not from_input and line.startswith("ERROR"))
+        if not printed:
+            print("Нет совпадений")
+        write_log(f"grep: выведено строк {printed}")
+        return not failed
+
+    @stream("grep")
+    def stream_grep(self, args: list[str], upstream):
+        started = self._start_grep(args, upstream)
+        return None if started is None else started[0]
+
+    def _start_grep(self, args: list[str], upstream):
+        """
+        Запускает grep: (итератор строк вывода, ищет ли во входе) или None при ошибке.
+        Без пути grep ищет во входе: в выводе предыдущей стадии конвейера или, в пакетном
+        режиме, в stdin, если он не терминал. Путь "-" — вход явно, в любом режиме
+        """
+        from src.commands.grep import iter_grep
+
+        stdin = None
+        if upstream is None and sys.stdin is not None and self.read_stdin and not sys.stdin.isatty():
+            stdin = sys.stdin
+        parsed = self._parse_grep_args(args, has_input=upstream is not None or stdin is not None)
+        if parsed is None:
+            return None
+        patterns, path, recursive, ignore_case, jobs, mode, max_count = parsed
+        if path == "-":
+            stdin = sys.stdin
+        elif path is not None:
+            return iter_grep(patterns, path, recursive, ignore_case, jobs, mode, max_count), False
+        lines = upstream if upstream is not None else stdin
+        return iter_grep(patterns, None, recursive, ignore_case, jobs, mode, max_count, lines), True
+
+    def _parse_grep_args(self, args: list[str], has_input: bool):
+        """
+        Аргументы grep: [флаги] шаблон [путь]. Путь можно не указывать, если есть вход
+        (has_input) — тогда все аргументы без флагов составляют шаблон.
+        Возвращает (шаблоны, путь или None, -r, -1, -j, режим, -m) или None при ошибке
+        """
+        from src.commands.grep import read_patterns, MODE_LINES, MODE_FILES, MODE_COUNT
+
+        allowed_flags = {"-r", "-1", "-l", "-c"}
         recursive = False
         ignore_case = False
+        mode = MODE_LINES
+        jobs = None
+        max_count = None
+        patterns = None
+        used_flags = []
         unknown_flags = []
         non_flag_args = []
 
-        for arg in args:
+        args_iter = iter(args)
+        for arg in args_iter:
             if arg in allowed_flags:
-                if arg == "-r": recursive = True
-                if arg == "-1": ignore_case = True
-            elif arg.startswith("-"):
+                if arg == "-r":
+                    recursive = True
+                elif arg == "-1":
+                    ignore_case = True
+                elif arg == "-l":
+                    mode = MODE_FILES
+                elif arg == "-c":
+                    mode = MODE_COUNT
+                used_flags.append(arg)
+            elif arg in ("-j", "-m"):
+                value = next(args_iter, "")
+                if not value.isdigit() or int(value) < 1:
+                    msg = f"Ошибка: флаг {arg} требует положительное число"
+                    print(msg)
+                    write_log(f"ERROR: {msg}")
+                    return None
+                if arg == "-j":
+                    jobs = int(value)
+                else:
+                    max_count = int(value)
+                used_flags.append(f"{arg} {value}")
+            elif arg in ("-e", "-f"):
+                source = next(args_iter, None)
+                if source is None:
+                    msg = f"Ошибка: флаг {arg} требует значение"
+                    print(msg)
+                    write_log(f"ERROR: {msg}")
+                    return None
+                patterns = patterns or []
+                if arg == "-e":
+                    patterns.append(source)
+                else:
+                    try:
+                        patterns.extend(read_patterns(source))
+                    except Exception as e:
+                        msg = f"Ошибка: не удалось прочитать шаблоны из {source}: {e}"
+                        print(msg)
+                        write_log(f"ERROR: {msg}")
+                        return None
+                used_flags.append(f"{arg} \"{source}\"")
+            elif arg.startswith("-") and arg != "-":
                 unknown_flags.append(arg)
             else:
                 non_flag_args.append(arg)
 
-        if len(non_flag_args) < 2:
+        # Без пути: шаблон из -e/-f и нет других аргументов или ровно один аргумент-шаблон
+        from_input = has_input and len(non_flag_args) == (0 if patterns is not None else 1)
+        if not from_input and len(non_flag_args) < (1 if patterns is not None else 2):
             msg = "Ошибка: grep требует шаблон и путь для поиска"
             print(msg)
             write_log(f"ERROR: {msg}")
-            return
+            return None
 
-        # pattern — объединить все кроме последнего
-        pattern = " ".join(non_flag_args[:-1])
-        path = non_flag_args[-1]
+        # pattern — объединить все кроме последнего (если шаблоны не заданы через -e/-f)
+        path = None if from_input else non_flag_args[-1]
+        if patterns is None:
+            patterns = [" ".join(non_flag_args if from_input else non_flag_args[:-1])]
+            used_flags.append(f"\"{patterns[0]}\"")
+        elif len(non_flag_args) > 1:
+            msg = "Ошибка: с -e/-f указывается только путь для поиска"
+            print(msg)
+            write_log(f"ERROR: {msg}")
+            return None
 
         if unknown_flags:
             msg = f"Ошибка: не поддерживаемые флаги: {' '.join(unknown_flags)}"
             print(msg)
             write_log(f"ERROR: {msg}")
-            return
+            return None
 
-        log_cmd = f"grep {'-r ' if recursive else ''}{'-1 ' if ignore_case else ''}\"{pattern}\" {path}"
+        log_cmd = " ".join(["grep", *used_flags, path or "-"])
         write_log(log_cmd)
+        return patterns, path, recursive, ignore_case, jobs, mode, max_count
 
-        result = grep(pattern, path, recursive, ignore_case)
+    @command("index")
+    def cmd_index(self, args: list[str]):
+        from src.commands.index import build_index
+
+        if len(args) != 1:
+            msg = "Ошибка: index требует 1 аргумент: каталог"
+            print(msg)
+            write_log(f"ERROR: {msg}")
+            return False
+        folder = args[0]
+        write_log(f"index {folder}")
+        result = build_index(folder)
         print(result)
         write_log(result)
+        return not result.startswith("ERROR")
+
+    @command("history", log_success=False)
     def cmd_history(self, args: list[str]):
         n = 10
         if args and args[0].isdigit():
@@ -325,53 +812,107 @@ class Shell:
         for i, line in enumerate(hist, 1):
             print(f"{i}: {line}")
 
+    @command("stats", log_success=False)
+    def cmd_stats(self, args: list[str]):
+        """stats — задержки команд сессии (p50/p95/p99); stats reset | on | off"""
+        if not args:
+            for line in stats.format_stats():
+                print(line)
+            return True
+        if args == ["reset"]:
+            stats.reset()
+            print("Замеры сброшены")
+        elif args in (["on"], ["off"]):
+            stats.enabled = args[0] == "on"
+            print(f"Замеры {'включены' if stats.enabled else 'выключены'}")
+        else:
+            msg = f"Ошибка: stats принимает reset, on или off, а не {' '.join(args)}"
+            print(msg)
+            write_log(f"ERROR: {msg}")
+            return False
+        return True
+
+    @command("metrics", log_success=False)
+    def cmd_metrics(self, args: list[str]):
+        """metrics — куда пишутся метрики операций; metrics on [файл] | off"""
+        if not args:
+            print(f"Метрики пишутся в {metrics.path}" if metrics.path is not None else "Метрики выключены")
+            return True
+        if args[0] == "on" and len(args) <= 2:
+            metrics.path = os.path.abspath(os.path.expanduser(args[1] if len(args) == 2 else METRICS_FILE))
+            print(f"Метрики пишутся в {metrics.path}")
+        elif args == ["off"]:
+            metrics.path = None
+            print("Метрики выключены")
+        else:
+            msg = f"Ошибка: metrics принимает on [файл] или off, а не {' '.join(args)}"
+            print(msg)
+            write_log(f"ERROR: {msg}")
+            return False
+        return True
+
+    @command("undo", log_success=False)
     def cmd_undo(self, args: list[str]):
+        from src.commands.rm import rm, restore_from_trash
+        from src.commands.mv import mv
+
         last = pop_last()
         if last is None:
             print("Нет команд для отмены")
             write_log("ERROR: Нет команд для отмены")
-            return
-        
+            return False
+
         parts = last.split()
         if len(parts) < 2:
             print(f"Команду '{last}' нельзя отменить")
             write_log(f"ERROR: Команду '{last}' нельзя отменить")
-            return
-        
+            return False
+
         cmd = parts[0]
-        
-        if cmd == "cp":
+
+        if (cmd == "cp" and {"-u", "--sync", "--checksum"} & set(parts)) or \
+                (cmd == "rm" and "--purge" in parts) or cmd == "emptytrash":
+            # Синхронизация обновляет существующую копию — удалять её целиком нельзя;
+            # безвозвратно удалённое не вернуть
+            print(f"Команду '{last}' нельзя отменить")
+            write_log(f"ERROR: Команду '{last}' нельзя отменить")
+            return False
+
+        elif cmd == "cp":
             # cp src dst: удаляем dst
             dst = parts[-1]
             if Path(dst).exists():
                 print(f"Undo cp: удаление {dst}")
                 write_log(f"Undo cp: удаление {dst}")
-                rm(dst, recursive=True)
-            else:
-                print(f"Undo cp: {dst} не найден")
-                write_log(f"ERROR: Undo cp: {dst} не найден")
-        
+                return rm(dst, recursive=True)
+            print(f"Undo cp: {dst} не найден")
+            write_log(f"ERROR: Undo cp: {dst} не найден")
+            return False
+
         elif cmd == "mv":
-            # mv src dst: возвращаем обратно
-            src = parts[1]
-            dst = parts[-1]
+            # mv [-j N] src dst: возвращаем обратно
+            names = parts[1:]
+            if "-j" in names:
+                del names[names.index("-j"):names.index("-j") + 2]
+            src = names[0]
+            dst = names[-1]
             if Path(dst).exists():
                 print(f"Undo mv: возвращаем {dst} -> {src}")
                 write_log(f"Undo mv: возвращаем {dst} -> {src}")
-                mv(dst, src)
-            else:
-                print(f"Undo mv: {dst} не найден")
-                write_log(f"ERROR: Undo mv: {dst} не найден")
-        
+                return mv(dst, src)
+            print(f"Undo mv: {dst} не найден")
+            write_log(f"ERROR: Undo mv: {dst} не найден")
+            return False
+
         elif cmd == "rm":
-            # rm path: восстановление из .trash
-            path = parts[-1]
-            name = Path(path).name
-            print(f"Undo rm: восстановление {name} из .trash")
-            write_log(f"Undo rm: восстановление {name} из .trash")
-            restore_from_trash(name)
-        
-        else:
-            print(f"Команду '{last}' нельзя отменить")
-            write_log(f"ERROR: Команду '{last}' нельзя отменить")
+            # rm path ...: восстановление из корзины на прежнее место
+            ok = True
+            for path in [part for part in parts[1:] if not part.startswith("-")]:
+                print(f"Undo rm: восстановление {path} из корзины")
+                write_log(f"Undo rm: восстановление {path} из корзины")
+                ok = restore_from_trash(path) and ok
+            return ok
 
+        print(f"Команду '{last}' нельзя отменить")
+        write_log(f"ERROR: Команду '{last}' нельзя отменить")
+        return False
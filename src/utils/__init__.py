@@ -0,0 +1,10 @@
+from types import ModuleType
+
+
+def load_archive_fs() -> ModuleType:
+    """
+    Модуль archive_fs импортируется при первом пути внутрь архива:
+    zipfile и tarfile не грузятся, пока ls и cat работают с обычными файлами
+    """
+    from src.utils import archive_fs
+    return archive_fs
@@ -0,0 +1,174 @@
+import os
+import posixpath
+import stat
+import tarfile
+import time
+import zipfile
+from contextlib import ExitStack, contextmanager
+from typing import IO, Iterable, Iterator, NamedTuple
+
+from src.utils.gzindex import load_gz_index, member_info, open_at
+
+# Архивы, внутрь которых можно заходить как в каталог: release.zip/conf/app.yml
+ARCHIVE_SUFFIXES = (".zip", ".tar.gz", ".tgz")
+
+
+class Member(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+    mode: int
+    info: zipfile.ZipInfo | tarfile.TarInfo | None
+
+
+# Кэш индексов: архив -> (mtime_ns, размер, {имя: Member}, {каталог: [имена детей]})
+_indexes: dict[str, tuple[int, int, dict[str, Member], dict[str, list[str]]]] = {}
+
+
+def split_archive_path(path: str) -> tuple[str, str] | None:
+    """
+    Делит путь внутрь архива на путь к файлу архива и имя члена ("" — корень архива).
+    Для обычных путей возвращает None; stat делается только для частей с суффиксом архива
+    """
+    parts = os.path.normpath(os.path.expanduser(path)).split(os.sep)
+    for i in range(len(parts)):
+        if parts[i].lower().endswith(ARCHIVE_SUFFIXES):
+            archive = os.sep.join(parts[:i + 1]) or os.sep
+            if os.path.isfile(archive):
+                return os.path.realpath(archive), "/".join(parts[i + 1:])
+    return None
+
+
+def _read_members(archive: str) -> dict[str, Member]:
+    members: dict[str, Member] = {}
+    if archive.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                mode = info.external_attr >> 16
+                if info.is_dir():
+                    mode = stat.S_IFDIR | (stat.S_IMODE(mode) or 0o755)
+                elif not stat.S_ISREG(mode):
+                    mode = stat.S_IFREG | (stat.S_IMODE(mode) or 0o644)
+                members[info.filename.rstrip("/")] = Member(
+                    info.filename.rstrip("/"), info.file_size,
+                    time.mktime(info.date_time + (0, 0, -1)), mode, info)
+    else:
+        index = load_gz_index(archive)
+        with ExitStack() as stack:
+            tar_infos: Iterable[tarfile.TarInfo]
+            if index is not None:
+                tar_infos = [member_info(member) for member in index["members"]]
+            else:
+                # Без индекса (untar --index) заголовки читаются распаковкой всего архива
+                tar_infos = stack.enter_context(tarfile.open(archive, "r:gz"))
+            for tar_info in tar_infos:
+                if tar_info.isdir():
+                    mode = stat.S_IFDIR | tar_info.mode
+                elif tar_info.isfile():
+                    mode = stat.S_IFREG | tar_info.mode
+                else:
+                    continue
+                name = tar_info.name.rstrip("/")
+                members[name] = Member(name, tar_info.size, tar_info.mtime, mode, tar_info)
+    return members
+
+
+def _load(archive: str) -> tuple[dict[str, Member], dict[str, list[str]]]:
+    """Индекс членов архива; перечитывается, только если архив изменился"""
+    st = os.stat(archive)
+    cached = _indexes.get(archive)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2], cached[3]
+
+    members = _read_members(archive)
+    # Каталоги, которых нет в архиве явно, но в которых лежат члены
+    for name in list(members):
+        parent = posixpath.dirname(name)
+        while parent and parent not in members:
+            members[parent] = Member(parent, 0, st.st_mtime, stat.S_IFDIR | 0o755, None)
+            parent = posixpath.dirname(parent)
+    children: dict[str, list[str]] = {"": []}
+    for name, member in members.items():
+        if stat.S_ISDIR(member.mode):
+            children.setdefault(name, [])
+        children.setdefault(posixpath.dirname(name), []).append(name)
+
+    _indexes[archive] = (st.st_mtime_ns, st.st_size, members, children)
+    return members, children
+
+
+def member_stat(member: Member) -> os.stat_result:
+    """stat члена архива в виде os.stat_result — для ls"""
+    return os.stat_result((member.mode, 0, 0, 1, 0, 0, member.size,
+                           member.mtime, member.mtime, member.mtime))
+
+
+def _get(archive: str, name: str) -> Member | None:
+    members, _ = _load(archive)
+    if not name:
+        return None
+    member = members.get(name)
+    if member is None:
+        raise FileNotFoundError(f"{name} нет в архиве {archive}")
+    return member
+
+
+def is_dir(archive: str, name: str) -> bool:
+    member = _get(archive, name)
+    return member is None or stat.S_ISDIR(member.mode)
+
+
+def list_dir(archive: str, name: str) -> list[tuple[str, os.stat_result]]:
+    """Содержимое каталога архива (имя, stat); для файла — он сам, как ls"""
+    members, children = _load(archive)
+    member = _get(archive, name)
+    if member is not None and not stat.S_ISDIR(member.mode):
+        return [(posixpath.basename(name), member_stat(member))]
+    return [(posixpath.basename(child), member_stat(members[child])) for child in children[name]]
+
+
+def iter_files(archive: str, name: str, recursive: bool = False) -> Iterator[str]:
+    """Имена файлов архива: сам файл name или файлы каталога (с recursive — всех вложенных)"""
+    members, children = _load(archive)
+    if not is_dir(archive, name):
+        yield name
+        return
+    stack = [name]
+    while stack:
+        directory = stack.pop()
+        subdirs = []
+        for child in children[directory]:
+            if stat.S_ISDIR(members[child].mode):
+                subdirs.append(child)
+            else:
+                yield child
+        if recursive:
+            stack.extend(reversed(subdirs))
+
+
+@contextmanager
+def open_member(archive: str, name: str) -> Iterator[IO[bytes]]:
+    """Открывает файл архива на чтение (байты); данные распаковываются по мере чтения"""
+    member = _get(archive, name)
+    if member is None or member.info is None or stat.S_ISDIR(member.mode):
+        raise IsADirectoryError(f"{name or archive} — каталог архива")
+    if isinstance(member.info, zipfile.ZipInfo):
+        with zipfile.ZipFile(archive) as zf, zf.open(member.info) as f:
+            yield f
+        return
+    index = load_gz_index(archive)
+    with ExitStack() as stack:
+        info: tarfile.TarInfo | None = member.info
+        if index is None:
+            tar = stack.enter_context(tarfile.open(archive, "r:gz"))
+        else:
+            # Распаковка с ближайшей к члену контрольной точки индекса. Архив открыт не
+            # потоком (r|), а как файл: члены — обычные файловые объекты с readable/seekable
+            raw = stack.enter_context(open(archive, "rb"))
+            tar = stack.enter_context(
+                tarfile.open(fileobj=open_at(raw, index, member.info.offset), mode="r:"))
+            info = tar.next()
+        extracted = tar.extractfile(info) if info is not None else None
+        if extracted is None:
+            raise tarfile.ReadError("индекс не соответствует архиву")
+        yield stack.enter_context(extracted)
@@ -0,0 +1,62 @@
+import gzip
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.constants import GZ_BLOCK_SIZE
+
+
+class BlockGzipWriter:
+    """
+    Файлоподобный объект для записи gzip в несколько потоков (как pigz): поток данных
+    режется на блоки по block_size, каждый блок сжимается в пуле потоков (zlib отпускает GIL)
+    в отдельный gzip-член, члены пишутся по порядку. Склейка gzip-членов — корректный
+    gzip-файл, его читают gzip/tarfile и стандартные утилиты
+    """
+
+    def __init__(self, fileobj, level: int = 6, jobs: int | None = None,
+                 block_size: int = GZ_BLOCK_SIZE):
+        self.fp = fileobj
+        self.level = level
+        self.block_size = block_size
+        jobs = jobs or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=jobs)
+        # Не больше двух блоков на поток ждут записи — память ограничена
+        self.window = jobs * 2
+        self.pending: deque[Future[bytes]] = deque()
+        self.buffer = bytearray()
+        self.members = 0
+
+    def write(self, data) -> int:
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block: bytes):
+        self.pending.append(self.pool.submit(gzip.compress, block, self.level, mtime=0))
+        while len(self.pending) > self.window:
+            self.fp.write(self.pending.popleft().result())
+        self.members += 1
+
+    def close(self):
+        """Сжимает остаток и дописывает все члены; исходный fileobj не закрывается"""
+        try:
+            if self.buffer or not self.members:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self.fp.write(self.pending.popleft().result())
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.pool.shutdown(wait=True, cancel_futures=True)
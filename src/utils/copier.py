@@ -0,0 +1,250 @@
+import hashlib
+import os
+import shutil
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator
+
+from src.constants import COPY_CHUNK_SIZE, CP_QUEUE_PER_WORKER, CP_WORKERS, HASH_CHUNK_SIZE
+
+
+def _copy_data(infd: int, outfd: int) -> None:
+    """
+    Копирует данные между дескрипторами в ядре: copy_file_range, затем sendfile,
+    а если ни один не поддерживается для этой пары файлов — обычным чтением/записью
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while os.copy_file_range(infd, outfd, COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError:
+            # Например, EXDEV на старых ядрах — продолжаем с текущих позиций
+            pass
+    if hasattr(os, "sendfile"):
+        try:
+            while os.sendfile(outfd, infd, None, COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError:
+            pass
+    while True:
+        chunk = os.read(infd, COPY_CHUNK_SIZE)
+        if not chunk:
+            return
+        os.write(outfd, chunk)
+
+
+def copy_file(src: str, dst: str) -> int:
+    """Копирует файл с метаданными, как shutil.copy2. Возвращает число байт"""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        _copy_data(fsrc.fileno(), fdst.fileno())
+    shutil.copystat(src, dst)
+    return size
+
+
+def walk_tree(src: str, follow_symlinks: bool = True) -> tuple[list[str], list[str], list[tuple[str, str, str]]]:
+    """
+    Обходит дерево (по ссылкам на каталоги тоже, как copytree без symlinks).
+    Возвращает относительные пути каталогов (родители раньше детей), файлов
+    и ошибки в формате shutil.Error для прочих объектов.
+    С follow_symlinks=False ссылки не раскрываются и попадают в список файлов
+    """
+    dirs = [""]
+    files = []
+    errors = []
+    for rel_dir in dirs:
+        with os.scandir(os.path.join(src, rel_dir)) as it:
+            for entry in it:
+                rel = os.path.join(rel_dir, entry.name)
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    dirs.append(rel)
+                elif entry.is_file() or (not follow_symlinks and entry.is_symlink()):
+                    files.append(rel)
+                else:
+                    errors.append((entry.path, rel, "не обычный файл (ссылка в никуда или специальный файл)"))
+    return dirs, files, errors
+
+
+def _submit_bounded(fn: Callable[..., Any], files: list[str], src: str, dst: str,
+                   jobs: int | None = None, *args) -> Iterator[tuple[str, Future]]:
+    """
+    Выполняет fn(src/rel, dst/rel, *args) для каждого rel в пуле потоков и отдаёт (rel, Future)
+    в порядке files. В очереди не больше потоков * CP_QUEUE_PER_WORKER задач: память
+    на Future не растёт с числом файлов в дереве
+    """
+    workers = jobs or CP_WORKERS
+    pending: deque[tuple[str, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rel in files:
+            if len(pending) >= workers * CP_QUEUE_PER_WORKER:
+                yield pending.popleft()
+            pending.append((rel, pool.submit(fn, os.path.join(src, rel), os.path.join(dst, rel), *args)))
+        while pending:
+            yield pending.popleft()
+
+
+def copy_tree(src: str, dst: str, jobs: int | None = None) -> tuple[int, int]:
+    """
+    Копирует каталог: сначала создаёт все подкаталоги, затем копирует файлы в пуле потоков.
+    Как shutil.copytree: dst не должен существовать, ошибки собираются в shutil.Error.
+    Возвращает число скопированных файлов и байт
+    """
+    dirs, files, errors = walk_tree(src)
+    os.makedirs(dst)
+    for rel in dirs[1:]:
+        os.mkdir(os.path.join(dst, rel))
+
+    copied = 0
+    total = 0
+    for rel, future in _submit_bounded(copy_file, files, src, dst, jobs):
+        try:
+            total += future.result()
+            copied += 1
+        except OSError as e:
+            errors.append((os.path.join(src, rel), os.path.join(dst, rel), str(e)))
+
+    # Метаданные каталогов — после файлов, иначе запись в каталог сбросит mtime
+    for rel in reversed(dirs):
+        try:
+            shutil.copystat(os.path.join(src, rel), os.path.join(dst, rel))
+        except OSError as e:
+            errors.append((os.path.join(src, rel), os.path.join(dst, rel), str(e)))
+
+    if errors:
+        raise shutil.Error(errors)
+    return copied, total
+
+
+def file_digest(path: str) -> bytes:
+    """Контрольная сумма содержимого файла"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def is_unchanged(src: str, dst: str, checksum: bool = False) -> tuple[bool, int]:
+    """
+    Совпадает ли dst с src: размер и mtime (с точностью до секунды, как у rsync),
+    а с checksum — размер и содержимое. Возвращает признак и размер src
+    """
+    src_st = os.stat(src)
+    try:
+        dst_st = os.stat(dst)
+    except FileNotFoundError:
+        return False, src_st.st_size
+    if dst_st.st_size != src_st.st_size:
+        return False, src_st.st_size
+    if checksum:
+        return file_digest(src) == file_digest(dst), src_st.st_size
+    return int(dst_st.st_mtime) == int(src_st.st_mtime), src_st.st_size
+
+
+def sync_file(src: str, dst: str, checksum: bool = False) -> tuple[bool, int]:
+    """Копирует файл, только если dst отсутствует или отличается. Возвращает (скопирован, байт)"""
+    unchanged, size = is_unchanged(src, dst, checksum)
+    if unchanged:
+        return False, size
+    return True, copy_file(src, dst)
+
+
+def sync_tree(src: str, dst: str, jobs: int | None = None,
+              checksum: bool = False) -> tuple[int, int, int, int]:
+    """
+    Синхронизирует каталог dst с src: недостающие и изменённые файлы копируются,
+    совпадающие пропускаются, лишние файлы в dst не трогаются.
+    Возвращает (скопировано файлов, байт, пропущено файлов, байт)
+    """
+    dirs, files, errors = walk_tree(src)
+    for rel in dirs:
+        os.makedirs(os.path.join(dst, rel), exist_ok=True)
+
+    copied = copied_bytes = skipped = skipped_bytes = 0
+    for rel, future in _submit_bounded(sync_file, files, src, dst, jobs, checksum):
+        try:
+            was_copied, size = future.result()
+        except OSError as e:
+            errors.append((os.path.join(src, rel), os.path.join(dst, rel), str(e)))
+            continue
+        if was_copied:
+            copied += 1
+            copied_bytes += size
+        else:
+            skipped += 1
+            skipped_bytes += size
+
+    for rel in reversed(dirs):
+        try:
+            shutil.copystat(os.path.join(src, rel), os.path.join(dst, rel))
+        except OSError as e:
+            errors.append((os.path.join(src, rel), os.path.join(dst, rel), str(e)))
+
+    if errors:
+        raise shutil.Error(errors)
+    return copied, copied_bytes, skipped, skipped_bytes
+
+
+def move_file(src: str, dst: str) -> tuple[bool, int]:
+    """
+    Переносит файл на другое устройство: копирует (если готовой копии ещё нет),
+    сверяет содержимое копии с исходником и только после этого удаляет исходник.
+    Ссылка переносится как ссылка. Возвращает (скопирован, байт)
+    """
+    if os.path.islink(src):
+        target = os.readlink(src)
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        os.symlink(target, dst)
+        os.unlink(src)
+        return True, 0
+    copied, size = sync_file(src, dst)
+    if file_digest(src) != file_digest(dst):
+        raise OSError(f"копия '{dst}' не совпадает с исходным файлом")
+    os.unlink(src)
+    return copied, size
+
+
+def move_tree(src: str, dst: str, jobs: int | None = None,
+              progress: Callable[[int, int, int, int], None] | None = None) -> tuple[int, int, int]:
+    """
+    Переносит каталог на другое устройство: файлы копируются в пуле потоков, каждый
+    исходник удаляется сразу после проверки копии, пустые каталоги — в конце.
+    Прерванный перенос можно повторить: уже перенесённых файлов в src нет, а готовые
+    копии (тот же размер и mtime) не копируются заново.
+    progress(файлов готово, всего, байт готово, всего) вызывается после каждого файла.
+    Возвращает (перенесено файлов, из них скопировано, байт)
+    """
+    dirs, files, errors = walk_tree(src, follow_symlinks=False)
+    for rel in dirs:
+        os.makedirs(os.path.join(dst, rel), exist_ok=True)
+    total_bytes = sum(os.lstat(os.path.join(src, rel)).st_size for rel in files
+                      if not os.path.islink(os.path.join(src, rel)))
+
+    moved = copied = done_bytes = 0
+    for rel, future in _submit_bounded(move_file, files, src, dst, jobs):
+        try:
+            was_copied, size = future.result()
+        except OSError as e:
+            errors.append((os.path.join(src, rel), os.path.join(dst, rel), str(e)))
+            continue
+        moved += 1
+        copied += was_copied
+        done_bytes += size
+        if progress is not None:
+            progress(moved, len(files), done_bytes, total_bytes)
+
+    # Метаданные каталогов переносятся до удаления исходных каталогов
+    for rel in reversed(dirs):
+        try:
+            shutil.copystat(os.path.join(src, rel), os.path.join(dst, rel))
+            if not errors:
+                os.rmdir(os.path.join(src, rel))
+        except OSError as e:
+            errors.append((os.path.join(src, rel), os.path.join(dst, rel), str(e)))
+
+    if errors:
+        raise shutil.Error(errors)
+    return moved, copied, done_bytes
@@ -0,0 +1,183 @@
+import bisect
+import io
+import json
+import os
+import tarfile
+import zlib
+from typing import BinaryIO, Callable
+
+from src.constants import GZ_INDEX_SPACING, GZ_INDEX_SUFFIX, GZ_READ_BLOCK
+
+_INDEX_VERSION = 2
+
+
+class GzipStream(io.RawIOBase):
+    """
+    Чтение склейки gzip-членов с контрольной точки — начала члена (сжатое и несжатое смещения).
+    on_member(сжатое, несжатое смещение) вызывается в начале каждого следующего члена.
+    Позиции — несжатые смещения от начала архива; seek возможен только вперёд
+    """
+
+    def __init__(self, f: BinaryIO, comp_offset: int = 0, uncomp_offset: int = 0,
+                 on_member: Callable[[int, int], None] | None = None):
+        super().__init__()
+        self.f = f
+        self.f.seek(comp_offset)
+        self.file_pos = comp_offset
+        # Несжатое смещение: выданных read данных и всех распакованных данных
+        self.pos = uncomp_offset
+        self.produced = uncomp_offset
+        self.on_member = on_member
+        self.decompressor: zlib._Decompress | None = None
+        # Сжатые байты, прочитанные из файла, но ещё не переданные распаковщику
+        self.pending = b""
+        self.buf = memoryview(b"")
+
+    def _fill(self) -> bool:
+        """Распаковывает следующую порцию; False — конец архива"""
+        while not self.buf:
+            if not self.pending:
+                self.pending = self.f.read(GZ_READ_BLOCK)
+                self.file_pos += len(self.pending)
+                if not self.pending:
+                    if self.decompressor is not None:
+                        raise EOFError("архив gzip обрывается посреди члена")
+                    return False
+            if self.decompressor is None:
+                if self.on_member is not None:
+                    self.on_member(self.file_pos - len(self.pending), self.produced)
+                self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            out = self.decompressor.decompress(self.pending, GZ_READ_BLOCK)
+            if self.decompressor.eof:
+                self.pending = self.decompressor.unused_data
+                self.decompressor = None
+            else:
+                self.pending = self.decompressor.unconsumed_tail
+            self.produced += len(out)
+            self.buf = memoryview(out)
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("seek от конца архива gzip не поддерживается")
+        if offset < self.pos:
+            raise io.UnsupportedOperation("поток gzip читается только вперёд")
+        self.skip_to(offset)
+        return self.pos
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def read(self, size: int | None = -1) -> bytes:
+        if size is None:
+            size = -1
+        parts = []
+        while size != 0 and self._fill():
+            chunk = self.buf if size < 0 else self.buf[:size]
+            self.buf = self.buf[len(chunk):]
+            self.pos += len(chunk)
+            parts.append(bytes(chunk))
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(parts)
+
+    def skip_to(self, offset: int) -> None:
+        """Распаковывает и отбрасывает данные до несжатого смещения offset"""
+        while self.pos < offset and self._fill():
+            step = min(len(self.buf), offset - self.pos)
+            self.buf = self.buf[step:]
+            self.pos += step
+
+
+def index_path(archive: str) -> str:
+    return archive + GZ_INDEX_SUFFIX
+
+
+def build_gz_index(archive: str) -> dict:
+    """
+    Один проход по tar.gz: контрольные точки на границах gzip-членов (не чаще GZ_INDEX_SPACING
+    несжатых байт) и смещения членов tar. Индекс сохраняется рядом с архивом (.idx)
+    """
+    st = os.stat(archive)
+    checkpoints: list[tuple[int, int]] = []
+
+    def on_member(comp_offset: int, uncomp_offset: int):
+        if not checkpoints or uncomp_offset - checkpoints[-1][1] >= GZ_INDEX_SPACING:
+            checkpoints.append((comp_offset, uncomp_offset))
+
+    members = []
+    with open(archive, "rb") as raw:
+        stream = GzipStream(raw, on_member=on_member)
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for info in tar:
+                # Тип члена — байт (b"0", b"5"...): в JSON хранится строкой latin-1
+                members.append((info.name, info.offset, info.size, info.mtime, info.mode,
+                                info.type.decode("latin-1")))
+
+    index = {"version": _INDEX_VERSION, "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+             "checkpoints": checkpoints, "members": members}
+    tmp_path = index_path(archive) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path(archive))
+    return index
+
+
+def load_gz_index(archive: str) -> dict | None:
+    """
+    Индекс архива, если он есть и построен для текущей версии архива.
+    Повреждённый или чужого формата индекс — как отсутствующий (None)
+    """
+    try:
+        with open(index_path(archive), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        st = os.stat(archive)
+        if (not isinstance(data, dict) or data.get("version") != _INDEX_VERSION
+                or data["mtime_ns"] != st.st_mtime_ns or data["size"] != st.st_size):
+            return None
+        checkpoints = [(int(comp), int(uncomp)) for comp, uncomp in data["checkpoints"]]
+        members = [_member_record(*member) for member in data["members"]]
+    except (OSError, ValueError, TypeError, KeyError, AttributeError):
+        return None
+    if not checkpoints:
+        return None
+    return {**data, "checkpoints": checkpoints, "members": members}
+
+
+def _member_record(name, offset, size, mtime, mode, member_type) -> tuple:
+    """Член tar из JSON индекса с проверкой типов (TypeError/ValueError — индекс повреждён)"""
+    if not isinstance(name, str) or not isinstance(mtime, (int, float)):
+        raise TypeError("повреждённая запись члена")
+    return name, int(offset), int(size), mtime, int(mode), member_type.encode("latin-1")
+
+
+def checkpoint_for(index: dict, offset: int) -> tuple[int, int]:
+    """Ближайшая контрольная точка не дальше несжатого смещения offset"""
+    checkpoints = index["checkpoints"]
+    i = bisect.bisect_right(checkpoints, offset, key=lambda checkpoint: checkpoint[1]) - 1
+    return checkpoints[max(i, 0)]
+
+
+def member_info(member: tuple) -> tarfile.TarInfo:
+    """TarInfo члена из индекса (без данных; offset — начало заголовка в несжатом потоке)"""
+    name, offset, size, mtime, mode, member_type = member
+    info = tarfile.TarInfo(name)
+    info.offset, info.size, info.mtime, info.mode, info.type = offset, size, mtime, mode, member_type
+    return info
+
+
+def open_at(f: BinaryIO, index: dict, offset: int) -> GzipStream:
+    """Поток несжатых данных архива с позиции offset: распаковка с ближайшей контрольной точки"""
+    stream = GzipStream(f, *checkpoint_for(index, offset))
+    stream.skip_to(offset)
+    return stream
@@ -1,26 +1,155 @@
 import os
+from collections import deque
+from contextlib import contextmanager
+
+from src.constants import HISTORY_CACHE_SIZE, HISTORY_READ_BLOCK
 
 HISTORY_FILE = ".history"
 
+
+class _HistoryCache:
+    """Последние записи файла истории со смещениями их начала в файле"""
+
+    def __init__(self, entries: list[tuple[int, str]], size: int, complete: bool):
+        self.entries = deque(entries, maxlen=HISTORY_CACHE_SIZE)
+        # Размер файла, которому соответствует кэш
+        self.size = size
+        # В кэше весь файл, а не только его хвост
+        self.complete = complete and len(entries) <= HISTORY_CACHE_SIZE
+
+
+# Кэш по абсолютному пути файла истории
+_caches: dict[str, _HistoryCache] = {}
+# Пакетный режим: ещё не записанные команды по пути файла истории; None — запись сразу
+_pending: dict[str, list[str]] | None = None
+
+
+def _read_tail(path: str, n: int) -> tuple[list[tuple[int, str]], int, bool]:
+    """
+    Читает последние n записей, двигаясь блоками от конца файла.
+    Возвращает записи (смещение, строка), размер файла и признак, что прочитан весь файл
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        pos = size
+        data = b""
+        # n + 1 перевод строки гарантирует, что первая из n записей прочитана целиком
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(HISTORY_READ_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    entries = []
+    start = 0
+    while start < len(data):
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data) - 1
+        entries.append((pos + start, data[start:end + 1]))
+        start = end + 1
+    if pos > 0:
+        # Первый фрагмент — хвост записи, начало которой осталось до pos
+        entries = entries[1:]
+    complete = pos == 0 and len(entries) <= n
+    entries = entries[-n:] if n > 0 else []
+    return [(offset, line.decode("utf-8", errors="replace").strip()) for offset, line in entries], size, complete
+
+
+def _load(path: str) -> _HistoryCache | None:
+    """Кэш истории; перечитывает хвост файла, если его изменили не мы"""
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        _caches.pop(path, None)
+        return None
+    cache = _caches.get(path)
+    if cache is None or cache.size != size or (not cache.entries and not cache.complete):
+        entries, size, complete = _read_tail(path, HISTORY_CACHE_SIZE)
+        cache = _caches[path] = _HistoryCache(entries, size, complete)
+    return cache
+
+
+def _append(path: str, cmds: list[str]):
+    """Дописывает команды в файл истории одной записью и обновляет кэш"""
+    cache = _caches.get(path)
+    lines = [(cmd + "\n").encode("utf-8") for cmd in cmds]
+    with open(path, "ab") as f:
+        start = f.seek(0, os.SEEK_END)
+        f.write(b"".join(lines))
+        size = f.tell()
+    if cache is not None and cache.size == start:
+        offset = start
+        for cmd, line in zip(cmds, lines):
+            cache.entries.append((offset, cmd.strip()))
+            offset += len(line)
+        cache.size = size
+        if len(cache.entries) == HISTORY_CACHE_SIZE:
+            cache.complete = False
+    else:
+        _caches.pop(path, None)
+
+
 def add_history(cmd: str):
-    with open(HISTORY_FILE, "a", encoding="utf-8") as f:
-        f.write(cmd + "\n")
+    path = os.path.abspath(HISTORY_FILE)
+    if _pending is not None:
+        _pending.setdefault(path, []).append(cmd)
+        return
+    _append(path, [cmd])
+
+
+def flush_history():
+    """Записывает команды, накопленные в пакетном режиме"""
+    if not _pending:
+        return
+    items = list(_pending.items())
+    _pending.clear()
+    for path, cmds in items:
+        _append(path, cmds)
+
+
+def reset_cache():
+    """Забывает прочитанные хвосты файлов истории: следующее чтение пойдёт с диска"""
+    _caches.clear()
+
+
+@contextmanager
+def batched_history():
+    """
+    Пакетный режим (скрипты): add_history копит команды в памяти, а на диск они
+    пишутся одним вызовом на файл — перед history/undo и при выходе из блока
+    """
+    global _pending
+    _pending = {}
+    try:
+        yield
+    finally:
+        flush_history()
+        _pending = None
+
 
 def get_history(n=10):
-    if not os.path.exists(HISTORY_FILE):
+    flush_history()
+    path = os.path.abspath(HISTORY_FILE)
+    cache = _load(path)
+    if cache is None or n <= 0:
         return []
-    with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    return [line.strip() for line in lines[-n:]]
+    if n <= len(cache.entries) or cache.complete:
+        return [line for _, line in list(cache.entries)[-n:]]
+    # Запрошено больше, чем помещается в кэш — читаем нужный хвост с диска
+    entries, _, _ = _read_tail(path, n)
+    return [line for _, line in entries]
+
 
 def pop_last():
-    if not os.path.exists(HISTORY_FILE):
-        return None
-    with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    if not lines:
+    flush_history()
+    path = os.path.abspath(HISTORY_FILE)
+    cache = _load(path)
+    if cache is None or not cache.entries:
         return None
-    last = lines[-1].strip()
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        f.writelines(lines[:-1])
+    offset, last = cache.entries.pop()
+    # Последняя запись отрезается от файла на месте, без перезаписи остального
+    with open(path, "r+b") as f:
+        f.truncate(offset)
+    cache.size = offset
     return last
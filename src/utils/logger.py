@@ -1,6 +1,141 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from src.constants import (LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_MAX_MESSAGE,
+                           LOG_FLUSH_INTERVAL, LOG_BATCH_LINES)
+
+# Очередь списков записей (путь к логу, строка); пишет её фоновый поток пачками
+_queue: queue.Queue[list[tuple[str, str]]] = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+# Пакетный режим: записи, ещё не переданные в очередь; None — каждая запись сразу в очередь
+_pending: list[tuple[str, str]] | None = None
+# Последняя метка времени: (секунда, строка) — strftime раз в секунду, а не на каждое сообщение
+_stamp: tuple[int, str] = (0, "")
+
+
+def _timestamp() -> str:
+    global _stamp
+    second = int(time.time())
+    if _stamp[0] != second:
+        _stamp = (second, datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S"))
+    return _stamp[1]
+
+
 def write_log(message: str):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("shell.log", "a", encoding="utf-8") as f:
-        f.write(f"[{timestamp}] {message}\n")
+    """Ставит сообщение в очередь лога, не дожидаясь записи на диск"""
+    if len(message) > LOG_MAX_MESSAGE:
+        message = f"{message[:LOG_MAX_MESSAGE]}... [обрезано {len(message) - LOG_MAX_MESSAGE} символов]"
+    # Путь фиксируется сейчас: к моменту записи текущая директория может смениться
+    write_line(os.path.join(os.getcwd(), LOG_FILE), f"[{_timestamp()}] {message}\n")
+
+
+def write_line(path: str, line: str):
+    """Ставит готовую строку для файла path в очередь того же фонового писателя (метрики)"""
+    entry = (path, line)
+    if _pending is None:
+        _queue.put([entry])
+        _start_writer()
+        return
+    _pending.append(entry)
+    if len(_pending) >= LOG_BATCH_LINES:
+        _put_pending()
+
+
+def _put_pending():
+    """Передаёт накопленные в пакетном режиме записи фоновому потоку одним элементом очереди"""
+    global _pending
+    batch, _pending = _pending, []
+    _queue.put(batch)
+    _start_writer()
+
+
+@contextmanager
+def batched_log():
+    """Пакетный режим (скрипты): сообщения передаются писателю пачками по LOG_BATCH_LINES"""
+    global _pending
+    _pending = []
+    try:
+        yield
+    finally:
+        if _pending:
+            _put_pending()
+        _pending = None
+
+
+def flush_log():
+    """Дожидается записи всех сообщений из очереди"""
+    if _pending:
+        _put_pending()
+    if _writer is not None:
+        _queue.join()
+
+
+def _start_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="shell-log-writer", daemon=True)
+            _writer.start()
+
+
+def _writer_loop():
+    while True:
+        batch = list(_queue.get())
+        items = 1
+        # Даём накопиться остальным сообщениям команды и забираем их одной пачкой
+        time.sleep(LOG_FLUSH_INTERVAL)
+        while True:
+            try:
+                batch.extend(_queue.get_nowait())
+            except queue.Empty:
+                break
+            items += 1
+        try:
+            _write_batch(batch)
+        except Exception:
+            # Ошибка записи лога не должна ронять оболочку
+            pass
+        finally:
+            for _ in range(items):
+                _queue.task_done()
+
+
+def _write_batch(batch: list[tuple[str, str]]):
+    by_path: dict[str, list[str]] = {}
+    for path, line in batch:
+        by_path.setdefault(path, []).append(line)
+    for path, lines in by_path.items():
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            size = f.tell()
+        if size >= LOG_MAX_BYTES:
+            _rotate(path)
+
+
+def _rotate(path: str):
+    """shell.log -> shell.log.1.gz, старые сегменты сдвигаются, лишние удаляются"""
+    # Ротация редка — gzip и shutil не замедляют запуск оболочки
+    import gzip
+    import shutil
+
+    oldest = f"{path}.{LOG_BACKUP_COUNT}.gz"
+    if os.path.exists(oldest):
+        os.remove(oldest)
+    for i in range(LOG_BACKUP_COUNT - 1, 0, -1):
+        segment = f"{path}.{i}.gz"
+        if os.path.exists(segment):
+            os.replace(segment, f"{path}.{i + 1}.gz")
+    with open(path, "rb") as src, gzip.open(f"{path}.1.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+
+
+atexit.register(flush_log)
@@ -0,0 +1,66 @@
+import json
+import os
+from datetime import datetime
+
+from src.constants import METRICS_ENABLED, METRICS_FILE
+from src.utils.logger import write_line
+
+# Файл JSON-строк с метриками (абсолютный путь); None — метрики выключены (metrics on/off)
+path: str | None = os.path.abspath(METRICS_FILE) if METRICS_ENABLED else None
+
+# Счётчики текущей операции; None — операция не замеряется и add ничего не делает
+_current: dict[str, int] | None = None
+# Каталог текущей операции: определяется до неё — mv и rm уносят исходный путь
+_dir = ""
+
+
+def begin(args: list[str]):
+    """Начало замеряемой операции с аргументами args: обнуляет счётчики"""
+    global _current, _dir
+    _dir = _operation_dir(args)
+    _current = {"files": 0, "bytes_read": 0, "bytes_written": 0, "errors": 0}
+
+
+def add(files: int = 0, read: int = 0, written: int = 0, errors: int = 0):
+    """
+    Команды сообщают сюда, сколько файлов обошли, сколько байт прочитали и записали
+    и сколько было ошибок. Вне замера (метрики выключены) — одна проверка
+    """
+    if _current is None:
+        return
+    _current["files"] += files
+    _current["bytes_read"] += read
+    _current["bytes_written"] += written
+    _current["errors"] += errors
+
+
+def measuring() -> bool:
+    """Идёт ли замер: для счётчиков, которые стоят лишних системных вызовов"""
+    return _current is not None
+
+
+def end(command: str, args: list[str], ok: bool, ns: int):
+    """Конец операции: одна JSON-строка в файл метрик через фоновый писатель лога"""
+    global _current
+    counters, _current = _current, None
+    if counters is None or path is None:
+        return
+    if not ok and not counters["errors"]:
+        counters["errors"] = 1
+    record = {"time": datetime.now().isoformat(timespec="milliseconds"), "command": command,
+              "args": args, "cwd": os.getcwd(), "dir": _dir, "ok": ok,
+              "wall_ms": round(ns / 1e6, 3), **counters}
+    write_line(path, json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _operation_dir(args: list[str]) -> str:
+    """Каталог операции для группировки: первый существующий путь из аргументов (для файла — его каталог)"""
+    for arg in args:
+        if arg.startswith("-"):
+            continue
+        candidate = os.path.abspath(os.path.expanduser(arg))
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.exists(candidate):
+            return os.path.dirname(candidate)
+    return os.getcwd()
@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from src.constants import RM_WORKERS
+
+
+def _unlink(path: str, st: os.stat_result | None = None) -> int:
+    """Удаляет файл или ссылку; возвращает освобождённые байты"""
+    size = (st or os.lstat(path)).st_size
+    os.unlink(path)
+    return size
+
+
+def _clear_dir(path: str) -> tuple[list[str], int, int, list[str]]:
+    """Удаляет файлы каталога; возвращает подкаталоги, число файлов, байты и ошибки"""
+    subdirs = []
+    files = 0
+    freed = 0
+    errors = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        freed += _unlink(entry.path, entry.stat(follow_symlinks=False))
+                        files += 1
+                except OSError as e:
+                    errors.append(f"{entry.path}: {e}")
+    except OSError as e:
+        errors.append(f"{path}: {e}")
+    return subdirs, files, freed, errors
+
+
+def remove_trees(paths: list[str], jobs: int | None = None) -> tuple[int, int, list[str]]:
+    """
+    Безвозвратно удаляет файлы и каталоги. Каталоги обходятся через scandir в пуле потоков:
+    каждая задача удаляет файлы одного каталога и возвращает его подкаталоги;
+    затем пустые каталоги удаляются уровнями, начиная с самых глубоких.
+    Возвращает число удалённых файлов, освобождённые байты и ошибки
+    """
+    files = 0
+    freed = 0
+    errors = []
+    # Каталоги по глубине вложенности
+    levels: list[list[str]] = []
+
+    with ThreadPoolExecutor(max_workers=jobs or RM_WORKERS) as pool:
+        pending = {}
+        for path in paths:
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    pending[pool.submit(_clear_dir, path)] = (path, 0)
+                else:
+                    freed += _unlink(path)
+                    files += 1
+            except OSError as e:
+                errors.append(f"{path}: {e}")
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, depth = pending.pop(future)
+                if len(levels) <= depth:
+                    levels.append([])
+                levels[depth].append(path)
+                subdirs, dir_files, dir_freed, dir_errors = future.result()
+                files += dir_files
+                freed += dir_freed
+                errors.extend(dir_errors)
+                for subdir in subdirs:
+                    pending[pool.submit(_clear_dir, subdir)] = (subdir, depth + 1)
+
+        for level in reversed(levels):
+            for path, error in zip(level, pool.map(_rmdir, level)):
+                if error:
+                    errors.append(f"{path}: {error}")
+
+    return files, freed, errors
+
+
+def _rmdir(path: str) -> str | None:
+    try:
+        os.rmdir(path)
+    except OSError as e:
+        return str(e)
+    return None
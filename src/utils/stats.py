@@ -0,0 +1,80 @@
+from src.constants import STATS_ENABLED, STATS_MANTISSA_BITS
+
+# Замеры включены (stats on/off); выключенные стоят одной проверки флага на команду
+enabled = STATS_ENABLED
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек в наносекундах постоянного размера: корзины по степеням двойки,
+    каждая поделена на 2**(STATS_MANTISSA_BITS - 1) частей, — относительная ошибка
+    перцентиля не больше 2**-(STATS_MANTISSA_BITS - 1)
+    """
+
+    __slots__ = ("count", "errors", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.max = 0
+        # Ключ корзины -> число замеров; ключи возрастают вместе с задержкой
+        self.buckets: dict[int, int] = {}
+
+    def record(self, ns: int, ok: bool = True):
+        self.count += 1
+        self.errors += not ok
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        shift = max(0, ns.bit_length() - STATS_MANTISSA_BITS)
+        key = (shift << STATS_MANTISSA_BITS) | (ns >> shift)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def percentile(self, p: float) -> int:
+        """Верхняя граница корзины, в которую попадает p-й перцентиль (не больше максимума)"""
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * p // 100))
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= target:
+                shift = key >> STATS_MANTISSA_BITS
+                mantissa = key & ((1 << STATS_MANTISSA_BITS) - 1)
+                return min(((mantissa + 1) << shift) - 1, self.max)
+        return self.max
+
+
+# Гистограммы по имени команды (у конвейера — имена стадий через '|')
+_histograms: dict[str, LatencyHistogram] = {}
+
+
+def record(command: str, ns: int, ok: bool = True):
+    histogram = _histograms.get(command)
+    if histogram is None:
+        histogram = _histograms[command] = LatencyHistogram()
+    histogram.record(ns, ok)
+
+
+def histograms() -> dict[str, LatencyHistogram]:
+    return dict(_histograms)
+
+
+def reset():
+    _histograms.clear()
+
+
+def format_stats() -> list[str]:
+    """Таблица для stats: вызовы, ошибки, p50/p95/p99, максимум и сумма, мс"""
+    if not _histograms:
+        return ["Нет замеров"]
+    lines = [f"{'команда':<16} {'вызовов':>8} {'ошибок':>7} {'p50':>10} {'p95':>10} "
+             f"{'p99':>10} {'max':>10} {'сумма':>11}"]
+    for name, h in sorted(_histograms.items(), key=lambda item: item[1].total, reverse=True):
+        ms = [value / 1e6 for value in (h.percentile(50), h.percentile(95), h.percentile(99),
+                                        h.max, h.total)]
+        lines.append(f"{name:<16} {h.count:>8} {h.errors:>7} {ms[0]:>10.3f} {ms[1]:>10.3f} "
+                     f"{ms[2]:>10.3f} {ms[3]:>10.3f} {ms[4]:>11.3f}")
+    lines.append("Время в миллисекундах")
+    return lines
@@ -0,0 +1,238 @@
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import IO
+
+from src.constants import (ZIP_STORED_EXTENSIONS, ZIP_INLINE_BYTES, ZIP_PARALLEL_MIN_BYTES,
+                           COPY_CHUNK_SIZE)
+from src.utils import metrics
+from src.utils.copier import walk_tree
+
+STORED = 0
+DEFLATED = 8
+
+# Поля ZIP, которые не помещаются в 32 бита, пишутся в расширение ZIP64
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_COUNT_LIMIT = 0xFFFF
+# UTF-8 в именах файлов
+_FLAG_UTF8 = 0x800
+
+
+def _dos_datetime(mtime: float) -> tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def compress_member(path: str, level: int, tmp_dir: str) -> tuple[int, int, int, int, bytes | str | None]:
+    """
+    Сжимает файл «сырым» deflate (без заголовков zlib), как того требует ZIP.
+    Небольшой результат возвращается байтами, большой — путём к временному файлу в tmp_dir.
+    Если сжатие не уменьшает файл (или level == 0, или расширение из ZIP_STORED_EXTENSIONS),
+    данные не возвращаются (None): файл пишется в архив как есть.
+    Возвращает (метод, crc32, размер сжатых данных, размер файла, данные)
+    """
+    store = level == 0 or os.path.splitext(path)[1].lower() in ZIP_STORED_EXTENSIONS
+    crc = 0
+    size = 0
+    with open(path, "rb") as f:
+        if store:
+            while chunk := f.read(COPY_CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+            return STORED, crc, size, size, None
+
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        parts: list[bytes] = []
+        inline_size = 0
+        out: IO[bytes] | None = None
+        try:
+            while chunk := f.read(COPY_CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                data = compressor.compress(chunk)
+                if out is None:
+                    parts.append(data)
+                    inline_size += len(data)
+                    if inline_size > ZIP_INLINE_BYTES:
+                        # Результат велик для передачи между процессами — дописываем во временный файл
+                        out = tempfile.NamedTemporaryFile(dir=tmp_dir, prefix=".zippart-", delete=False)
+                        out.write(b"".join(parts))
+                        parts = []
+                else:
+                    out.write(data)
+            tail = compressor.flush()
+            if out is None:
+                data = b"".join(parts) + tail
+                if len(data) >= size:
+                    return STORED, crc, size, size, None
+                return DEFLATED, crc, len(data), size, data
+            out.write(tail)
+            compressed_size = out.tell()
+            out.close()
+            if compressed_size >= size:
+                os.unlink(out.name)
+                return STORED, crc, size, size, None
+            return DEFLATED, crc, compressed_size, size, out.name
+        except BaseException:
+            if out is not None:
+                out.close()
+                os.unlink(out.name)
+            raise
+
+
+class ZipWriter:
+    """
+    Последовательная запись ZIP из заранее сжатых членов (с поддержкой ZIP64).
+    Заголовок каждого члена пишется уже с известными crc и размерами
+    """
+
+    def __init__(self, fileobj):
+        self.fp = fileobj
+        self.entries = []
+
+    def add(self, name: str, method: int, crc: int, compressed_size: int, size: int,
+            mtime: float, mode: int, data: bytes | str | None, source: str | None = None):
+        """
+        Пишет член архива. data — сжатые байты или путь к временному файлу с ними;
+        если data is None, копируется исходный файл source (метод STORED)
+        """
+        offset = self.fp.tell()
+        name_bytes = name.encode("utf-8")
+        zip64 = size > _ZIP64_LIMIT or compressed_size > _ZIP64_LIMIT
+        extra = struct.pack("<HHQQ", 1, 16, size, compressed_size) if zip64 else b""
+        dos_time, dos_date = _dos_datetime(mtime)
+        self.fp.write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, _FLAG_UTF8, method, dos_time, dos_date,
+            crc, _ZIP64_LIMIT if zip64 else compressed_size, _ZIP64_LIMIT if zip64 else size,
+            len(name_bytes), len(extra)))
+        self.fp.write(name_bytes)
+        self.fp.write(extra)
+
+        if isinstance(data, bytes):
+            self.fp.write(data)
+        elif (path := data if data is not None else source) is not None:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, self.fp, COPY_CHUNK_SIZE)
+        self.entries.append((name_bytes, method, dos_time, dos_date, crc,
+                             compressed_size, size, mode, offset))
+
+    def close(self):
+        """Пишет центральный каталог и завершающие записи"""
+        cd_offset = self.fp.tell()
+        for name_bytes, method, dos_time, dos_date, crc, compressed_size, size, mode, offset in self.entries:
+            zip64_fields = []
+            if size > _ZIP64_LIMIT:
+                zip64_fields.append(size)
+            if compressed_size > _ZIP64_LIMIT:
+                zip64_fields.append(compressed_size)
+            if offset > _ZIP64_LIMIT:
+                zip64_fields.append(offset)
+            extra = (struct.pack("<HH", 1, 8 * len(zip64_fields)) +
+                     struct.pack(f"<{len(zip64_fields)}Q", *zip64_fields)) if zip64_fields else b""
+            version = 45 if zip64_fields else 20
+            external_attr = (mode & 0xFFFF) << 16
+            if name_bytes.endswith(b"/"):
+                external_attr |= 0x10
+            self.fp.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, _FLAG_UTF8, method,
+                dos_time, dos_date, crc, min(compressed_size, _ZIP64_LIMIT), min(size, _ZIP64_LIMIT),
+                len(name_bytes), len(extra), 0, 0, 0, external_attr, min(offset, _ZIP64_LIMIT)))
+            self.fp.write(name_bytes)
+            self.fp.write(extra)
+        cd_end = self.fp.tell()
+        cd_size = cd_end - cd_offset
+        count = len(self.entries)
+
+        if count >= _ZIP64_COUNT_LIMIT or cd_offset > _ZIP64_LIMIT or cd_size > _ZIP64_LIMIT:
+            self.fp.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                                      count, count, cd_size, cd_offset))
+            self.fp.write(struct.pack("<IIQI", 0x07064B50, 0, cd_end, 1))
+        self.fp.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(count, _ZIP64_COUNT_LIMIT),
+                                  min(count, _ZIP64_COUNT_LIMIT), min(cd_size, _ZIP64_LIMIT),
+                                  min(cd_offset, _ZIP64_LIMIT), 0))
+
+
+def build_zip(folder: str, archive: str, level: int = 6, jobs: int | None = None) -> int:
+    """
+    Создаёт ZIP из содержимого каталога (имена относительно folder, как make_archive).
+    Члены сжимаются в пуле процессов, а записываются строго по порядку обхода; заранее
+    сжимается не больше нескольких членов на процесс, чтобы не копить результаты в памяти.
+    Архив пишется во временный файл и переименовывается в конце. Возвращает число членов
+    """
+    archive_dir = os.path.dirname(archive)
+    dirs, files, errors = walk_tree(folder)
+    if errors:
+        raise shutil.Error(errors)
+    skip = {os.path.realpath(archive), os.path.realpath(archive + ".tmp")}
+    files = [rel for rel in files if os.path.realpath(os.path.join(folder, rel)) not in skip]
+    stats = {rel: os.stat(os.path.join(folder, rel)) for rel in dirs[1:] + files}
+
+    total_bytes = sum(stats[rel].st_size for rel in files)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    parallel = jobs > 1 and len(files) > 1 and total_bytes >= ZIP_PARALLEL_MIN_BYTES
+
+    tmp_archive = archive + ".tmp"
+    pool = ProcessPoolExecutor(max_workers=jobs) if parallel else None
+    pending: deque[tuple[str, Future]] = deque()
+    try:
+        with open(tmp_archive, "wb") as out:
+            writer = ZipWriter(out)
+            for rel in dirs[1:]:
+                st = stats[rel]
+                writer.add(rel.replace(os.sep, "/") + "/", STORED, 0, 0, 0, st.st_mtime,
+                           0o40000 | (st.st_mode & 0o7777), None)
+
+            tasks = iter(files)
+            window = jobs * 4 if parallel else 1
+            while True:
+                while len(pending) < window:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    args = (os.path.join(folder, task), level, archive_dir)
+                    if pool is not None:
+                        future = pool.submit(compress_member, *args)
+                    else:
+                        future = Future()
+                        future.set_result(compress_member(*args))
+                    pending.append((task, future))
+                if not pending:
+                    break
+                rel, future = pending.popleft()
+                method, crc, compressed_size, size, data = future.result()
+                st = stats[rel]
+                try:
+                    writer.add(rel.replace(os.sep, "/"), method, crc, compressed_size, size,
+                               st.st_mtime, st.st_mode, data, os.path.join(folder, rel))
+                finally:
+                    if isinstance(data, str):
+                        os.unlink(data)
+            writer.close()
+        os.replace(tmp_archive, archive)
+        metrics.add(files=len(files), read=total_bytes, written=os.path.getsize(archive))
+    except BaseException:
+        # Временные файлы уже сжатых, но не записанных членов
+        for _, future in pending:
+            try:
+                result = future.result()
+            except Exception:
+                continue
+            if isinstance(result[4], str):
+                os.unlink(result[4])
+        if os.path.exists(tmp_archive):
+            os.unlink(tmp_archive)
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return len(dirs) - 1 + len(files)
@@ -0,0 +1,27 @@
+import json
+
+from benchmarks import run
+
+
+def test_benchmarks_tiny_scale(tmp_path):
+    """Замеры на крошечных деревьях выполняются через оболочку и пишут JSON"""
+    run.build_workspace(tmp_path / "work", scale=0.001)
+    assert (tmp_path / "work" / ".history").read_text().count("\n") == 100
+    results = run.run_cases(tmp_path / "work", run.CASES, repeats=1)
+    assert set(results) == {case.name for case in run.CASES}
+    assert not (tmp_path / "work" / "copy").exists()
+
+    output = tmp_path / "results.json"
+    assert run.main(["--scale", "0.001", "--repeats", "1", "--only", "history",
+                     "--workdir", str(tmp_path / "work"), "--output", str(output),
+                     "--baseline", str(tmp_path / "baseline.json"), "--save-baseline"]) == 0
+    assert json.loads(output.read_text())["results"]["history"]["runs"]
+
+
+def test_benchmarks_regression_threshold():
+    """Регрессия — замедление медианы больше порога и больше шума таймера"""
+    baseline = {"results": {"a": {"median": 1.0}, "b": {"median": 0.001}, "c": {"median": 1.0}}}
+    results = {"a": {"median": 1.5}, "b": {"median": 0.002}, "c": {"median": 1.1}}
+    regressions = run.compare(results, baseline, threshold=20)
+    assert len(regressions) == 1 and regressions[0].startswith("a:")
+    assert results["c"]["change_percent"] == 10.0
@@ -1,15 +1,19 @@
+import os
 import pytest
 from pathlib import Path
-from src.commands.ls import ls
+from src.commands.ls import ls, iter_ls, SORT_SIZE, SORT_TIME
 from src.commands.cd import cd
-from src.commands.cat import cat
+from src.commands.cat import cat, iter_cat
 from src.commands.cp import cp
 from src.commands.mv import mv
-from src.commands.rm import rm, restore_from_trash
-from src.commands.grep import grep
-from src.commands.archive import zip_folder, unzip_file, tar_folder, untar_file
+from src.commands.rm import rm, rm_purge, empty_trash, restore_from_trash, trash_root, purge_trash
+from src.commands.grep import (grep, iter_grep, iter_text_lines, make_matcher, LiteralMatcher,
+                               MultiLiteralMatcher, RegexMatcher, MODE_FILES, MODE_COUNT)
+from src.commands.index import build_index, pattern_trigrams
+from src.commands.archive import (zip_folder, unzip_file, list_zip, tar_folder, untar_file,
+                                  list_tar, index_tar)
 from src.utils.history import add_history, get_history, pop_last
-from src.utils.logger import write_log
+from src.utils.logger import write_log, flush_log
 
 
 def test_ls_detailed(tmp_path):
@@ -36,7 +40,7 @@ def test_cp_directory(tmp_path):
     src_dir.mkdir()
     (src_dir / "file.txt").write_text("content")
     dst_dir = tmp_path / "dst_dir"
-    
+
     cp(str(src_dir), str(dst_dir), recursive=True)
     assert dst_dir.exists()
 
@@ -50,7 +54,7 @@ def test_grep_basic(tmp_path):
     """Тест grep базовый поиск"""
     test_file = tmp_path / "test.txt"
     test_file.write_text("Hello World\nTest Line")
-    
+
     result = grep("Hello", str(test_file))
     assert "Hello" in result
 
@@ -60,7 +64,7 @@ def test_grep_recursive(tmp_path):
     subdir = tmp_path / "subdir"
     subdir.mkdir()
     (subdir / "file.txt").write_text("pattern")
-    
+
     result = grep("pattern", str(tmp_path), recursive=True)
     assert "pattern" in result
 
@@ -69,7 +73,7 @@ def test_grep_case_insensitive(tmp_path):
     """Тест grep без учета регистра"""
     test_file = tmp_path / "test.txt"
     test_file.write_text("UPPERCASE text")
-    
+
     result = grep("uppercase", str(test_file), ignore_case=True)
     assert "UPPERCASE" in result
 
@@ -79,7 +83,7 @@ def test_zip_folder(tmp_path):
     test_dir = tmp_path / "test_folder"
     test_dir.mkdir()
     (test_dir / "file.txt").write_text("content")
-    
+
     archive_path = tmp_path / "archive.zip"
     zip_folder(str(test_dir), str(archive_path))
     assert archive_path.exists()
@@ -90,7 +94,7 @@ def test_tar_folder(tmp_path):
     test_dir = tmp_path / "test_folder"
     test_dir.mkdir()
     (test_dir / "file.txt").write_text("content")
-    
+
     archive_path = tmp_path / "archive.tar.gz"
     tar_folder(str(test_dir), str(archive_path))
     assert archive_path.exists()
@@ -101,7 +105,7 @@ def test_history_add_and_get(tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     add_history("ls -l")
     add_history("cd /tmp")
-    
+
     hist = get_history(2)
     assert len(hist) == 2
     assert "ls -l" in hist
@@ -111,7 +115,7 @@ def test_history_pop_last(tmp_path, monkeypatch):
     """Тест удаления последней команды"""
     monkeypatch.chdir(tmp_path)
     add_history("test command")
-    
+
     last = pop_last()
     assert last == "test command"
 
@@ -120,7 +124,8 @@ def test_logger(tmp_path, monkeypatch):
     """Тест логгера"""
     monkeypatch.chdir(tmp_path)
     write_log("Test log message")
-    
+    flush_log()
+
     log_file = Path("shell.log")
     assert log_file.exists()
     assert "Test log message" in log_file.read_text()
@@ -137,7 +142,7 @@ def test_cat_is_directory(tmp_path):
 def test_cd_nonexistent():
     """cd в несуществующую директорию"""
     result = cd("/nonexistent/path/that/does/not/exist")
-    assert result == False
+    assert result is False
 
 
 def test_cp_without_recursive(tmp_path):
@@ -201,7 +206,7 @@ def test_grep_read_error(mocker, tmp_path):
     test_file = tmp_path / "test.txt"
     test_file.write_text("content")
     mocker.patch('pathlib.Path.open', side_effect=PermissionError("Access denied"))
-    result = grep("content", str(test_file))
+    grep("content", str(test_file))
 
 
 def test_zip_nonexistent_folder():
@@ -247,7 +252,7 @@ def test_archive_zip_exception(mocker, tmp_path):
     """zip с ошибкой при создании архива"""
     test_dir = tmp_path / "folder"
     test_dir.mkdir()
-    mocker.patch('shutil.make_archive', side_effect=Exception("Archive error"))
+    mocker.patch('src.commands.archive.build_zip', side_effect=Exception("Archive error"))
     result = zip_folder(str(test_dir), "archive.zip")
     assert "ERROR" in result
 
@@ -258,7 +263,7 @@ def test_archive_unzip_exception(mocker, tmp_path):
     archive = tmp_path / "test.zip"
     with zipfile.ZipFile(archive, 'w') as zf:
         zf.writestr("file.txt", "content")
-    
+
     mocker.patch('zipfile.ZipFile.extractall', side_effect=Exception("Unzip error"))
     result = unzip_file(str(archive))
     assert "ERROR" in result
@@ -277,9 +282,9 @@ def test_archive_untar_exception(mocker, tmp_path):
     """untar с ошибкой при распаковке"""
     import tarfile
     archive = tmp_path / "test.tar.gz"
-    with tarfile.open(archive, 'w:gz') as tar:
+    with tarfile.open(archive, 'w:gz'):
         pass
-    
+
     mocker.patch('tarfile.TarFile.extractall', side_effect=Exception("Untar error"))
     result = untar_file(str(archive))
     assert "ERROR" in result
@@ -290,7 +295,7 @@ def test_cp_exception(mocker, tmp_path):
     src = tmp_path / "src.txt"
     src.write_text("content")
     dst = tmp_path / "dst.txt"
-    
+
     mocker.patch('shutil.copy2', side_effect=Exception("Copy error"))
     cp(str(src), str(dst), recursive=False)
 
@@ -300,16 +305,17 @@ def test_mv_exception(mocker, tmp_path):
     src = tmp_path / "src.txt"
     src.write_text("content")
     dst = tmp_path / "dst.txt"
-    
-    mocker.patch('shutil.move', side_effect=Exception("Move error"))
+
+    mocker.patch('os.rename', side_effect=OSError("Move error"))
     mv(str(src), str(dst))
+    assert src.exists()
 
 
 def test_rm_exception(mocker, tmp_path):
     """rm с ошибкой удаления"""
     test_file = tmp_path / "file.txt"
     test_file.write_text("content")
-    
+
     mocker.patch('builtins.input', return_value='y')
     mocker.patch('shutil.move', side_effect=Exception("Remove error"))
     rm(str(test_file), recursive=False)
@@ -319,14 +325,14 @@ def test_cd_exception(mocker):
     """cd с ошибкой смены директории"""
     mocker.patch('os.chdir', side_effect=Exception("CD error"))
     result = cd("/tmp")
-    assert result == False
+    assert result is False
 
 
 def test_cat_read_exception(mocker, tmp_path):
     """cat с ошибкой чтения файла"""
     test_file = tmp_path / "file.txt"
     test_file.write_text("content")
-    
+
     mocker.patch('pathlib.Path.open', side_effect=Exception("Read error"))
     cat(str(test_file))
 
@@ -336,11 +342,11 @@ def test_grep_in_directory_recursive(tmp_path):
     dir1 = tmp_path / "dir1"
     dir1.mkdir()
     (dir1 / "file1.txt").write_text("pattern match")
-    
+
     dir2 = tmp_path / "dir2"
     dir2.mkdir()
     (dir2 / "file2.txt").write_text("another pattern")
-    
+
     result = grep("pattern", str(tmp_path), recursive=True)
     assert "pattern" in result
 
@@ -350,3 +356,934 @@ def test_grep_in_directory_non_recursive(tmp_path):
     (tmp_path / "file.txt").write_text("pattern")
     result = grep("pattern", str(tmp_path), recursive=False)
     assert "pattern" in result
+
+
+def test_grep_parallel_keeps_walk_order(tmp_path):
+    """grep -j: вывод в порядке обхода, как при последовательном поиске"""
+    for i in range(6):
+        (tmp_path / f"file{i}.txt").write_text(f"pattern {i}\nother\npattern again")
+    (tmp_path / "bad.txt").write_bytes(b"\xff\xfe pattern")
+
+    sequential = grep("pattern", str(tmp_path), recursive=True, jobs=1)
+    parallel = grep("pattern", str(tmp_path), recursive=True, jobs=2)
+    assert parallel == sequential
+    assert "ERROR: Не удалось прочитать файл" in parallel
+
+
+def test_grep_bytes_and_line_paths_agree(tmp_path):
+    """Байтовый и построчный поиск: одинаковый вывод на невалидном UTF-8; str-экранирования не роняют grep"""
+    bad = tmp_path / "bad.txt"
+    # Построчный поиск декодирует файл блоками: ошибка во втором блоке — после первой строки
+    bad.write_bytes(b"pattern 1\n" + b"x" * 10000 + b"\n\xff\xfe pattern 2\npattern 3\n")
+    # "pattern" ищется по буферу, "pat.ern" — построчно
+    for pattern in ("pattern", "pat.ern"):
+        lines = grep(pattern, str(bad)).splitlines()
+        assert lines[0] == f"{bad}: 1: pattern 1"
+        assert lines[1].startswith(f"ERROR: Не удалось прочитать файл {bad}")
+        assert len(lines) == 2
+    (tmp_path / "abc.txt").write_text("xABCx\n")
+    assert "xABCx" in grep(r"A\u0042C", str(tmp_path / "abc.txt"))
+
+
+def test_grep_crlf_and_bare_cr(tmp_path):
+    """Файлы с \r\n и одиночным \r: $ и номера строк как при построчном поиске (universal newlines)"""
+    crlf = tmp_path / "crlf.txt"
+    crlf.write_bytes(b"foo\r\nbar foo\r\nfoo bar\r\n")
+    assert grep("foo$", str(crlf)).splitlines() == [f"{crlf}: 1: foo", f"{crlf}: 2: bar foo"]
+    assert grep("bar", str(crlf)).splitlines() == [f"{crlf}: 2: bar foo", f"{crlf}: 3: foo bar"]
+    bare = tmp_path / "mac.txt"
+    bare.write_bytes(b"one\rtwo ERROR\rthree\rERROR four")
+    assert grep("ERROR", str(bare)).splitlines() == [f"{bare}: 2: two ERROR", f"{bare}: 4: ERROR four"]
+    assert grep("ERROR", str(bare), mode=MODE_COUNT) == f"{bare}: 2"
+
+
+def test_grep_bytes_scan_line_numbers(tmp_path):
+    """grep по буферу файла: номера строк и текст как при построчном поиске"""
+    test_file = tmp_path / "log.txt"
+    test_file.write_text("ok\nERROR one\n\nok\nlast ERROR")
+    result = grep("ERROR", str(test_file))
+    assert result.splitlines() == [
+        f"{test_file}: 2: ERROR one",
+        f"{test_file}: 5: last ERROR",
+    ]
+
+
+def test_grep_huge_single_line(tmp_path):
+    """grep в файле из одной огромной строки выводит только окрестность совпадения"""
+    test_file = tmp_path / "min.json"
+    test_file.write_bytes(b"{" + b"a" * 500_000 + b"NEEDLE" + b"b" * 500_000 + b"}")
+    result = grep("NEEDLE", str(test_file))
+    assert "NEEDLE" in result
+    assert len(result) < 2000
+
+
+def test_index_prunes_files_and_rescans_stale(tmp_path, mocker):
+    """grep пропускает файлы без нужных триграмм, изменённые файлы читает всегда"""
+    (tmp_path / "hit.txt").write_text("needle here")
+    miss = tmp_path / "miss.txt"
+    miss.write_text("nothing to see")
+    assert "файлов 2, обновлено 2" in build_index(str(tmp_path))
+
+    import src.commands.grep as grep_module
+    spy = mocker.spy(grep_module, "iter_search_file")
+    result = grep("needle", str(tmp_path))
+    assert "hit.txt" in result
+    assert [call.args[0].name for call in spy.call_args_list] == ["hit.txt"]
+
+    miss.write_text("now with a needle, longer")
+    result = grep("needle", str(tmp_path))
+    assert "miss.txt" in result
+    assert "обновлено 1" in build_index(str(tmp_path))
+
+
+def test_index_pattern_trigrams():
+    """Обязательные триграммы не берутся из необязательных частей шаблона"""
+    assert pattern_trigrams("a|needle") == []
+    assert pattern_trigrams("(abc)?xy") == []
+    assert len(pattern_trigrams("Needle", ignore_case=True)) == 4
+    # Экранирования с буквой/цифрой и группы (?...) индексом не фильтруются
+    assert pattern_trigrams(r"\x41BC") == []
+    assert pattern_trigrams("(?i)ПРИВЕТ") == []
+
+
+def test_index_never_hides_matches(tmp_path):
+    """С индексом и без него — одни и те же совпадения; индекс — данные, а не pickle"""
+    (tmp_path / "a.txt").write_text("xABCx\nпривет мир\n", encoding="utf-8")
+    for pattern in (r"\x41BC", "(?i)ПРИВЕТ"):
+        assert "a.txt" in grep(pattern, str(tmp_path), recursive=True)
+    build_index(str(tmp_path))
+    for pattern in (r"\x41BC", "(?i)ПРИВЕТ", "ABC"):
+        assert "a.txt" in grep(pattern, str(tmp_path), recursive=True)
+    assert "Нет совпадений" == grep("zzzqqq", str(tmp_path), recursive=True)
+
+    import json
+    from src.commands.index import load_index
+    assert json.loads((tmp_path / ".grepindex").read_text())["version"] == 2
+    (tmp_path / ".grepindex").write_bytes(b"\x80\x04cos\nsystem\n.")
+    assert load_index(tmp_path) is None
+    (tmp_path / ".grepindex").write_text('{"version": 2, "files": {"a.txt": 5}}')
+    assert load_index(tmp_path) is None
+
+
+def test_iter_grep_is_lazy(tmp_path):
+    """iter_grep отдаёт первое совпадение, не дочитывая остальные файлы"""
+    for i in range(3):
+        (tmp_path / f"file{i}.txt").write_text("match\n" * 3)
+    lines = iter_grep("match", str(tmp_path))
+    assert next(lines).endswith(": 1: match")
+
+
+def test_iter_search_file_streams_matches(tmp_path):
+    """Совпадения в одном большом файле отдаются по одному, а не списком по всему файлу"""
+    from src.commands.grep import iter_search_file
+    test_file = tmp_path / "big.log"
+    test_file.write_text("hit\n" * 1000)
+    matcher = make_matcher("hit")
+    calls = []
+    find = matcher.find
+    matcher.find = lambda *args: calls.append(args) or find(*args)
+    search = iter_search_file(test_file, matcher)
+    assert next(search) == f"{test_file}: 1: hit"
+    assert len(calls) == 1
+    assert len(list(search)) == 999
+
+
+def test_grep_files_and_count_modes(tmp_path):
+    """grep -l выводит имена файлов, grep -c — число совпавших строк"""
+    (tmp_path / "a.txt").write_text("x\nhit\nhit\n")
+    (tmp_path / "b.txt").write_text("nothing")
+    assert grep("hit", str(tmp_path), mode=MODE_FILES) == str(tmp_path / "a.txt")
+    assert grep("hit", str(tmp_path), mode=MODE_COUNT) == f"{tmp_path / 'a.txt'}: 2"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_grep_max_count(tmp_path, jobs):
+    """grep -m N останавливается после N совпадений во всех файлах"""
+    for i in range(3):
+        (tmp_path / f"file{i}.txt").write_text("hit\n" * 4)
+    result = grep("hit", str(tmp_path), jobs=jobs, max_count=6)
+    assert len(result.splitlines()) == 6
+    counts = grep("hit", str(tmp_path), jobs=jobs, mode=MODE_COUNT, max_count=6)
+    assert [line.rsplit(": ", 1)[1] for line in counts.splitlines()] == ["4", "2"]
+
+
+def test_grep_matcher_selection():
+    """Шаблоны без метасимволов ищутся как подстроки, список подстрок — автоматом"""
+    assert isinstance(make_matcher("ERROR 42"), LiteralMatcher)
+    assert isinstance(make_matcher(["E100", "E200"]), MultiLiteralMatcher)
+    assert isinstance(make_matcher(["E100", "E2.0"]), RegexMatcher)
+
+
+def test_grep_literal_ignore_case(tmp_path):
+    """Подстрока без учёта регистра, в том числе не ASCII"""
+    test_file = tmp_path / "test.txt"
+    test_file.write_text("Ошибка в модуле\nok\nFATAL error")
+    assert f"{test_file}: 3: FATAL error" == grep("fatal", str(test_file), ignore_case=True)
+    assert f"{test_file}: 1: Ошибка в модуле" == grep("ОШИБКА", str(test_file), ignore_case=True)
+
+
+def test_grep_ignore_case_matches_regex_semantics(tmp_path):
+    """-1 для подстроки совпадает там же, где re.IGNORECASE: знак кельвина, ſ, ı — и с индексом"""
+    test_file = tmp_path / "units.txt"
+    test_file.write_text("300 \u212aelvin\nlong \u017ftep\nd\u0131sk\nplain\n", encoding="utf-8")
+    for literal, regex in (("kelvin", "kel.in"), ("step", "st.p"), ("disk", "di.k")):
+        expected = grep(regex, str(test_file), ignore_case=True)
+        assert expected and grep(literal, str(test_file), ignore_case=True) == expected
+    assert grep(["kelvin", "disk"], str(test_file), ignore_case=True).count("\n") == 1
+    assert grep("KELVIN", str(test_file), ignore_case=True)
+    assert isinstance(make_matcher("error", ignore_case=True), LiteralMatcher)
+    build_index(str(tmp_path))
+    assert "units.txt" in grep("kelvin", str(tmp_path), recursive=True, ignore_case=True)
+
+
+def test_grep_multiple_literals(tmp_path):
+    """Несколько подстрок: строка выводится один раз, если подходит любая"""
+    test_file = tmp_path / "codes.log"
+    test_file.write_text("code E100\ncode E200 and E100\ncode E300\ne100 lower")
+    codes = [f"E{i:03}" for i in range(100, 1000, 100) if i != 300]
+    result = grep(codes, str(test_file))
+    assert [line.split(": ")[1] for line in result.splitlines()] == ["1", "2"]
+    result = grep(codes, str(test_file), ignore_case=True)
+    assert [line.split(": ")[1] for line in result.splitlines()] == ["1", "2", "4"]
+
+
+def test_logger_truncates_long_message(tmp_path):
+    """Слишком длинное сообщение обрезается"""
+    write_log("x" * 100_000)
+    flush_log()
+    text = Path("shell.log").read_text()
+    assert "обрезано" in text
+    assert len(text) < 10_000
+
+
+def test_logger_rotation(tmp_path, monkeypatch):
+    """Переполненный лог сжимается в сегмент .1.gz"""
+    import gzip
+    import src.utils.logger as logger
+    monkeypatch.setattr(logger, "LOG_MAX_BYTES", 100)
+    for i in range(3):
+        write_log(f"message {i} " + "y" * 100)
+        flush_log()
+    assert "message 1" in gzip.open("shell.log.2.gz", "rt").read()
+    assert "message 2" in gzip.open("shell.log.1.gz", "rt").read()
+    assert not Path("shell.log").exists()
+
+
+def test_history_tail_beyond_cache(tmp_path, monkeypatch):
+    """История длиннее кэша: хвост читается с конца файла, undo обрезает файл"""
+    import src.utils.history as history
+    monkeypatch.setattr(history, "HISTORY_CACHE_SIZE", 3)
+    monkeypatch.setattr(history, "HISTORY_READ_BLOCK", 8)
+    for i in range(10):
+        add_history(f"cmd {i}")
+
+    assert get_history(5) == [f"cmd {i}" for i in range(5, 10)]
+    assert pop_last() == "cmd 9"
+    assert pop_last() == "cmd 8"
+    assert get_history(100) == [f"cmd {i}" for i in range(8)]
+    assert Path(".history").read_text().splitlines() == [f"cmd {i}" for i in range(8)]
+
+
+def test_history_external_append(tmp_path):
+    """Запись, добавленная в файл другим процессом, видна в истории"""
+    add_history("ours")
+    with open(".history", "a", encoding="utf-8") as f:
+        f.write("theirs\n")
+    assert get_history(2) == ["ours", "theirs"]
+    assert pop_last() == "theirs"
+
+
+def test_history_reset_cache(tmp_path):
+    """reset_cache: файл того же размера, переписанный извне, перечитывается с диска"""
+    from src.utils.history import reset_cache
+    add_history("aaa")
+    assert get_history(1) == ["aaa"]
+    Path(".history").write_text("bbb\n")
+    assert get_history(1) == ["aaa"]
+    reset_cache()
+    assert get_history(1) == ["bbb"]
+
+
+def test_ls_sort_and_limit(tmp_path):
+    """ls -S / -t сортируют по убыванию, --limit оставляет первые N"""
+    import os
+    for i, size in enumerate([30, 10, 20]):
+        item = tmp_path / f"file{i}.txt"
+        item.write_text("x" * size)
+        os.utime(item, (1_000_000 + i, 1_000_000 + i))
+    assert list(iter_ls(str(tmp_path), sort_by=SORT_SIZE)) == ["file0.txt", "file2.txt", "file1.txt"]
+    assert list(iter_ls(str(tmp_path), sort_by=SORT_TIME, limit=2)) == ["file2.txt", "file1.txt"]
+    assert len(list(iter_ls(str(tmp_path), limit=2))) == 2
+
+
+def test_ls_sort_ties_by_name(tmp_path):
+    """ls -S / -t: при равном размере или времени записи идут по имени, с --limit и без"""
+    for name in ("c.txt", "a.txt", "b.txt"):
+        item = tmp_path / name
+        item.write_text("same")
+        os.utime(item, (1_000_000, 1_000_000))
+    for sort_by in (SORT_SIZE, SORT_TIME):
+        assert list(iter_ls(str(tmp_path), sort_by=sort_by)) == ["a.txt", "b.txt", "c.txt"]
+        assert list(iter_ls(str(tmp_path), sort_by=sort_by, limit=2)) == ["a.txt", "b.txt"]
+
+
+def test_ls_buffered_output(tmp_path, mocker):
+    """ls печатает блоками, а не по строке на запись"""
+    for i in range(50):
+        (tmp_path / f"f{i}").write_text("")
+    mock_print = mocker.patch('builtins.print')
+    ls(str(tmp_path), detailed=True)
+    assert mock_print.call_count == 1
+    assert len(mock_print.call_args.args[0].splitlines()) == 50
+
+
+def test_cat_binary_several_files(tmp_path, capsysbinary):
+    """cat выводит байты нескольких файлов по порядку без декодирования"""
+    first = tmp_path / "a.bin"
+    first.write_bytes(b"\xff\x00binary")
+    second = tmp_path / "b.txt"
+    second.write_text("текст\n")
+    cat(str(first), str(second))
+    assert capsysbinary.readouterr().out == b"\xff\x00binary" + "текст\n".encode()
+
+
+def test_cat_sendfile_to_file(tmp_path, monkeypatch):
+    """Если stdout — файл, данные передаются через sendfile"""
+    import os
+    import sys
+    src = tmp_path / "src.txt"
+    src.write_bytes(b"data" * 1000)
+    spy = []
+    real_sendfile = os.sendfile
+    monkeypatch.setattr(os, "sendfile", lambda *args: spy.append(args) or real_sendfile(*args))
+    with open(tmp_path / "out.txt", "w") as out:
+        monkeypatch.setattr(sys, "stdout", out)
+        cat(str(src))
+    assert spy
+    assert (tmp_path / "out.txt").read_bytes() == src.read_bytes()
+
+
+def test_cp_tree_parallel_keeps_metadata(tmp_path):
+    """cp -r -j: вложенные каталоги, содержимое и mtime как у copy2"""
+    import os
+    src_dir = tmp_path / "src"
+    (src_dir / "a" / "b").mkdir(parents=True)
+    (src_dir / "empty").mkdir()
+    for i in range(20):
+        item = src_dir / "a" / "b" / f"f{i}.bin"
+        item.write_bytes(bytes(range(256)) * (i + 1))
+        os.utime(item, (1_000_000, 1_000_000 + i))
+    dst_dir = tmp_path / "dst"
+
+    cp(str(src_dir), str(dst_dir), recursive=True, jobs=4)
+    for i in range(20):
+        src_file = src_dir / "a" / "b" / f"f{i}.bin"
+        dst_file = dst_dir / "a" / "b" / f"f{i}.bin"
+        assert dst_file.read_bytes() == src_file.read_bytes()
+        assert dst_file.stat().st_mtime == src_file.stat().st_mtime
+    assert (dst_dir / "empty").is_dir()
+
+
+def test_cp_tree_bounded_queue(tmp_path, monkeypatch):
+    """cp -r: ожидающих задач в пуле не больше потоков * CP_QUEUE_PER_WORKER, порядок сохраняется"""
+    import src.utils.copier as copier
+    monkeypatch.setattr(copier, "CP_QUEUE_PER_WORKER", 2)
+    submitted = []
+    files = [f"f{i}" for i in range(50)]
+    for done, (rel, future) in enumerate(copier._submit_bounded(lambda s, d: submitted.append(s),
+                                                                files, "a", "b", 3)):
+        assert rel == files[done]
+        future.result()
+        assert len(submitted) <= done + 1 + 3 * 2
+    assert len(submitted) == 50
+
+
+def test_cp_tree_existing_destination(tmp_path, capsys):
+    """cp -r в существующий каталог сообщает об ошибке, как copytree"""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "dst").mkdir()
+    cp(str(tmp_path / "src"), str(tmp_path / "dst"), recursive=True)
+    assert "Ошибка копирования" in capsys.readouterr().out
+
+
+def test_cp_sync_copies_only_changes(tmp_path, capsys):
+    """cp -u: повторный запуск копирует только новые и изменённые файлы"""
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "same.txt").write_text("same")
+    (src_dir / "changed.txt").write_text("old")
+    dst_dir = tmp_path / "dst"
+    cp(str(src_dir), str(dst_dir), recursive=True, sync=True)
+    assert "скопировано файлов 2" in capsys.readouterr().out
+
+    (src_dir / "changed.txt").write_text("new content")
+    (src_dir / "added.txt").write_text("added")
+    cp(str(src_dir), str(dst_dir), recursive=True, sync=True)
+    out = capsys.readouterr().out
+    assert "скопировано файлов 2 (16 байт), пропущено файлов 1 (4 байт)" in out
+    assert (dst_dir / "changed.txt").read_text() == "new content"
+
+
+def test_cp_sync_checksum(tmp_path, capsys):
+    """cp --checksum находит изменение при тех же размере и mtime"""
+    import os
+    src_file = tmp_path / "a.txt"
+    dst_file = tmp_path / "b.txt"
+    src_file.write_text("aaaa")
+    dst_file.write_text("bbbb")
+    os.utime(src_file, (1_000_000, 1_000_000))
+    os.utime(dst_file, (1_000_000, 1_000_000))
+    cp(str(src_file), str(dst_file), sync=True)
+    assert "пропущено файлов 1" in capsys.readouterr().out
+    cp(str(src_file), str(dst_file), sync=True, checksum=True)
+    assert "скопировано файлов 1" in capsys.readouterr().out
+    assert dst_file.read_text() == "aaaa"
+
+
+def test_rm_same_name_no_collision(tmp_path):
+    """Два удалённых файла с одним именем не затирают друг друга и восстанавливаются по очереди"""
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "file.txt").write_text("from a")
+    (tmp_path / "b" / "file.txt").write_text("from b")
+    rm(str(tmp_path / "a" / "file.txt"))
+    rm(str(tmp_path / "b" / "file.txt"))
+    assert trash_root(tmp_path / "a" / "file.txt") == tmp_path / ".trash"
+
+    restore_from_trash(str(tmp_path / "a" / "file.txt"))
+    assert (tmp_path / "a" / "file.txt").read_text() == "from a"
+    assert not (tmp_path / "b" / "file.txt").exists()
+    restore_from_trash("file.txt")
+    assert (tmp_path / "b" / "file.txt").read_text() == "from b"
+
+
+def test_trash_purge_quota(tmp_path, monkeypatch):
+    """Очистка корзины удаляет самые старые записи сверх квоты, последнюю оставляет"""
+    import src.commands.rm as rm_module
+    for i in range(3):
+        (tmp_path / f"f{i}.bin").write_bytes(b"x" * 100)
+        rm(str(tmp_path / f"f{i}.bin"))
+    monkeypatch.setattr(rm_module, "TRASH_MAX_BYTES", 150)
+    purge_trash(tmp_path / ".trash")
+    assert len(list((tmp_path / ".trash" / "files").iterdir())) == 1
+    restore_from_trash("f2.bin")
+    assert (tmp_path / "f2.bin").exists()
+
+
+def test_trash_journal_append_only(tmp_path, monkeypatch):
+    """rm и восстановление дописывают строку в журнал; размеры каталогов считаются без блокировки"""
+    import json
+    import src.commands.rm as rm_module
+    journal = tmp_path / ".trash" / rm_module.JOURNAL_FILE
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "f.bin").write_bytes(b"x" * 10)
+    for i in range(3):
+        (tmp_path / f"f{i}.txt").write_text("x")
+        rm(str(tmp_path / f"f{i}.txt"))
+    inode = journal.stat().st_ino
+    assert len(journal.read_text().splitlines()) == 3
+    rm(str(tmp_path / "d"), recursive=True, force=True)
+    restore_from_trash("f1.txt")
+    import threading
+    for thread in threading.enumerate():
+        if thread.name == "trash-purge":
+            thread.join()
+    assert journal.stat().st_ino == inode
+    ops = [json.loads(line)[0] for line in journal.read_text().splitlines()]
+    assert [op for op in ops if op != "size"] == ["add"] * 4 + ["del"]
+
+    tree_size = rm_module._tree_size
+    def unlocked_tree_size(path):
+        assert not rm_module._lock.locked()
+        return tree_size(path)
+    monkeypatch.setattr(rm_module, "_tree_size", unlocked_tree_size)
+    purge_trash(tmp_path / ".trash")
+    entries, _ = rm_module._load_index(tmp_path / ".trash")
+    assert sorted(meta["size"] for meta in entries.values()) == [1, 1, 10]
+
+    # Сжатие: журнал переписывается, когда в нём больше мёртвых строк, чем живых
+    monkeypatch.setattr(rm_module, "_JOURNAL_SLACK", 0)
+    for _ in range(2):
+        restore_from_trash("f0.txt")
+        rm(str(tmp_path / "f0.txt"))
+    purge_trash(tmp_path / ".trash")
+    assert journal.stat().st_ino != inode
+    assert len(rm_module._load_index(tmp_path / ".trash")[0]) == 3
+    restore_from_trash("f2.txt")
+    assert (tmp_path / "f2.txt").exists()
+
+
+def test_trash_falls_back_to_home(tmp_path, monkeypatch):
+    """Нет доступа к .trash-<uid> в корне ФС — домашняя корзина, а не .trash рядом с объектом"""
+    import src.commands.rm as rm_module
+    home = tmp_path / "home"
+    monkeypatch.setattr(rm_module.Path, "home", lambda: home)
+    monkeypatch.setattr(rm_module.os, "access", lambda path, mode: False)
+    (tmp_path / "work").mkdir()
+    (tmp_path / "work" / "f.txt").write_text("x")
+    assert trash_root(tmp_path / "work" / "f.txt") == home / ".trash"
+    assert rm(str(tmp_path / "work" / "f.txt"))
+    assert not (tmp_path / "work" / ".trash").exists()
+    assert restore_from_trash(str(tmp_path / "work" / "f.txt"))
+    assert (tmp_path / "work" / "f.txt").read_text() == "x"
+
+
+def test_trash_one_purge_per_root(tmp_path, monkeypatch):
+    """Пока идёт фоновая очистка, новые rm не запускают вторую, а просят ещё один проход"""
+    import threading
+    import src.commands.rm as rm_module
+    running = set(threading.enumerate())
+    release = threading.Event()
+    tree_size = rm_module._tree_size
+    measured = []
+
+    def slow_tree_size(path):
+        release.wait(5)
+        measured.append(path.name)
+        return tree_size(path)
+    monkeypatch.setattr(rm_module, "_tree_size", slow_tree_size)
+    for i in range(3):
+        (tmp_path / f"d{i}").mkdir()
+        rm(str(tmp_path / f"d{i}"), recursive=True, force=True)
+    purges = [thread for thread in threading.enumerate()
+              if thread.name == "trash-purge" and thread not in running]
+    assert len(purges) == 1
+    release.set()
+    purges[0].join(5)
+    entries, _ = rm_module._load_index(tmp_path / ".trash")
+    assert all(meta["size"] == 0 for meta in entries.values())
+    assert sorted(measured) == sorted(entries)
+
+
+def test_trash_orphans_removed(tmp_path, monkeypatch):
+    """Данные без записи в журнале (прерванная очистка) удаляются первой очисткой, свежие — нет"""
+    import src.commands.rm as rm_module
+    (tmp_path / "f.txt").write_text("x")
+    rm(str(tmp_path / "f.txt"))
+    files = tmp_path / ".trash" / "files"
+    (files / "orphan").mkdir()
+    (files / "orphan" / "data").write_text("left behind")
+    monkeypatch.setattr(rm_module, "_reconciled", set())
+    purge_trash(tmp_path / ".trash")
+    assert (files / "orphan").exists()
+
+    monkeypatch.setattr(rm_module, "_reconciled", set())
+    monkeypatch.setattr(rm_module, "TRASH_ORPHAN_GRACE", -1)
+    purge_trash(tmp_path / ".trash")
+    assert not (files / "orphan").exists()
+    assert restore_from_trash("f.txt")
+
+
+def test_trash_legacy_index_migrated(tmp_path):
+    """Корзина с index.json прежнего формата переводится в журнал"""
+    import json
+    root = tmp_path / ".trash"
+    (root / "files").mkdir(parents=True)
+    (root / "files" / "abc").write_text("old")
+    (root / "index.json").write_text(json.dumps({"abc": {
+        "path": str(tmp_path / "old.txt"), "name": "old.txt", "time": 1.0, "size": 3}}))
+    restore_from_trash("old.txt")
+    assert (tmp_path / "old.txt").read_text() == "old"
+    assert not (root / "index.json").exists()
+
+
+def test_rm_symlink_to_directory(tmp_path):
+    """rm и rm --purge ссылки на каталог удаляют саму ссылку; каталог и его файлы остаются"""
+    target = tmp_path / "target"
+    (target / "sub").mkdir(parents=True)
+    (target / "sub" / "f.txt").write_text("keep")
+    link = tmp_path / "link"
+    link.symlink_to(target)
+
+    assert rm_purge([str(link)], recursive=True, force=True)
+    assert not link.is_symlink()
+    assert (target / "sub" / "f.txt").read_text() == "keep"
+
+    link.symlink_to(target)
+    assert rm(str(link))
+    assert not link.is_symlink()
+    assert (target / "sub" / "f.txt").read_text() == "keep"
+    assert restore_from_trash(str(link))
+    assert link.is_symlink() and os.readlink(link) == str(target)
+
+
+def test_rm_purge_many_paths(tmp_path, capsys):
+    """rm --purge удаляет несколько путей безвозвратно и сообщает освобождённое место"""
+    tree = tmp_path / "tree"
+    for i in range(5):
+        (tree / f"d{i}" / "sub").mkdir(parents=True)
+        (tree / f"d{i}" / "sub" / "f.bin").write_bytes(b"x" * 10)
+        (tree / f"d{i}" / "g.bin").write_bytes(b"y" * 5)
+    (tmp_path / "single.txt").write_text("abc")
+    rm_purge([str(tree), str(tmp_path / "single.txt")], recursive=True, force=True)
+    assert "удалено файлов 11, освобождено 78 байт" in capsys.readouterr().out
+    assert not tree.exists()
+    assert not (tmp_path / "single.txt").exists()
+    assert not (tmp_path / ".trash").exists()
+
+
+def test_empty_trash(tmp_path, capsys):
+    """emptytrash удаляет содержимое корзины и очищает индекс"""
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "f.txt").write_text("12345")
+    (tmp_path / "g.txt").write_text("67")
+    rm(str(tmp_path / "d"), recursive=True, force=True)
+    rm(str(tmp_path / "g.txt"))
+    empty_trash([str(tmp_path)])
+    assert "удалено файлов 2, освобождено 7 байт" in capsys.readouterr().out
+    assert list((tmp_path / ".trash" / "files").iterdir()) == []
+    restore_from_trash("g.txt")
+    assert "не найден в корзине" in capsys.readouterr().out
+
+
+def test_mv_across_devices_resumes(mocker, tmp_path, capsys):
+    """mv между устройствами: копия проверяется, исходники удаляются, готовые копии не копируются заново"""
+    import errno
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.txt").write_text("aaa")
+    (src / "sub" / "b.txt").write_text("bb")
+    (src / "link").symlink_to("a.txt")
+    dst = tmp_path / "moved" / "src"
+    # Прерванный перенос: b.txt уже скопирован, но исходник ещё не удалён
+    (dst / "sub").mkdir(parents=True)
+    cp(str(src / "sub" / "b.txt"), str(dst / "sub" / "b.txt"))
+    capsys.readouterr()
+
+    mocker.patch('os.rename', side_effect=OSError(errno.EXDEV, "Invalid cross-device link"))
+    mv(str(src), str(tmp_path / "moved"))
+    assert "файлов 3 (5 байт, скопировано заново 2)" in capsys.readouterr().out
+    assert not src.exists()
+    assert (dst / "a.txt").read_text() == "aaa"
+    assert (dst / "sub" / "b.txt").read_text() == "bb"
+    assert os.readlink(dst / "link") == "a.txt"
+
+
+def test_mv_across_devices_interrupted_rerun(mocker, tmp_path, capsys):
+    """Повторный mv после прерванного переноса продолжает его в том же каталоге, а не вкладывает src внутрь"""
+    import errno
+    import src.utils.copier as copier
+    src = tmp_path / "data"
+    (src / "sub").mkdir(parents=True)
+    for name in ("f1", "f2", "sub/f3"):
+        (src / name).write_text(name)
+    dst = tmp_path / "b"
+    mocker.patch('os.rename', side_effect=OSError(errno.EXDEV, "Invalid cross-device link"))
+
+    real_move_file = copier.move_file
+    calls = []
+
+    def interrupted(file_src, file_dst):
+        calls.append(file_src)
+        if len(calls) > 1:
+            raise OSError(errno.EIO, "прервано")
+        return real_move_file(file_src, file_dst)
+
+    mocker.patch.object(copier, "move_file", side_effect=interrupted)
+    assert not mv(str(src), str(dst), jobs=1)
+    assert dst.is_dir() and src.exists()
+
+    mocker.patch.object(copier, "move_file", side_effect=real_move_file)
+    capsys.readouterr()
+    assert mv(str(src), str(dst))
+    assert "файлов 2" in capsys.readouterr().out
+    assert not src.exists()
+    assert not (dst / "data").exists()
+    assert sorted(str(p.relative_to(dst)) for p in dst.rglob("*")) == ["f1", "f2", "sub", "sub/f3"]
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+    # Без метки существующий каталог по-прежнему означает «переместить внутрь»
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "x").write_text("x")
+    assert mv(str(tmp_path / "other"), str(dst))
+    assert (dst / "other" / "x").read_text() == "x"
+
+
+def test_zip_parallel_levels_and_stored(tmp_path, monkeypatch):
+    """zip: члены сжимаются в пуле процессов, уже сжатые форматы и -0 пишутся без сжатия"""
+    import zipfile
+    import src.utils.zipper as zipper
+    monkeypatch.setattr(zipper, "ZIP_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(zipper, "ZIP_INLINE_BYTES", 1000)
+    folder = tmp_path / "folder"
+    (folder / "sub" / "empty").mkdir(parents=True)
+    (folder / "a.txt").write_text("hello " * 5000)
+    (folder / "sub" / "photo.jpg").write_bytes(b"jpeg" * 100)
+    (folder / "sub" / "noise.bin").write_bytes(os.urandom(3000))
+
+    for level in (9, 0):
+        archive = tmp_path / f"out{level}.zip"
+        assert "успешно" in zip_folder(str(folder), str(archive), level=level, jobs=2)
+        with zipfile.ZipFile(archive) as zf:
+            assert zf.testzip() is None
+            info = {i.filename: i for i in zf.infolist()}
+            assert set(info) == {"sub/", "sub/empty/", "a.txt", "sub/photo.jpg", "sub/noise.bin"}
+            assert zf.read("a.txt") == b"hello " * 5000
+            expected = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+            assert info["a.txt"].compress_type == expected
+            assert info["sub/photo.jpg"].compress_type == zipfile.ZIP_STORED
+            assert info["sub/noise.bin"].compress_type == zipfile.ZIP_STORED
+    assert not list(tmp_path.glob(".zippart-*"))
+
+
+def test_extract_empty_archives(tmp_path):
+    """Пустые zip и tar.gz без шаблонов распаковываются без ошибки; с шаблоном — «нет файлов»"""
+    import tarfile
+    import zipfile
+    empty_zip = tmp_path / "empty.zip"
+    zipfile.ZipFile(empty_zip, "w").close()
+    empty_tar = tmp_path / "empty.tar.gz"
+    tarfile.open(empty_tar, "w:gz").close()
+    assert unzip_file(str(empty_zip), dest=str(tmp_path / "z")) == \
+        f"Архив {empty_zip} успешно распакован: файлов 0."
+    assert untar_file(str(empty_tar), dest=str(tmp_path / "t")) == f"Архив {empty_tar} успешно распакован."
+    assert "нет файлов по шаблонам: a.txt" in unzip_file(str(empty_zip), ["a.txt"], str(tmp_path / "z"))
+    assert "нет файлов по шаблонам: a.txt" in untar_file(str(empty_tar), ["a.txt"], str(tmp_path / "t"))
+
+
+def test_tar_untar_metrics(tmp_path, monkeypatch):
+    """Метрики tar и untar считаются по добавленным и распакованным членам"""
+    import json
+    from src.utils import metrics
+    monkeypatch.setattr(metrics, "path", str(tmp_path / "m.jsonl"))
+    folder = tmp_path / "data"
+    (folder / "sub").mkdir(parents=True)
+    (folder / "a.txt").write_text("x" * 10)
+    (folder / "sub" / "b.txt").write_text("y" * 5)
+    archive = tmp_path / "data.tar.gz"
+    for command, action in (("tar", lambda: tar_folder(str(folder), str(archive))),
+                            ("untar", lambda: untar_file(str(archive), dest=str(tmp_path / "out")))):
+        metrics.begin([])
+        assert "успешно" in action()
+        metrics.end(command, [], True, 0)
+    flush_log()
+    tar, untar = [json.loads(line) for line in (tmp_path / "m.jsonl").read_text().splitlines()]
+    assert (tar["files"], tar["bytes_read"], tar["bytes_written"]) == (2, 15, archive.stat().st_size)
+    assert (untar["files"], untar["bytes_read"], untar["bytes_written"]) == (2, archive.stat().st_size, 15)
+
+
+def test_tar_block_gzip_members(tmp_path, monkeypatch):
+    """tar.gz сжимается блоками в отдельные gzip-члены и распаковывается untar"""
+    import gzip
+    import src.commands.archive as archive_module
+    from src.utils.blockgzip import BlockGzipWriter
+    monkeypatch.setattr(archive_module, "BlockGzipWriter",
+                        lambda f, jobs=None: BlockGzipWriter(f, jobs=jobs, block_size=4096))
+    folder = tmp_path / "data"
+    folder.mkdir()
+    for i in range(10):
+        (folder / f"f{i}.txt").write_text(f"line {i}\n" * 1000)
+    archive = tmp_path / "data.tar.gz"
+    assert "успешно" in tar_folder(str(folder), str(archive), jobs=3)
+
+    raw = archive.read_bytes()
+    assert raw.count(b"\x1f\x8b\x08") > 10
+    assert len(gzip.decompress(raw)) % 512 == 0
+    out = tmp_path / "out"
+    out.mkdir()
+    monkeypatch.chdir(out)
+    assert "успешно" in untar_file(str(archive))
+    assert (out / "data" / "f7.txt").read_text() == "line 7\n" * 1000
+
+
+def test_unzip_selective_parallel(tmp_path, monkeypatch):
+    """unzip: шаблоны, каталог -d, список из центрального каталога и распаковка в нескольких процессах"""
+    import zipfile
+    import src.commands.archive as archive_module
+    archive = tmp_path / "release.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("conf/app.yml", "port: 80")
+        zf.writestr("conf/db.yml", "host: db")
+        zf.writestr("bin/run.sh", "echo run")
+        zf.writestr("README", "readme")
+
+    listing = list_zip(str(archive), ["conf"])
+    assert "conf/app.yml" in listing and "conf/db.yml" in listing and "README" not in listing
+
+    assert "файлов 1" in unzip_file(str(archive), ["*.sh"], str(tmp_path / "one"))
+    assert [p.name for p in (tmp_path / "one").rglob("*") if p.is_file()] == ["run.sh"]
+
+    monkeypatch.setattr(archive_module, "UNZIP_PARALLEL_MIN_BYTES", 0)
+    assert "файлов 4" in unzip_file(str(archive), dest=str(tmp_path / "all"), jobs=2)
+    assert (tmp_path / "all" / "conf" / "db.yml").read_text() == "host: db"
+    assert "ERROR" in unzip_file(str(archive), ["nothing*"])
+
+
+def test_untar_selective(tmp_path):
+    """untar: распаковка одного файла по точному имени, список членов по шаблону"""
+    folder = tmp_path / "data"
+    (folder / "conf").mkdir(parents=True)
+    (folder / "conf" / "app.yml").write_text("port: 80")
+    (folder / "big.txt").write_text("x" * 10000)
+    archive = tmp_path / "data.tar.gz"
+    tar_folder(str(folder), str(archive))
+
+    assert "data/conf/app.yml" in list_tar(str(archive), ["*.yml"])
+    assert "data/big.txt" not in list_tar(str(archive), ["*.yml"])
+    result = untar_file(str(archive), ["data/conf/app.yml"], str(tmp_path / "out"))
+    assert "файлов 1" in result
+    assert (tmp_path / "out" / "data" / "conf" / "app.yml").read_text() == "port: 80"
+    assert not (tmp_path / "out" / "data" / "big.txt").exists()
+
+
+def test_browse_archives_in_place(tmp_path, capsys):
+    """ls, cat и grep по путям внутри zip и tar.gz без распаковки; индекс обновляется при изменении архива"""
+    import zipfile
+    with zipfile.ZipFile(tmp_path / "release.zip", "w") as zf:
+        zf.writestr("conf/app.yml", "port: 80\nhost: example\n")
+        zf.writestr("conf/extra/db.yml", "port: 5432\n")
+        zf.writestr("bin/run.sh", "echo run\n")
+    folder = tmp_path / "backup"
+    (folder / "etc").mkdir(parents=True)
+    (folder / "etc" / "hosts").write_text("127.0.0.1 localhost\n")
+    tar_folder(str(folder), str(tmp_path / "backup.tar.gz"))
+
+    assert sorted(iter_ls(str(tmp_path / "release.zip") + "/")) == ["bin", "conf"]
+    assert sorted(iter_ls(str(tmp_path / "release.zip" / "conf"))) == ["app.yml", "extra"]
+    assert list(iter_ls(str(tmp_path / "backup.tar.gz" / "backup" / "etc"))) == ["hosts"]
+
+    cat(str(tmp_path / "release.zip" / "conf" / "app.yml"), str(tmp_path / "backup.tar.gz" / "backup" / "etc" / "hosts"))
+    assert capsys.readouterr().out == "port: 80\nhost: example\n127.0.0.1 localhost\n"
+    cat(str(tmp_path / "release.zip" / "missing.yml"))
+    assert "не найден" in capsys.readouterr().out
+
+    lines = list(iter_grep("port", str(tmp_path / "release.zip" / "conf"), recursive=True))
+    assert lines == [f"{tmp_path / 'release.zip'}/conf/app.yml: 1: port: 80",
+                     f"{tmp_path / 'release.zip'}/conf/extra/db.yml: 1: port: 5432"]
+    assert list(iter_grep("port", str(tmp_path / "release.zip" / "conf"))) == lines[:1]
+    assert "не найден" in grep("x", str(tmp_path / "release.zip" / "nope"))
+
+    with zipfile.ZipFile(tmp_path / "release.zip", "a") as zf:
+        zf.writestr("conf/new.yml", "port: 1\n")
+    assert "new.yml" in list(iter_ls(str(tmp_path / "release.zip" / "conf")))
+
+
+def test_untar_index_checkpoints(tmp_path, monkeypatch, capsys):
+    """untar --index: контрольные точки на границах gzip-членов, распаковка члена с ближайшей точки"""
+    import json
+    import tarfile
+    import src.commands.archive as archive_module
+    import src.utils.gzindex as gzindex
+    from src.utils.blockgzip import BlockGzipWriter
+    monkeypatch.setattr(archive_module, "BlockGzipWriter",
+                        lambda f, jobs=None: BlockGzipWriter(f, jobs=jobs, block_size=8192))
+    monkeypatch.setattr(gzindex, "GZ_INDEX_SPACING", 16384)
+    folder = tmp_path / "data"
+    folder.mkdir()
+    for i in range(30):
+        (folder / f"f{i:02}.txt").write_text(f"file {i}\n" * 500)
+    archive = tmp_path / "data.tar.gz"
+    tar_folder(str(folder), str(archive))
+
+    # Без индекса архив из многих gzip-членов читается целиком
+    assert gzindex.load_gz_index(str(archive)) is None
+    assert list_tar(str(archive)).count("\n") == 30
+    assert "файлов 1" in untar_file(str(archive), ["data/f29.txt"], str(tmp_path / "noindex"))
+    assert (tmp_path / "noindex" / "data" / "f29.txt").read_text() == "file 29\n" * 500
+
+    assert "членов 31" in index_tar(str(archive))
+    index = gzindex.load_gz_index(str(archive))
+    assert len(index["checkpoints"]) > 5
+    offset = next(m[1] for m in index["members"] if m[0] == "data/f25.txt")
+    assert gzindex.checkpoint_for(index, offset)[0] > 0
+
+    assert "data/f25.txt" in list_tar(str(archive), ["*f25*"])
+    result = untar_file(str(archive), ["data/f03.txt", "data/f04.txt", "data/f25.txt"], str(tmp_path / "out"))
+    assert "файлов 3" in result
+    assert (tmp_path / "out" / "data" / "f25.txt").read_text() == "file 25\n" * 500
+    assert (tmp_path / "out" / "data" / "f04.txt").read_text() == "file 4\n" * 500
+    capsys.readouterr()
+    cat(str(archive / "data" / "f29.txt"))
+    assert capsys.readouterr().out == "file 29\n" * 500
+
+    # Обычный однопоточный gzip — одна контрольная точка, но смещения членов работают
+    plain = tmp_path / "plain.tar.gz"
+    with tarfile.open(plain, "w:gz") as tar:
+        tar.add(str(folder), arcname="data")
+    assert "контрольных точек 1" in index_tar(str(plain))
+    assert "файлов 1" in untar_file(str(plain), ["data/f10.txt"], str(tmp_path / "plain"))
+    assert (tmp_path / "plain" / "data" / "f10.txt").read_text() == "file 10\n" * 500
+
+    # Индекс — JSON (данные, а не pickle); повреждённый индекс — как отсутствующий
+    idx = gzindex.index_path(str(archive))
+    with open(idx, encoding="utf-8") as f:
+        data = json.load(f)
+    st = os.stat(archive)
+    for broken in ([1, 2], {**data, "members": [["x", 1]]}, {**data, "checkpoints": "ab"},
+                   {key: value for key, value in data.items() if key != "members"}):
+        with open(idx, "w", encoding="utf-8") as f:
+            json.dump(broken, f)
+        os.utime(archive, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert gzindex.load_gz_index(str(archive)) is None
+    with open(idx, "wb") as f:
+        f.write(b"\x80\x04garbage")
+    assert gzindex.load_gz_index(str(archive)) is None
+    assert "файлов 1" in untar_file(str(archive), ["data/f25.txt"], str(tmp_path / "broken"))
+
+    os.utime(archive, (1, 1))
+    assert gzindex.load_gz_index(str(archive)) is None
+
+
+def test_indexed_tar_members_readable(tmp_path, monkeypatch, capsys):
+    """С индексом члены tar.gz читаются как обычные файлы: grep и cat внутрь архива, выборочный untar"""
+    import src.commands.archive as archive_module
+    import src.utils.gzindex as gzindex
+    from src.utils.blockgzip import BlockGzipWriter
+    monkeypatch.setattr(archive_module, "BlockGzipWriter",
+                        lambda f, jobs=None: BlockGzipWriter(f, jobs=jobs, block_size=8192))
+    monkeypatch.setattr(gzindex, "GZ_INDEX_SPACING", 16384)
+    monkeypatch.setattr(gzindex, "GZ_READ_BLOCK", 1024)
+    folder = tmp_path / "d"
+    folder.mkdir()
+    for i in range(30):
+        # Шестнадцатеричные строки плохо сжимаются и не содержат "hello"
+        lines = "".join(os.urandom(32).hex() + "\n" for _ in range(100))
+        (folder / f"f{i:02}.txt").write_text(lines + ("hello\n" if i in (3, 25) else ""))
+    archive = tmp_path / "d.tar.gz"
+    tar_folder(str(folder), str(archive))
+    index_tar(str(archive))
+
+    found = list(iter_grep("hello", str(archive / "d"), recursive=True, mode=MODE_FILES))
+    assert found == [str(archive / "d" / "f03.txt"), str(archive / "d" / "f25.txt")]
+    capsys.readouterr()
+    assert cat(str(archive / "d" / "f25.txt"))
+    assert capsys.readouterr().out == (folder / "f25.txt").read_text()
+
+    # f25 дальше следующей контрольной точки — распаковка начинается заново с неё
+    index = gzindex.load_gz_index(str(archive))
+    extracted, read, written = archive_module._extract_indexed(
+        str(archive), index, ["d/f03.txt", "d/f25.txt"], str(tmp_path / "out"))
+    sizes = (folder / "f03.txt").stat().st_size + (folder / "f25.txt").stat().st_size
+    assert (extracted, written) == (2, sizes)
+    assert 0 < read < archive.stat().st_size // 2
+    assert (tmp_path / "out" / "d" / "f25.txt").read_text() == (folder / "f25.txt").read_text()
+
+
+def test_iter_cat_and_grep_stream(tmp_path, monkeypatch):
+    """cat отдаёт файл блоками, grep режет блоки на строки и ищет в потоке"""
+    import src.commands.cat as cat_module
+    monkeypatch.setattr(cat_module, "CAT_CHUNK_SIZE", 3)
+    (tmp_path / "log.txt").write_text("ok 1\nошибка ERROR 2\nok 3\nERROR 4", encoding="utf-8")
+    chunks = list(iter_cat("log.txt", "missing.txt"))
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    # Блоки по 3 байта разрывают двухбайтовые символы — строки собираются без потерь
+    assert list(iter_text_lines(chunks)) == ["ok 1", "ошибка ERROR 2", "ok 3", "ERROR 4"]
+
+    assert list(iter_grep("ERROR", None, lines=iter_cat("log.txt"))) == ["ошибка ERROR 2", "ERROR 4"]
+    assert list(iter_grep("ERROR", None, mode=MODE_COUNT, lines=["a ERROR", "b"])) == ["1"]
+    assert list(iter_grep("ERROR", None, max_count=1, lines=iter_cat("log.txt"))) == ["ошибка ERROR 2"]
+
+
+def test_latency_histogram():
+    """Перцентили гистограммы задержек — с относительной ошибкой не больше корзины"""
+    from src.utils.stats import LatencyHistogram
+    histogram = LatencyHistogram()
+    values = [i * 1000 for i in range(1, 1001)]
+    for value in values:
+        histogram.record(value, ok=value != 5000)
+    assert histogram.count == 1000 and histogram.errors == 1
+    assert histogram.max == 1_000_000
+    for p, exact in ((50, 500_000), (95, 950_000), (99, 990_000)):
+        assert exact <= histogram.percentile(p) <= exact * 1.04
+    assert histogram.percentile(100) == 1_000_000
+    assert LatencyHistogram().percentile(50) == 0
@@ -1,4 +1,3 @@
-import pytest
 from pathlib import Path
 from src.shell import Shell
 
@@ -6,7 +5,7 @@ from src.shell import Shell
 def test_shell_initialization():
     """Тест инициализации оболочки"""
     shell = Shell()
-    assert shell.running == True
+    assert shell.running
     assert shell.current_dir is not None
 
 
@@ -23,7 +22,7 @@ def test_execute_cd(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     test_dir = tmp_path / "testdir"
     test_dir.mkdir()
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"cd {test_dir}")
@@ -34,7 +33,7 @@ def test_execute_cat(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     test_file = tmp_path / "test.txt"
     test_file.write_text("content")
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"cat {test_file}")
@@ -46,7 +45,7 @@ def test_execute_cp(mocker, tmp_path, monkeypatch):
     src = tmp_path / "src.txt"
     src.write_text("content")
     dst = tmp_path / "dst.txt"
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"cp {src} {dst}")
@@ -59,7 +58,7 @@ def test_execute_mv(mocker, tmp_path, monkeypatch):
     src = tmp_path / "src.txt"
     src.write_text("content")
     dst = tmp_path / "dst.txt"
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"mv {src} {dst}")
@@ -72,7 +71,7 @@ def test_execute_rm(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     test_file = tmp_path / "file.txt"
     test_file.write_text("content")
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     mocker.patch('builtins.input', return_value='y')
@@ -84,7 +83,7 @@ def test_execute_grep(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     test_file = tmp_path / "test.txt"
     test_file.write_text("Hello World")
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"grep Hello {test_file}")
@@ -96,7 +95,7 @@ def test_execute_zip(mocker, tmp_path, monkeypatch):
     test_dir = tmp_path / "folder"
     test_dir.mkdir()
     (test_dir / "file.txt").write_text("content")
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"zip {test_dir} archive.zip")
@@ -106,10 +105,10 @@ def test_execute_unzip(mocker, tmp_path, monkeypatch):
     """Тест выполнения команды unzip"""
     monkeypatch.chdir(tmp_path)
     import zipfile
-    
+
     with zipfile.ZipFile("test.zip", 'w') as zf:
         zf.writestr("file.txt", "content")
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command("unzip test.zip")
@@ -120,7 +119,7 @@ def test_execute_history(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     shell = Shell()
     mocker.patch('builtins.print')
-    
+
     shell.execute_command("ls")
     shell.execute_command("history")
 
@@ -131,7 +130,7 @@ def test_execute_undo(mocker, tmp_path, monkeypatch):
     src = tmp_path / "src.txt"
     src.write_text("content")
     dst = tmp_path / "dst.txt"
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"cp {src} {dst}")
@@ -143,7 +142,7 @@ def test_execute_exit(mocker):
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command("exit")
-    assert shell.running == False
+    assert not shell.running
 
 
 def test_execute_unknown_command(mocker):
@@ -166,7 +165,7 @@ def test_cmd_rm_with_flags(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     test_dir = tmp_path / "testdir"
     test_dir.mkdir()
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     mocker.patch('builtins.input', return_value='y')
@@ -258,7 +257,7 @@ def test_cmd_grep_with_flags(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     test_file = tmp_path / "test.txt"
     test_file.write_text("Test Content")
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"grep -r -1 test {test_file}")
@@ -307,7 +306,7 @@ def test_cmd_undo_cp(mocker, tmp_path, monkeypatch):
     src = tmp_path / "src.txt"
     src.write_text("content")
     dst = tmp_path / "dst.txt"
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     mocker.patch('builtins.input', return_value='y')
@@ -321,7 +320,7 @@ def test_cmd_undo_mv(mocker, tmp_path, monkeypatch):
     src = tmp_path / "src.txt"
     src.write_text("content")
     dst = tmp_path / "dst.txt"
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command(f"mv {src} {dst}")
@@ -333,7 +332,7 @@ def test_cmd_undo_rm(mocker, tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     test_file = tmp_path / "file.txt"
     test_file.write_text("content")
-    
+
     shell = Shell()
     mocker.patch('builtins.print')
     mocker.patch('builtins.input', return_value='y')
@@ -355,3 +354,272 @@ def test_empty_command(mocker):
     shell = Shell()
     mocker.patch('builtins.print')
     shell.execute_command("")
+
+
+def test_cmd_index(mocker, tmp_path, monkeypatch):
+    """index строит индекс каталога"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "file.txt").write_text("content")
+    shell = Shell()
+    mocker.patch('builtins.print')
+    shell.execute_command(f"index {tmp_path}")
+    assert (tmp_path / ".grepindex").exists()
+
+
+def test_cmd_grep_streams_lines(mocker, tmp_path, monkeypatch):
+    """grep печатает каждое совпадение отдельно, -m ограничивает вывод"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "test.txt").write_text("hit\nhit\nhit\n")
+    shell = Shell()
+    mock_print = mocker.patch('builtins.print')
+    shell.execute_command(f"grep -m 2 hit {tmp_path / 'test.txt'}")
+    assert mock_print.call_count == 2
+
+
+def test_cmd_grep_patterns_from_flags(mocker, tmp_path, monkeypatch):
+    """grep -e и -f: шаблоны из аргументов и из файла"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "codes.txt").write_text("E1\n\nE3\n")
+    log = tmp_path / "app.log"
+    log.write_text("E1 start\nE2 mid\nE3 end\n")
+    shell = Shell()
+    mock_print = mocker.patch('builtins.print')
+    shell.execute_command(f"grep -f codes.txt -e E2 {log}")
+    assert mock_print.call_count == 3
+
+
+def test_cmd_ls_sort_flags(mocker, tmp_path, monkeypatch):
+    """ls -l -S --limit N"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "small.txt").write_text("x")
+    (tmp_path / "big.txt").write_text("x" * 100)
+    shell = Shell()
+    mock_print = mocker.patch('builtins.print')
+    shell.execute_command("ls -l -S --limit 1")
+    assert mock_print.call_args.args[0].endswith("big.txt")
+
+
+def test_cmd_undo_cp_sync_keeps_copy(mocker, tmp_path, monkeypatch):
+    """undo не удаляет копию, обновлённую синхронизацией"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "file.txt").write_text("content")
+    shell = Shell()
+    mocker.patch('builtins.print')
+    shell.execute_command("cp -r -u src mirror")
+    shell.execute_command("undo")
+    assert (tmp_path / "mirror" / "file.txt").exists()
+
+
+def test_cmd_rm_purge_and_undo(mocker, tmp_path, monkeypatch):
+    """rm --purge с несколькими путями нельзя отменить, обычный rm нескольких путей — можно"""
+    monkeypatch.chdir(tmp_path)
+    for name in ("a.txt", "b.txt", "c.txt", "d.txt"):
+        (tmp_path / name).write_text(name)
+    shell = Shell()
+    mocker.patch('builtins.print')
+    shell.execute_command("rm a.txt b.txt")
+    shell.execute_command("undo")
+    assert (tmp_path / "a.txt").exists() and (tmp_path / "b.txt").exists()
+    shell.execute_command("rm --purge c.txt d.txt")
+    shell.execute_command("undo")
+    assert not (tmp_path / "c.txt").exists() and not (tmp_path / "d.txt").exists()
+    shell.execute_command("emptytrash")
+
+
+def test_cmd_unzip_list_and_dest(mocker, tmp_path, monkeypatch):
+    """unzip -l выводит члены, -d задаёт каталог распаковки"""
+    monkeypatch.chdir(tmp_path)
+    import zipfile
+    with zipfile.ZipFile("test.zip", 'w') as zf:
+        zf.writestr("a/file.txt", "content")
+        zf.writestr("b.txt", "other")
+    shell = Shell()
+    mock_print = mocker.patch('builtins.print')
+    shell.execute_command("unzip -l test.zip")
+    assert "a/file.txt" in mock_print.call_args[0][0]
+    shell.execute_command("unzip test.zip a/* -d out")
+    assert (tmp_path / "out" / "a" / "file.txt").exists()
+    assert not (tmp_path / "out" / "b.txt").exists()
+
+
+def test_command_registry(mocker, monkeypatch):
+    """Новая команда регистрируется декоратором, без правки диспетчера"""
+    from src import shell as shell_module
+    monkeypatch.setattr(shell_module, "COMMANDS", dict(shell_module.COMMANDS))
+    calls = []
+
+    @shell_module.command("hello")
+    def cmd_hello(shell, args):
+        calls.append(args)
+
+    shell = Shell()
+    mock_print = mocker.patch('builtins.print')
+    shell.execute_command("hello a b")
+    assert calls == [["a", "b"]]
+    shell.execute_command("nosuchcmd")
+    assert "Неизвестная команда" in mock_print.call_args[0][0]
+    shell.execute_command("exit")
+    assert not shell.running
+
+
+def test_shell_imports_commands_lazily():
+    """Запуск оболочки не импортирует модули команд: zipfile/tarfile грузятся при первом zip/tar"""
+    import subprocess
+    import sys
+    code = ("import sys; import src.shell; "
+            "print(' '.join(m for m in ('zipfile', 'tarfile', 'src.commands.archive', "
+            "'src.commands.grep') if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=Path(__file__).resolve().parent.parent, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_run_script_stop_on_error(mocker, tmp_path):
+    """Пакетный режим: ошибки считаются, --stop-on-error прерывает скрипт, история пишется пачкой"""
+    from src.shell import split_script
+    from src.utils.history import get_history
+    (tmp_path / "a.txt").write_text("a")
+    mocker.patch('builtins.print')
+    commands = split_script("# комментарий\ncp a.txt b.txt; cat nope.txt\n\ncp a.txt c.txt\n")
+    assert commands == ["cp a.txt b.txt", "cat nope.txt", "cp a.txt c.txt"]
+
+    assert Shell().run_script(commands) == 1
+    assert (tmp_path / "c.txt").exists()
+    assert get_history(3) == commands
+
+    (tmp_path / "c.txt").unlink()
+    assert Shell().run_script(commands, stop_on_error=True) == 1
+    assert not (tmp_path / "c.txt").exists()
+
+
+def test_main_command_mode(tmp_path, capfd):
+    """main -c: команды через ';', буферизованный вывод, код возврата по ошибкам"""
+    from src.main import main
+    (tmp_path / "a.txt").write_text("hello")
+    assert main(["-c", "cat a.txt; ls"]) == 0
+    out = capfd.readouterr().out
+    assert "hello" in out and "a.txt" in out
+
+    (tmp_path / "script.sh").write_text("cat nope.txt\ncat a.txt\n")
+    assert main(["--stop-on-error", "script.sh"]) == 1
+    assert "hello" not in capfd.readouterr().out
+    assert main(["-x"]) == 2
+
+
+def test_pipeline_streams(mocker, tmp_path, monkeypatch, capfd):
+    """cat | grep и ls | grep соединяются лениво; grep без пути читает stdin в пакетном режиме"""
+    import io
+    import sys
+    (tmp_path / "app.log").write_text("start\nERROR disk\nok\nERROR net\n")
+    shell = Shell()
+    assert shell.execute_command("cat app.log | grep ERROR | grep net") is True
+    assert capfd.readouterr().out == "ERROR net\n"
+    assert shell.execute_command("ls | grep -c app") is True
+    assert capfd.readouterr().out == "1\n"
+    assert shell.execute_command("cat app.log | cat") is True
+    assert capfd.readouterr().out == "start\nERROR disk\nok\nERROR net\n"
+
+    assert shell.execute_command("cat app.log | cp x y") is False
+    assert "не поддерживает конвейер" in capfd.readouterr().out
+    assert shell.execute_command("cat app.log | ls") is False
+    assert "не читает ввод" in capfd.readouterr().out
+
+    # В интерактивном режиме stdin — команды оболочки: grep без пути его не читает
+    monkeypatch.setattr(sys, "stdin", io.StringIO("a ERROR\nb\n"))
+    assert shell.execute_command("grep ERROR") is False
+    assert "требует шаблон и путь" in capfd.readouterr().out
+    assert shell.execute_command("grep -c ERROR -") is True
+    assert capfd.readouterr().out == "1\n"
+
+    monkeypatch.setattr(sys, "stdin", io.StringIO("a ERROR\nb\n"))
+    assert Shell(read_stdin=True).execute_command("grep ERROR") is True
+    assert capfd.readouterr().out == "a ERROR\n"
+
+
+def test_piped_interactive_input_keeps_commands(tmp_path):
+    """Команды, переданные оболочке через канал, не съедаются grep без пути"""
+    import os
+    import subprocess
+    import sys
+    (tmp_path / "a.txt").write_text("x\n")
+    root = Path(__file__).resolve().parent.parent
+    result = subprocess.run([sys.executable, "-m", "src.main"], input="grep x\nls\nhistory\n",
+                            capture_output=True, text=True, cwd=tmp_path, timeout=30,
+                            env={**os.environ, "PYTHONPATH": str(root)})
+    assert "требует шаблон и путь" in result.stdout
+    assert "a.txt" in result.stdout
+    assert "1: grep x\n2: ls" in result.stdout
+
+
+def test_stats_and_profile(mocker, tmp_path, monkeypatch, capfd):
+    """Каждая команда замеряется: stats показывает перцентили; --profile пишет файл cProfile"""
+    from src.utils import stats
+    import src.shell as shell_module
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(shell_module, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(stats, "enabled", True)
+    stats.reset()
+    (tmp_path / "a.txt").write_text("x\n")
+    shell = Shell()
+    shell.execute_command("ls")
+    shell.execute_command("ls")
+    shell.execute_command("cat missing.txt")
+    shell.execute_command("cat a.txt | grep x")
+    shell.execute_command("nosuch")
+    assert stats.histograms()["ls"].count == 2
+    assert stats.histograms()["cat"].errors == 1
+    assert "cat|grep" in stats.histograms()
+    assert "nosuch" not in stats.histograms()
+    capfd.readouterr()
+
+    assert shell.execute_command("stats") is True
+    out = capfd.readouterr().out
+    assert "p99" in out and "cat|grep" in out
+    assert shell.execute_command("stats off") is True
+    shell.execute_command("ls")
+    assert stats.histograms()["ls"].count == 2
+    assert shell.execute_command("stats bogus") is False
+    assert shell.execute_command("stats reset") is True
+    assert stats.histograms() == {}
+
+    assert shell.execute_command("--profile ls") is True
+    assert len(list(tmp_path.glob("profile-ls-*.prof"))) == 1
+    assert "Профиль ls" in capfd.readouterr().out
+    assert (tmp_path / ".history").read_text().splitlines()[-1] == "ls"
+
+
+def test_metrics_jsonl(mocker, tmp_path, monkeypatch):
+    """metrics on: одна JSON-строка на операцию с файлами — время, файлы, байты, ошибки"""
+    import json
+    from src.utils import metrics
+    from src.utils.logger import flush_log
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(metrics, "path", None)
+    mocker.patch('builtins.print')
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "a.txt").write_text("ERROR 1\nok\n")
+    (tmp_path / "d" / "b.txt").write_text("ERROR 2\n")
+    shell = Shell()
+    assert shell.execute_command("metrics on m.jsonl") is True
+    shell.execute_command("cp -r d e")
+    shell.execute_command("cat d/a.txt missing.txt")
+    shell.execute_command("grep -r ERROR d")
+    shell.execute_command("zip d d.zip")
+    shell.execute_command("cat d/b.txt | grep ERROR")
+    shell.execute_command("history")
+    shell.execute_command("mv e f")
+    assert shell.execute_command("metrics off") is True
+    shell.execute_command("ls d")
+    flush_log()
+
+    records = [json.loads(line) for line in (tmp_path / "m.jsonl").read_text().splitlines()]
+    assert [record["command"] for record in records] == ["cp", "cat", "grep", "zip", "cat|grep", "mv"]
+    cp, cat, grep, zip_, pipe, mv = records
+    assert (cp["files"], cp["bytes_read"], cp["bytes_written"]) == (2, 19, 19)
+    assert cp["dir"] == str(tmp_path / "d") and cp["ok"] and cp["wall_ms"] >= 0
+    assert (cat["files"], cat["bytes_read"], cat["errors"], cat["ok"]) == (1, 11, 1, False)
+    assert (grep["files"], grep["bytes_read"]) == (2, 19)
+    assert zip_["bytes_written"] == (tmp_path / "d.zip").stat().st_size
+    assert (pipe["files"], pipe["bytes_read"]) == (1, 8)
+    assert mv["dir"] == str(tmp_path / "e")